@@ -0,0 +1,50 @@
+#!/bin/bash
+# Forwarding throughput of each Glu loop mode under UDP load, one JSON summary per mode.
+#
+#   cmds/bench_forwarding.sh [UES] [SECONDS] [MBPS_PER_UE]
+#
+# Run from src as root, in the container (needs /dev/net/tun and iperf3). Every UE
+# of a generated two-tower scenario sends UDP to an iperf3 server on the host
+# through the gateway, and headless.py reports the packets and Mbps each direction
+# delivered. To compare two builds of layer3 (e.g. before and after a change),
+# run it once per build with the same arguments.
+UES=${1:-20}
+SECONDS_RUN=${2:-20}
+MBPS=${3:-20}
+WARMUP=5
+SCENARIO=$(mktemp --suffix .json)
+OUT=bench_forwarding.jsonl
+
+python - "$UES" > "$SCENARIO" <<'EOF'
+import json, sys
+n = int(sys.argv[1])
+print(json.dumps({
+    "version": 1, "subnet": "10.0.0.0/24", "seed": 1, "starting_ip": "10.0.0.1",
+    "pixels_per_meter": 3.0, "map_size_m": [200.0, 200.0],
+    "dropping_packets": True, "delaying_packets": True, "mobility_running": False,
+    "towers": {"id": [0, 1], "x": [50.0, 150.0], "y": [100.0, 100.0],
+               "on": [True, True], "tech": ["LTE-20MHz", "LTE-20MHz"]},
+    "ues": {"id": list(range(n)), "x": [20.0 + 160.0 * i / max(n - 1, 1) for i in range(n)],
+            "y": [100.0] * n, "ip": [f"10.0.0.{i + 1}" for i in range(n)],
+            "model": ["static"] * n, "min_speed": [1.0] * n, "max_speed": [2.0] * n,
+            "pause_s": [0.0] * n},
+}))
+EOF
+
+for mode in --single-threaded "" --native; do
+    python headless.py "$SCENARIO" -t "$SECONDS_RUN" -w "$WARMUP" --json $mode >> "$OUT" &
+    glu=$!
+    # namespaces come up during the restore
+    until [ "$(ip netns list | grep -c '^cab-10\.')" -ge "$UES" ]; do sleep 0.5; done
+    for i in $(seq 1 "$UES"); do
+        iperf3 -s -1 -D -p $((5200 + i))
+    done
+    for i in $(seq 1 "$UES"); do
+        ip netns exec "cab-10.0.0.$i" iperf3 -c 10.200.0.1 -p $((5200 + i)) -u -b "${MBPS}M" \
+            -t $((SECONDS_RUN + WARMUP)) > /dev/null &
+    done
+    wait $glu
+    wait
+done
+rm -f "$SCENARIO"
+echo "summaries appended to $OUT"
@@ -0,0 +1,151 @@
+import gzip
+import json
+import time
+from typing import TYPE_CHECKING
+
+import layer1 as phy
+from .mobility import MODELS, TRACE
+from .model import BaseStation
+
+if TYPE_CHECKING:
+    from .glu import Glu
+
+CHECKPOINT_VERSION = 1
+
+TECHS = {tech.name: tech for tech in (phy.LTE_20, phy.NR_100)}
+
+
+def save(glu: "Glu", path: str) -> dict:
+    """
+    Write the topology and configuration of glu to a gzip-compressed JSON
+    file. Towers and UEs are stored column-wise to keep the file small.
+    UEs following a trace are saved as static; traces are not stored.
+    """
+    mob = glu.mobility
+    with mob._lock:
+        rows = [mob.index[ue.id] for ue in glu.ues]
+        model = mob.model[rows].tolist()
+        min_speed = mob.min_speed[rows].tolist()
+        max_speed = mob.max_speed[rows].tolist()
+        pause_s = mob.pause_s[rows].tolist()
+    names = {code: name for name, code in MODELS.items()}
+    state = {
+        "version": CHECKPOINT_VERSION,
+        "subnet": str(glu.subnet),
+        "seed": glu.seed,
+        "starting_ip": str(glu.starting_ip),
+        "pixels_per_meter": glu.pixels_per_meter,
+        "map_size_m": [glu.map_width_m, glu.map_height_m],
+        "dropping_packets": glu.dropping_packets,
+        "delaying_packets": glu.delaying_packets,
+        "mobility_running": mob.running,
+        "towers": {
+            "id": [bs.id for bs in glu.base_stations],
+            "x": [bs.tower.x for bs in glu.base_stations],
+            "y": [bs.tower.y for bs in glu.base_stations],
+            "on": [bs.tower.on for bs in glu.base_stations],
+            "tech": [bs.tower.t.name for bs in glu.base_stations],
+        },
+        "ues": {
+            "id": [ue.id for ue in glu.ues],
+            "x": [ue.l1ue.x for ue in glu.ues],
+            "y": [ue.l1ue.y for ue in glu.ues],
+            "ip": [ue.ip for ue in glu.ues],
+            "model": ["static" if m == TRACE else names[m] for m in model],
+            "min_speed": min_speed,
+            "max_speed": max_speed,
+            "pause_s": pause_s,
+        },
+    }
+    data = gzip.compress(json.dumps(state, separators=(",", ":")).encode())
+    with open(path, "wb") as f:
+        f.write(data)
+    return {
+        "path": path,
+        "towers": len(glu.base_stations),
+        "ues": len(glu.ues),
+        "bytes": len(data),
+    }
+
+
+def read(path: str) -> dict:
+    """Scenario state of a checkpoint, gzip-compressed as written by save or plain JSON."""
+    with open(path, "rb") as f:
+        data = f.read()
+    if data[:2] == b"\x1f\x8b":
+        data = gzip.decompress(data)
+    state = json.loads(data)
+    if state.get("version") != CHECKPOINT_VERSION:
+        raise ValueError(f"unsupported checkpoint version {state.get('version')}")
+    return state
+
+
+def restore(glu: "Glu", path: str) -> dict:
+    """
+    Rebuild a saved scenario into a glu that has no towers or UEs yet.
+    UE namespaces are provisioned in one parallel batch and associated in a
+    single pass. Returns the time spent in each phase; provision_s covers
+    the namespaces and the association pass. If provisioning fails, the
+    towers and UEs are rolled back and the error is raised.
+    """
+    if glu.ues or glu.base_stations:
+        raise ValueError("restore needs a simulation without towers or UEs")
+    start = time.perf_counter()
+    state = read(path)
+    if state["subnet"] != str(glu.subnet):
+        raise ValueError(f"checkpoint subnet {state['subnet']} does not match {glu.subnet}")
+    loaded = time.perf_counter()
+
+    glu.pixels_per_meter = state["pixels_per_meter"]
+    glu.set_map_size(*state["map_size_m"])
+    glu.set_starting_ip(state["starting_ip"])
+    glu.dropping_packets = state["dropping_packets"]
+    glu.delaying_packets = state["delaying_packets"]
+
+    towers = state["towers"]
+    glu.publish(
+        base_stations=[
+            BaseStation(bs_id, phy.Tower(x, y, on, TECHS[tech]))
+            for bs_id, x, y, on, tech in zip(
+                towers["id"], towers["x"], towers["y"], towers["on"], towers["tech"]
+            )
+        ]
+    )
+    glu.tower_id_counter = max(towers["id"], default=-1) + 1
+    glu.coverage.clear()
+
+    ues = state["ues"]
+    provision_start = time.perf_counter()
+    try:
+        added = glu.add_ues(list(zip(ues["x"], ues["y"])), ues["ip"], ues["id"])
+    except ValueError:
+        # add_ues released the addresses and UEs it took; drop the towers too,
+        # so the glu is left empty and the restore can be retried
+        glu.publish(base_stations=())
+        glu.tower_id_counter = 0
+        glu.coverage.clear()
+        raise
+    provisioned = time.perf_counter()
+
+    # group UEs sharing a mobility configuration so each group is one set_model call
+    groups: dict[tuple, list[int]] = {}
+    for ue, model, lo, hi, pause in zip(
+        added, ues["model"], ues["min_speed"], ues["max_speed"], ues["pause_s"]
+    ):
+        if model != "static":
+            groups.setdefault((model, lo, hi, pause), []).append(ue.id)
+    for (model, lo, hi, pause), ue_ids in groups.items():
+        glu.mobility.set_model(ue_ids, model, lo, hi, pause)
+    glu.mobility.running = state["mobility_running"]
+    glu.push_dataplane_flags()
+    end = time.perf_counter()
+
+    return {
+        "path": path,
+        "towers": len(glu.base_stations),
+        "ues": len(added),
+        "associated": sum(ue.connected_to is not None for ue in added),
+        "load_s": loaded - start,
+        "provision_s": provisioned - provision_start,
+        "total_s": end - start,
+    }
@@ -0,0 +1,419 @@
+import ipaddress
+import json
+import logging
+import os
+import queue
+import socket
+import struct
+import threading
+import time
+from typing import Callable, Iterable
+
+import layer1 as phy
+
+logger = logging.getLogger(__name__)
+
+# message header: type, payload length
+HEADER = struct.Struct("!BI")
+FRAME_LEN = struct.Struct("!H")
+MSG_FRAMES = 1
+MSG_SUMMARY = 2
+
+# frames sent to a peer in one message at most, and frames waiting for a peer at most
+MAX_BATCH_BYTES = 256 * 1024
+MAX_PENDING_FRAMES = 100000
+RECONNECT_S = 1.0
+
+# tech profiles by name, as transmitters are named in summaries
+TECHS = {tech.name: tech for tech in (phy.LTE_20, phy.NR_100)}
+
+
+class Region:
+    """Axis-aligned part of the map in meters, x0 <= x < x1 and y0 <= y < y1."""
+
+    def __init__(self, x0: float, y0: float, x1: float, y1: float):
+        self.x0, self.y0, self.x1, self.y1 = x0, y0, x1, y1
+
+    def contains(self, x: float, y: float) -> bool:
+        return self.x0 <= x < self.x1 and self.y0 <= y < self.y1
+
+    def as_list(self) -> list[float]:
+        return [self.x0, self.y0, self.x1, self.y1]
+
+
+class NodeSpec:
+    """
+    One node of a cluster: the region whose towers and UEs it simulates,
+    the subnet of its UEs and the address it listens on for its peers,
+    "host:port" for TCP or "unix:/path" for a Unix socket.
+    """
+
+    def __init__(self, name: str, address: str, subnet: str, region: Iterable[float]):
+        self.name = name
+        self.address = address
+        self.subnet = ipaddress.ip_network(subnet)
+        self.region = Region(*region)
+
+    def as_dict(self) -> dict:
+        return {
+            "address": self.address,
+            "subnet": str(self.subnet),
+            "region": self.region.as_list(),
+        }
+
+
+def load_config(path: str) -> dict[str, NodeSpec]:
+    """
+    Nodes of a cluster from a JSON file shared by all of them, e.g.
+    {"west": {"address": "127.0.0.1:7101", "subnet": "10.0.0.0/24", "region": [0, 0, 250, 500]},
+     "east": {"address": "127.0.0.1:7102", "subnet": "10.0.1.0/24", "region": [250, 0, 500, 500]}}
+    """
+    with open(path) as f:
+        config = json.load(f)
+    nodes = {
+        name: NodeSpec(name, spec["address"], spec["subnet"], spec["region"])
+        for name, spec in config.items()
+    }
+    names = list(nodes)
+    for i, a in enumerate(names):
+        for b in names[i + 1 :]:
+            if nodes[a].subnet.overlaps(nodes[b].subnet):
+                raise ValueError(f"subnets of {a} and {b} overlap")
+    return nodes
+
+
+def _listen(address: str) -> socket.socket:
+    if address.startswith("unix:"):
+        path = address[len("unix:") :]
+        if os.path.exists(path):
+            os.unlink(path)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.bind(path)
+    else:
+        host, port = address.rsplit(":", 1)
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((host, int(port)))
+    sock.listen()
+    return sock
+
+
+def _connect(address: str) -> socket.socket:
+    if address.startswith("unix:"):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(address[len("unix:") :])
+    else:
+        host, port = address.rsplit(":", 1)
+        sock = socket.create_connection((host, int(port)))
+        # batches are already coalesced, do not let Nagle hold them back
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    return sock
+
+
+def _recv_exact(sock: socket.socket, n: int) -> bytes | None:
+    buf = bytearray(n)
+    view = memoryview(buf)
+    got = 0
+    while got < n:
+        k = sock.recv_into(view[got:])
+        if k == 0:
+            return None
+        got += k
+    return bytes(buf)
+
+
+def encode_frames(frames: list[bytes]) -> bytes:
+    parts = [b""]
+    for frame in frames:
+        parts.append(FRAME_LEN.pack(len(frame)))
+        parts.append(frame)
+    payload = b"".join(parts)
+    return HEADER.pack(MSG_FRAMES, len(payload)) + payload
+
+
+def decode_frames(payload: bytes) -> list[bytes]:
+    frames = []
+    view = memoryview(payload)
+    i = 0
+    while i < len(payload):
+        (n,) = FRAME_LEN.unpack_from(view, i)
+        i += FRAME_LEN.size
+        frames.append(bytes(view[i : i + n]))
+        i += n
+    return frames
+
+
+def summarize(points: Iterable[tuple[float, float, str]], cell_m: float) -> list[list]:
+    """
+    Transmitters (x, y, tech name) binned into cell_m squares per tech, each
+    bin as [mean x, mean y, count, tech name]. A peer treats a bin as count
+    transmitters on that tech's carrier at its mean position, which is within
+    cell_m / sqrt(2) of every member, so the aggregated power is close for
+    receivers more than a few cells away.
+    """
+    bins: dict[tuple[str, int, int], list[float]] = {}
+    for x, y, tech in points:
+        b = bins.setdefault((tech, int(x // cell_m), int(y // cell_m)), [0.0, 0.0, 0])
+        b[0] += x
+        b[1] += y
+        b[2] += 1
+    return [[sx / n, sy / n, n, tech] for (tech, _, _), (sx, sy, n) in bins.items()]
+
+
+class _Peer:
+    """Outgoing side of the link to one peer: a bounded queue drained in batches."""
+
+    def __init__(self, spec: NodeSpec):
+        self.spec = spec
+        self.queue: queue.Queue[bytes] = queue.Queue(MAX_PENDING_FRAMES)
+        self.summary: bytes | None = None
+        self.wake = threading.Event()
+        self.connected = False
+        self.frames_sent = 0
+        self.batches_sent = 0
+        self.bytes_sent = 0
+        self.frames_dropped = 0
+
+    def put(self, frame: bytes) -> bool:
+        try:
+            self.queue.put_nowait(frame)
+        except queue.Full:
+            self.frames_dropped += 1
+            return False
+        self.wake.set()
+        return True
+
+    def batch(self) -> list[bytes]:
+        frames = []
+        size = 0
+        while size < MAX_BATCH_BYTES:
+            try:
+                frame = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            frames.append(frame)
+            size += len(frame) + FRAME_LEN.size
+        return frames
+
+    def stats(self) -> dict:
+        return {
+            "address": self.spec.address,
+            "connected": self.connected,
+            "pending_frames": self.queue.qsize(),
+            "frames_sent": self.frames_sent,
+            "batches_sent": self.batches_sent,
+            "bytes_sent": self.bytes_sent,
+            "frames_dropped": self.frames_dropped,
+        }
+
+
+class ClusterNode:
+    """
+    One process of a simulation whose map is split into regions across nodes.
+    Frames addressed to a peer's subnet are queued for that peer and sent as
+    length-prefixed batches over one stream socket per peer, so a burst costs
+    one send instead of one per frame. Received frames go to on_frames.
+    Every summary_period_s the node sends each peer a summary of its own
+    transmitters, binned by summarize, and keeps the latest summary of every
+    peer as phantom towers and UEs that interfere with its own links, calling
+    on_summary after each update.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        nodes: dict[str, NodeSpec],
+        on_frames: Callable[[list[bytes]], None],
+        local_summary: Callable[[], dict],
+        summary_period_s: float = 0.5,
+        summary_cell_m: float = 25.0,
+        on_summary: Callable[[], None] | None = None,
+    ):
+        if name not in nodes:
+            raise ValueError(f"node {name} is not in the cluster")
+        self.name = name
+        self.spec = nodes[name]
+        self.on_frames = on_frames
+        self.local_summary = local_summary
+        self.summary_period_s = summary_period_s
+        self.summary_cell_m = summary_cell_m
+        self.on_summary = on_summary
+        self.peers = {n: _Peer(spec) for n, spec in nodes.items() if n != name}
+        # peer subnets checked in order for every frame leaving the local subnet
+        self._routes = [(p.spec.subnet, p) for p in self.peers.values()]
+        # replaced as a whole when a summary arrives, so readers need no lock;
+        # the UEs by the carrier frequency they transmit on
+        self.remote_towers: list[phy.Tower] = []
+        self.remote_ues: dict[float, list[phy.UE]] = {}
+        self._summaries: dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self.frames_received = 0
+        self.batches_received = 0
+        self._server: socket.socket | None = None
+        self.threads: list[threading.Thread] = []
+
+    def owns(self, x: float, y: float) -> bool:
+        return self.spec.region.contains(x, y)
+
+    # queue a frame for the peer owning dst; False when no peer owns it
+    def forward(self, dst: ipaddress.IPv4Address, frame: bytes) -> bool:
+        for subnet, peer in self._routes:
+            if dst in subnet:
+                peer.put(frame)
+                return True
+        return False
+
+    def start(self) -> None:
+        self._server = _listen(self.spec.address)
+        self._spawn(self.__accept, f"GluCluster{self.name}Accept")
+        for name, peer in self.peers.items():
+            self._spawn(self.__send, f"GluCluster{self.name}To{name}", peer)
+        self._spawn(self.__summarize, f"GluCluster{self.name}Summary")
+
+    def _spawn(self, target, name: str, *args) -> None:
+        t = threading.Thread(target=target, args=args, name=name, daemon=True)
+        t.start()
+        self.threads.append(t)
+
+    def __accept(self):
+        while True:
+            conn, _ = self._server.accept()
+            self._spawn(self.__receive, f"GluCluster{self.name}Receive", conn)
+
+    def __receive(self, conn: socket.socket):
+        with conn:
+            while True:
+                header = _recv_exact(conn, HEADER.size)
+                if header is None:
+                    return
+                kind, n = HEADER.unpack(header)
+                payload = _recv_exact(conn, n)
+                if payload is None:
+                    return
+                if kind == MSG_FRAMES:
+                    frames = decode_frames(payload)
+                    self.frames_received += len(frames)
+                    self.batches_received += 1
+                    self.on_frames(frames)
+                elif kind == MSG_SUMMARY:
+                    self._apply_summary(json.loads(payload))
+                    if self.on_summary:
+                        self.on_summary()
+
+    def __send(self, peer: _Peer):
+        while True:
+            try:
+                sock = _connect(peer.spec.address)
+            except OSError:
+                time.sleep(RECONNECT_S)
+                continue
+            peer.connected = True
+            try:
+                with sock:
+                    while True:
+                        peer.wake.wait(self.summary_period_s)
+                        peer.wake.clear()
+                        summary, peer.summary = peer.summary, None
+                        if summary is not None:
+                            sock.sendall(HEADER.pack(MSG_SUMMARY, len(summary)) + summary)
+                        while True:
+                            frames = peer.batch()
+                            if not frames:
+                                break
+                            message = encode_frames(frames)
+                            sock.sendall(message)
+                            peer.frames_sent += len(frames)
+                            peer.batches_sent += 1
+                            peer.bytes_sent += len(message)
+            except OSError as e:
+                logger.warning("cluster link %s -> %s lost: %s", self.name, peer.spec.name, e)
+            peer.connected = False
+            time.sleep(RECONNECT_S)
+
+    def __summarize(self):
+        while True:
+            time.sleep(self.summary_period_s)
+            local = self.local_summary()
+            message = json.dumps(
+                {
+                    "node": self.name,
+                    "towers": summarize(local["towers"], self.summary_cell_m),
+                    "ues": summarize(local["ues"], self.summary_cell_m),
+                }
+            ).encode()
+            for peer in self.peers.values():
+                peer.summary = message
+                peer.wake.set()
+
+    def _apply_summary(self, summary: dict) -> None:
+        with self._lock:
+            self._summaries[summary["node"]] = summary
+            towers, ues = [], {}
+            for s in self._summaries.values():
+                for x, y, n, tech in s["towers"]:
+                    towers.extend([phy.Tower(x, y, True, TECHS[tech])] * int(n))
+                for x, y, n, tech in s["ues"]:
+                    ues.setdefault(TECHS[tech].carrier_freq, []).extend([phy.UE(x, y)] * int(n))
+            self.remote_towers = towers
+            self.remote_ues = ues
+
+    def stats(self) -> dict:
+        return {
+            "node": self.name,
+            **self.spec.as_dict(),
+            "frames_received": self.frames_received,
+            "batches_received": self.batches_received,
+            "remote_towers": len(self.remote_towers),
+            "remote_ues": sum(len(ues) for ues in self.remote_ues.values()),
+            "peers": {name: peer.stats() for name, peer in self.peers.items()},
+        }
+
+
+def demo(n_nodes: int = 3, frames: int = 100000, base_port: int = 7100):
+    """Several nodes on localhost passing frames around a ring, without any data plane."""
+    nodes = {
+        f"n{i}": NodeSpec(
+            f"n{i}", f"127.0.0.1:{base_port + i}", f"10.0.{i}.0/24", [i * 100, 0, (i + 1) * 100, 100]
+        )
+        for i in range(n_nodes)
+    }
+    done = threading.Event()
+    received = [0]
+    lock = threading.Lock()
+
+    def on_frames(batch: list[bytes]):
+        with lock:
+            received[0] += len(batch)
+            if received[0] >= frames:
+                done.set()
+
+    cluster = [
+        ClusterNode(
+            name,
+            nodes,
+            on_frames,
+            lambda i=i: {
+                "towers": [(i * 100 + 50, 50, phy.LTE_20.name)],
+                "ues": [(i * 100 + 10, 10, phy.LTE_20.name)] * 3,
+            },
+            summary_period_s=0.1,
+        )
+        for i, name in enumerate(nodes)
+    ]
+    for node in cluster:
+        node.start()
+    frame = bytes(100)
+    start = time.monotonic()
+    for k in range(frames):
+        i = k % n_nodes
+        cluster[i].forward(ipaddress.ip_address(f"10.0.{(i + 1) % n_nodes}.1"), frame)
+    done.wait(30)
+    elapsed = time.monotonic() - start
+    time.sleep(0.3)
+    print(f"{received[0]} frames in {elapsed:.2f} s ({received[0] / elapsed:.0f} frames/s)")
+    for node in cluster:
+        print(json.dumps(node.stats()))
+
+
+if __name__ == "__main__":
+    demo()
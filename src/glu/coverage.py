@@ -0,0 +1,162 @@
+import math
+import struct
+import threading
+import zlib
+from typing import Callable
+
+import numpy as np
+
+import layer1 as phy
+
+TILE_PX = 128
+MAX_ZOOM = 4
+# towers whose mean power at a point is this far below the noise floor are ignored
+RANGE_MARGIN_DB = 10.0
+
+SINR_DB_RANGE = (-10.0, 30.0)
+RATE_MBPS_RANGE = (0.0, 300.0)
+
+
+class CoverageTiles:
+    """
+    Cached best-server SINR/rate tiles over the simulated map.
+    Zoom level z splits the map into 2^z × 2^z tiles of TILE_PX × TILE_PX samples.
+    A tile only depends on towers within their downlink range of it, so a tower
+    change invalidates just the tiles around its old and new position.
+    Every invalidation bumps a generation; a tile rendered while the generation
+    changed may predate the change, so it is returned but not cached. The
+    towers are read only after the generation, so a change made before that
+    read is always in the render.
+    """
+
+    def __init__(self, width_m: float, height_m: float):
+        self.width_m = width_m
+        self.height_m = height_m
+        self._tiles: dict[tuple, bytes] = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def resize(self, width_m: float, height_m: float) -> None:
+        self.width_m = width_m
+        self.height_m = height_m
+        self.clear()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._tiles = {}
+            self._generation += 1
+
+    def tile_bounds(self, z: int, tx: int, ty: int) -> tuple[float, float, float, float]:
+        n = 2**z
+        w = self.width_m / n
+        h = self.height_m / n
+        return (tx * w, ty * h, (tx + 1) * w, (ty + 1) * h)
+
+    # drop cached tiles that a tower at (x, y) reaches
+    def invalidate_around(self, x: float, y: float, tech: phy.TechProfile) -> None:
+        reach = tech.dl_range_m(RANGE_MARGIN_DB)
+        with self._lock:
+            stale = [
+                key
+                for key in self._tiles
+                if _bbox_dist(self.tile_bounds(*key[:3]), x, y) <= reach
+            ]
+            for key in stale:
+                del self._tiles[key]
+            self._generation += 1
+
+    def get_tile(
+        self,
+        z: int,
+        tx: int,
+        ty: int,
+        towers: Callable[[], list[phy.Tower]],
+        metric: str,
+        fmt: str,
+    ) -> bytes:
+        if not 0 <= z <= MAX_ZOOM or not (0 <= tx < 2**z and 0 <= ty < 2**z):
+            raise ValueError(f"tile {z}/{tx}/{ty} is out of range")
+        key = (z, tx, ty, metric, fmt)
+        with self._lock:
+            tile = self._tiles.get(key)
+            generation = self._generation
+        if tile is not None:
+            return tile
+
+        values = self.render(z, tx, ty, towers(), metric)
+        tile = encode_png(colorize(values, metric)) if fmt == "png" else encode_raw(values)
+        with self._lock:
+            if self._generation == generation:
+                self._tiles[key] = tile
+        return tile
+
+    # metric values (SINR dB or rate Mbps) of one tile, NaN where nothing is in range
+    def render(
+        self, z: int, tx: int, ty: int, towers: list[phy.Tower], metric: str
+    ) -> np.ndarray:
+        x0, y0, x1, y1 = self.tile_bounds(z, tx, ty)
+        in_range = [
+            t
+            for t in towers
+            if t.on and _bbox_dist((x0, y0, x1, y1), t.x, t.y) <= t.t.dl_range_m(RANGE_MARGIN_DB)
+        ]
+        # sample pixel centres
+        xs = x0 + (np.arange(TILE_PX) + 0.5) * (x1 - x0) / TILE_PX
+        ys = y0 + (np.arange(TILE_PX) + 0.5) * (y1 - y0) / TILE_PX
+        best, sinr, rate = phy.best_server_grid(xs, ys, in_range)
+        if metric == "rate":
+            values = rate / 1e6
+        else:
+            values = 10.0 * np.log10(np.maximum(sinr, 1e-30))
+        return np.where(best >= 0, values, np.nan)
+
+
+def _bbox_dist(bounds: tuple[float, float, float, float], x: float, y: float) -> float:
+    x0, y0, x1, y1 = bounds
+    dx = max(x0 - x, 0.0, x - x1)
+    dy = max(y0 - y, 0.0, y - y1)
+    return math.hypot(dx, dy)
+
+
+def encode_raw(values: np.ndarray) -> bytes:
+    """Row-major little-endian float16 samples, NaN where there is no coverage."""
+    return values.astype("<f2").tobytes()
+
+
+def colorize(values: np.ndarray, metric: str) -> np.ndarray:
+    lo, hi = RATE_MBPS_RANGE if metric == "rate" else SINR_DB_RANGE
+    t = np.clip((np.nan_to_num(values, nan=lo) - lo) / (hi - lo), 0.0, 1.0)
+    # blue -> green -> yellow -> red
+    stops = np.array(
+        [[0, 0, 255], [0, 200, 0], [255, 230, 0], [230, 0, 0]], dtype=np.float64
+    )
+    pos = t * (len(stops) - 1)
+    i = np.minimum(pos.astype(int), len(stops) - 2)
+    frac = (pos - i)[..., None]
+    rgb = stops[i] * (1 - frac) + stops[i + 1] * frac
+    alpha = np.where(np.isnan(values), 0, 110)[..., None]
+    return np.concatenate([rgb, alpha], axis=-1).astype(np.uint8)
+
+
+def encode_png(rgba: np.ndarray) -> bytes:
+    """Minimal RGBA8 PNG encoder."""
+    h, w, _ = rgba.shape
+
+    def chunk(tag: bytes, data: bytes) -> bytes:
+        return (
+            struct.pack(">I", len(data))
+            + tag
+            + data
+            + struct.pack(">I", zlib.crc32(tag + data) & 0xFFFFFFFF)
+        )
+
+    # filter type 0 at the start of each scanline
+    raw = np.concatenate(
+        [np.zeros((h, 1), dtype=np.uint8), rgba.reshape(h, w * 4)], axis=1
+    ).tobytes()
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", struct.pack(">IIBBBBB", w, h, 8, 6, 0, 0, 0))
+        + chunk(b"IDAT", zlib.compress(raw, 6))
+        + chunk(b"IEND", b"")
+    )
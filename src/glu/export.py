@@ -0,0 +1,123 @@
+import threading
+import time
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+from glu_state import DEFAULT_PATH, StateWriter
+from layer1.capacity import LINK_METRICS, link_quality
+
+if TYPE_CHECKING:
+    from .glu import Glu
+
+
+class StateExport:
+    """
+    Publishes positions, associations and packet counters of every UE and
+    tower into the shared-memory region of glu_state every period_s, and
+    their link figures every link_period_s or when the topology changes,
+    since those cost a UE × tower evaluation.
+    """
+
+    def __init__(
+        self,
+        glu: "Glu",
+        path: str = DEFAULT_PATH,
+        period_s: float = 0.1,
+        link_period_s: float = 1.0,
+    ):
+        self.glu = glu
+        self.path = path
+        self.period_s = period_s
+        self.link_period_s = link_period_s
+        self.writer = StateWriter(path)
+        self.updates = 0
+        self._links_s = 0.0
+        self._links_version: int | None = None
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def publish(self) -> None:
+        topology = self.glu.topology
+        ues = topology.ues
+        stations = topology.base_stations
+        index = {bs.id: j for j, bs in enumerate(stations)}
+        # connected_to is read once per UE: a handover may clear it in between
+        serving_ids = []
+        for ue in ues:
+            bs = ue.connected_to
+            serving_ids.append(bs.id if bs is not None else -1)
+        serving = np.array([index.get(i, -1) for i in serving_ids], dtype=np.int64)
+        l1ues = [ue.l1ue for ue in ues]
+        towers = [bs.tower for bs in stations]
+        ue_xy = np.array([(u.x, u.y) for u in l1ues]).reshape(-1, 2)
+        ue_values = {
+            "id": [ue.id for ue in ues],
+            "x": ue_xy[:, 0],
+            "y": ue_xy[:, 1],
+            "serving": serving_ids,
+            "queue": [ue.active_upload_packets + ue.active_download_packets for ue in ues],
+            "total_up": [ue.total_upload_packets for ue in ues],
+            "total_down": [ue.total_download_packets for ue in ues],
+        }
+        now_s = time.time()
+        links_s = None
+        if (
+            topology.version != self._links_version
+            or now_s - self._links_s >= self.link_period_s
+        ):
+            ue_active = np.array([ue.active_upload_packets > 0 for ue in ues], dtype=bool)
+            tower_busy = np.array(
+                [t.on and bs.active_upload_packets > 0 for bs, t in zip(stations, towers)],
+                dtype=bool,
+            )
+            quality = link_quality(ue_xy, towers, serving, ue_active, tower_busy)
+            ue_values.update({name: quality[name] for name in LINK_METRICS})
+            self._links_s = links_s = now_s
+            self._links_version = topology.version
+        served = serving >= 0
+        # a station uploads what it sends to UEs, so its counters are swapped for up/down
+        tower_values = {
+            "id": [bs.id for bs in stations],
+            "x": [t.x for t in towers],
+            "y": [t.y for t in towers],
+            "on": [t.on for t in towers],
+            "ues": np.bincount(serving[served], minlength=len(stations)),
+            "queue": [bs.active_upload_packets + bs.active_download_packets for bs in stations],
+            "total_up": [bs.total_download_packets for bs in stations],
+            "total_down": [bs.total_upload_packets for bs in stations],
+        }
+        self.writer.update(
+            ue_values, tower_values, len(ues), len(stations), links_s, topology.version
+        )
+        self.updates += 1
+
+    def stats(self) -> dict:
+        region = self.writer.region
+        return {
+            "path": self.path,
+            "period_s": self.period_s,
+            "link_period_s": self.link_period_s,
+            "updates": self.updates,
+            "ue_capacity": region.ue_capacity,
+            "tower_capacity": region.tower_capacity,
+            "bytes": len(region.map),
+        }
+
+    def __run(self):
+        while not self._stop.is_set():
+            start = time.monotonic()
+            self.publish()
+            self._stop.wait(max(0.0, self.period_s - (time.monotonic() - start)))
+        self.writer.close()
+
+    def run(self) -> threading.Thread:
+        self._thread = threading.Thread(target=self.__run, name="GluExport", daemon=True)
+        self._thread.start()
+        return self._thread
+
+    # stop publishing and remove the region
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
@@ -0,0 +1,307 @@
+import heapq
+import socket
+import struct
+import threading
+
+TCP = 6
+UDP = 17
+PROTOCOLS = {TCP: "tcp", UDP: "udp", 1: "icmp"}
+
+# TCP flags
+FIN = 0x01
+SYN = 0x02
+ACK = 0x10
+
+# ports of TCP and UDP
+_PORTS = struct.Struct("!HH")
+# ports, seq, ack, data offset and flags of TCP
+_TCP = struct.Struct("!HHIIBB")
+
+# (protocol, src ip, src port, dst ip, dst port); ips are the raw 4 header bytes
+FlowKey = tuple[int, bytes, int, bytes, int]
+
+# smoothing gain of the RTT estimate, as for TCP's SRTT (RFC 6298)
+RTT_ALPHA = 0.125
+
+
+def flow_key(frame: bytes) -> FlowKey | None:
+    """5-tuple of an IPv4 frame; ports are 0 for other protocols and non-first fragments."""
+    if len(frame) < 20 or frame[0] >> 4 != 4:
+        return None
+    proto = frame[9]
+    ihl = (frame[0] & 0x0F) * 4
+    sport = dport = 0
+    # only the first fragment carries the transport header
+    first_fragment = (frame[6] & 0x1F) == 0 and frame[7] == 0
+    if proto in (TCP, UDP) and first_fragment and len(frame) >= ihl + 4:
+        sport, dport = _PORTS.unpack_from(frame, ihl)
+    return (proto, frame[12:16], sport, frame[16:20], dport)
+
+
+class Flow:
+    """Counters of one direction of a 5-tuple."""
+
+    __slots__ = (
+        "key",
+        "ue_id",
+        "packets",
+        "bytes",
+        "drops",
+        "queue_ms_total",
+        "queue_ms_max",
+        "queue_samples",
+        "first_ms",
+        "last_ms",
+        "srtt_ms",
+        "min_rtt_ms",
+        "rtt_samples",
+        "rtt_seq",
+        "rtt_sent_ms",
+        "live",
+    )
+
+    def __init__(self, key: FlowKey, ue_id: int | None, now_ms: float):
+        self.key = key
+        # the simulated UE at either end, None for traffic between unknown hosts
+        self.ue_id = ue_id
+        self.packets = 0
+        self.bytes = 0
+        self.drops = 0
+        self.queue_ms_total = 0.0
+        self.queue_ms_max = 0.0
+        self.queue_samples = 0
+        self.first_ms = now_ms
+        self.last_ms = now_ms
+        self.srtt_ms: float | None = None
+        self.min_rtt_ms: float | None = None
+        self.rtt_samples = 0
+        # one timed segment at a time: the ack that covers it and when it was seen
+        self.rtt_seq: int | None = None
+        self.rtt_sent_ms = 0.0
+        self.live = True
+
+    def to_dict(self, now_ms: float) -> dict:
+        proto, src, sport, dst, dport = self.key
+        return {
+            "proto": PROTOCOLS.get(proto, str(proto)),
+            "src": f"{socket.inet_ntoa(src)}:{sport}",
+            "dst": f"{socket.inet_ntoa(dst)}:{dport}",
+            "ue": self.ue_id,
+            "packets": self.packets,
+            "bytes": self.bytes,
+            "drops": self.drops,
+            "queue_ms_mean": (
+                self.queue_ms_total / self.queue_samples if self.queue_samples else 0.0
+            ),
+            "queue_ms_max": self.queue_ms_max,
+            "rtt_ms": self.srtt_ms,
+            "min_rtt_ms": self.min_rtt_ms,
+            "rtt_samples": self.rtt_samples,
+            "age_s": (now_ms - self.first_ms) / 1000,
+            "idle_s": (now_ms - self.last_ms) / 1000,
+        }
+
+
+class FlowTable:
+    """
+    Per-flow counters for the frames entering the Python forwarding path,
+    keyed by the 5-tuple of each direction.
+    Every update is a dict lookup plus a few counter increments. Idle flows
+    expire on a timing wheel that is advanced lazily: a flow sits in the slot
+    of its earliest possible expiry and is only looked at again when that slot
+    comes due, so expiry costs amortized O(1) per flow. When max_flows flows
+    are tracked, a new flow evicts the one closest to expiring.
+    TCP RTT is estimated passively: one segment per direction is timed from
+    when it enters the simulation until the ack covering it enters from the
+    other end.
+    Frames forwarded by the native data plane are not seen.
+    Off by default, so the forwarding path pays nothing for it until
+    POST /control/flows (or headless.py --flows) turns it on.
+    """
+
+    def __init__(
+        self, max_flows: int = 65536, idle_timeout_s: float = 30.0, tick_ms: int = 1000
+    ):
+        self.enabled: bool = False
+        self.max_flows = max_flows
+        self.idle_ms = idle_timeout_s * 1000
+        self.tick_ms = tick_ms
+        self._lock = threading.Lock()
+        self._flows: dict[FlowKey, Flow] = {}
+        self._slots: list[list[Flow]] = [[] for _ in range(int(self.idle_ms // tick_ms) + 2)]
+        self._tick: int | None = None
+        # ue id -> [packets, bytes, drops, live flows]; survives flow expiry
+        self._ues: dict[int, list[int]] = {}
+        self.expired = 0
+        self.evicted = 0
+
+    def clear(self) -> None:
+        with self._lock:
+            self._flows = {}
+            self._slots = [[] for _ in self._slots]
+            self._tick = None
+            self._ues = {}
+            self.expired = 0
+            self.evicted = 0
+
+    def observe(self, frame: bytes, now_ms: float, ue_id: int | None) -> Flow | None:
+        """Count a frame entering the simulation; ue_id is only used for a new flow."""
+        if not self.enabled:
+            return None
+        key = flow_key(frame)
+        if key is None:
+            return None
+        with self._lock:
+            self._advance(now_ms)
+            flow = self._flows.get(key)
+            if flow is None:
+                flow = self._insert(key, ue_id, now_ms)
+            flow.packets += 1
+            flow.bytes += len(frame)
+            flow.last_ms = now_ms
+            if flow.ue_id is not None:
+                agg = self._ues[flow.ue_id]
+                agg[0] += 1
+                agg[1] += len(frame)
+            if key[0] == TCP:
+                self._time_tcp(frame, key, flow, now_ms)
+        return flow
+
+    def drop(self, flow: Flow | None) -> None:
+        if flow is None:
+            return
+        with self._lock:
+            flow.drops += 1
+            if flow.ue_id is not None and flow.ue_id in self._ues:
+                self._ues[flow.ue_id][2] += 1
+
+    # time a frame of the flow waited behind earlier frames on an emulated link
+    def queued(self, flow: Flow | None, wait_ms: float) -> None:
+        if flow is None:
+            return
+        wait_ms = max(0.0, wait_ms)
+        with self._lock:
+            flow.queue_ms_total += wait_ms
+            flow.queue_samples += 1
+            if wait_ms > flow.queue_ms_max:
+                flow.queue_ms_max = wait_ms
+
+    def _insert(self, key: FlowKey, ue_id: int | None, now_ms: float) -> Flow:
+        if len(self._flows) >= self.max_flows:
+            self._evict_one()
+        flow = Flow(key, ue_id, now_ms)
+        self._flows[key] = flow
+        self._schedule(flow)
+        if ue_id is not None:
+            agg = self._ues.get(ue_id)
+            if agg is None:
+                agg = self._ues[ue_id] = [0, 0, 0, 0]
+            agg[3] += 1
+        return flow
+
+    def _remove(self, flow: Flow) -> None:
+        flow.live = False
+        del self._flows[flow.key]
+        if flow.ue_id is not None:
+            self._ues[flow.ue_id][3] -= 1
+
+    def _schedule(self, flow: Flow) -> None:
+        due = int((flow.last_ms + self.idle_ms) // self.tick_ms)
+        # never into a slot that is already being or has been drained
+        due = max(due, self._tick + 1)
+        self._slots[due % len(self._slots)].append(flow)
+
+    def _advance(self, now_ms: float) -> None:
+        tick = int(now_ms // self.tick_ms)
+        if self._tick is None:
+            self._tick = tick
+            return
+        if tick <= self._tick:
+            return
+        # after a long gap every slot is due once
+        start = max(self._tick + 1, tick - len(self._slots) + 1)
+        self._tick = tick
+        for t in range(start, tick + 1):
+            slot = self._slots[t % len(self._slots)]
+            if not slot:
+                continue
+            self._slots[t % len(self._slots)] = []
+            for flow in slot:
+                if not flow.live:
+                    continue
+                if now_ms - flow.last_ms >= self.idle_ms:
+                    self._remove(flow)
+                    self.expired += 1
+                else:
+                    self._schedule(flow)
+
+    # evict the live flow in the slot that comes due first
+    def _evict_one(self) -> None:
+        n = len(self._slots)
+        base = (self._tick or 0) + 1
+        for i in range(n):
+            slot = self._slots[(base + i) % n]
+            while slot:
+                flow = slot.pop()
+                if flow.live:
+                    self._remove(flow)
+                    self.evicted += 1
+                    return
+
+    def _time_tcp(self, frame: bytes, key: FlowKey, flow: Flow, now_ms: float) -> None:
+        ihl = (frame[0] & 0x0F) * 4
+        if len(frame) < ihl + 14 or key[2] == 0:
+            return
+        _, _, seq, ack, offset, flags = _TCP.unpack_from(frame, ihl)
+        if flags & ACK:
+            reverse = self._flows.get((key[0], key[3], key[4], key[1], key[2]))
+            if (
+                reverse is not None
+                and reverse.rtt_seq is not None
+                and (ack - reverse.rtt_seq) & 0xFFFFFFFF < 0x80000000
+            ):
+                sample = now_ms - reverse.rtt_sent_ms
+                reverse.rtt_seq = None
+                reverse.rtt_samples += 1
+                if reverse.srtt_ms is None:
+                    reverse.srtt_ms = sample
+                    reverse.min_rtt_ms = sample
+                else:
+                    reverse.srtt_ms += RTT_ALPHA * (sample - reverse.srtt_ms)
+                    reverse.min_rtt_ms = min(reverse.min_rtt_ms, sample)
+        if flow.rtt_seq is not None:
+            return
+        total_len = (frame[2] << 8) | frame[3]
+        seg_len = total_len - ihl - (offset >> 4) * 4 + (1 if flags & (SYN | FIN) else 0)
+        # pure acks are not acknowledged, so they cannot be timed
+        if seg_len > 0:
+            flow.rtt_seq = (seq + seg_len) & 0xFFFFFFFF
+            flow.rtt_sent_ms = now_ms
+
+    def top(self, k: int = 10, by: str = "bytes", now_ms: float = 0.0) -> list[dict]:
+        with self._lock:
+            flows = heapq.nlargest(k, self._flows.values(), key=lambda f: getattr(f, by))
+            return [flow.to_dict(now_ms) for flow in flows]
+
+    def ue_flows(self, ue_id: int, now_ms: float = 0.0) -> list[dict]:
+        with self._lock:
+            flows = [f for f in self._flows.values() if f.ue_id == ue_id]
+            return [flow.to_dict(now_ms) for flow in flows]
+
+    def ue_totals(self) -> list[dict]:
+        with self._lock:
+            return [
+                {"ue": ue_id, "packets": p, "bytes": b, "drops": d, "flows": n}
+                for ue_id, (p, b, d, n) in sorted(self._ues.items())
+            ]
+
+    def summary(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "flows": len(self._flows),
+                "max_flows": self.max_flows,
+                "idle_timeout_s": self.idle_ms / 1000,
+                "expired": self.expired,
+                "evicted": self.evicted,
+            }
@@ -3,265 +3,800 @@ import threading
 import time
 from typing import List
 
+import numpy as np
+
 import layer1 as phy
+from layer1.core import RNG_SEED, packet_error_prob_bytes
+from layer1.interference import InterferenceIndex
+from layer1.rng import LOSS_DL, LOSS_UL, PHY_DL, PHY_UL
 import layer3 as net
-from .packet_queue import PacketQueue, Packet
+from .packet_queue import PacketQueue, Packet, corruption_mask
+from .profiler import Profiler, StageTimer
+from .flows import Flow, FlowTable
+from .coverage import CoverageTiles
+from .mobility import MobilityEngine
+from .history import LinkHistory
+from .timer import DeliveryTimer
+from .overload import OverloadMonitor, TICK_PHYSICS
+from .ip_pool import IpPool
+from .topology import Topology
+from .cluster import ClusterNode, NodeSpec
+from .export import StateExport
+from .scheduler import CellScheduler, DL, UL
 from queue import Queue
 from .model import UE, BaseStation
 
+# how long a poller thread blocks in the extension (with the GIL released) waiting for a frame;
+# also bounds how late it notices a pause
+POLL_TIMEOUT_MS = 50
+
+# frames of a flow created within this long of its burst's first frame join the burst
+# and reuse its link figures, up to MAX_BURST frames
+BURST_WINDOW_MS = 1.0
+MAX_BURST = 64
+
+# the interferer index is rebuilt at least this often while UEs move, so their
+# new positions are picked up
+INTERFERENCE_REBUILD_S = 1.0
+
 
 class Glu:
-    def __init__(self):
-        self.subnet = ipaddress.ip_network("10.0.0.0/24")
-        self.gateway_ip = ipaddress.ip_address("10.0.0.254")
+    def __init__(
+        self,
+        subnet: str = "10.0.0.0/24",
+        seed: int = RNG_SEED,
+        gateway_queues: int = 1,
+        history_max_ues: int = 10000,
+        timer_accuracy_us: float = 100.0,
+        netns_prefix: str = "cab",
+        transit: int = 0,
+    ):
+        self.subnet = ipaddress.ip_network(subnet)
+        # last usable host address of the subnet, e.g. 10.0.0.254 for a /24
+        self.gateway_ip = self.subnet.broadcast_address - 1
+        # each gateway TUN queue is drained by its own worker thread
+        self.gateway_queues = gateway_queues
+        # several Glus can share a host given disjoint subnets and their own namespace
+        # prefix and host link (10.200.<transit>.0/24) in layer3
+        self.netns_prefix = netns_prefix
         self.cabernet: net.Cabernet = net.Cabernet.with_internet(
-            str(self.gateway_ip), str(self.subnet)
+            str(self.gateway_ip), str(self.subnet), gateway_queues, netns_prefix, transit
         )
-        self.starting_ip: ipaddress.IPv4Address = ipaddress.ip_address("10.0.0.1")
-        self.last_assigned_ip: ipaddress.IPv4Address = None
+        self.starting_ip: ipaddress.IPv4Address = self.subnet.network_address + 1
+        self.ip_pool = IpPool(self.subnet, [self.gateway_ip], self.starting_ip)
 
-        self.ues: list[UE] = []
-        self.base_stations: list[BaseStation] = []
+        # readers take the current snapshot without locking; writers serialize on the lock
+        self.topology = Topology()
+        self._topology_lock = threading.RLock()
         self.ue_id_counter: int = 0
         self.tower_id_counter: int = 0
 
         self.log_queue = Queue()
+        # packets copied to log_queue for the web UI; off when nothing reads it
+        self.logging_packets: bool = True
         self.upload_queue = PacketQueue()
         self.download_queue = PacketQueue()
 
         self.frame_at_ue_ready = threading.Event()
         self.frame_at_tower_ready = threading.Event()
+        # deliver each queue's packets on time and measure how close they come
+        self.upload_timer = DeliveryTimer(timer_accuracy_us)
+        self.download_timer = DeliveryTimer(timer_accuracy_us)
 
         self.pause_event = threading.Event()
         self.paused = True
 
+        # when set, layer3 forwards natively and the Python forwarding threads idle
+        self.native_dataplane: bool = False
+        self.native_off_event = threading.Event()
+
         self.pixels_per_meter: float = 3.0
+        self.map_width_m: float = 500.0 / self.pixels_per_meter
+        self.map_height_m: float = 500.0 / self.pixels_per_meter
+        self.coverage = CoverageTiles(self.map_width_m, self.map_height_m)
 
         self.threads: list[threading.Thread] = []
 
         self.dropping_packets: bool = True
         self.delaying_packets: bool = True
+        # queue back-to-back frames of a flow as one burst evaluated once
+        self.coalescing: bool = True
+        self.burst_window_ms: float = BURST_WINDOW_MS
+
+        # per-link counter-based streams for shadowing and corruption draws
+        self.seed = seed
+        self.rng = phy.RngStreams(seed)
+        self.profiler = Profiler()
+        self.flows = FlowTable()
+        self.mobility = MobilityEngine(self, seed)
+        self.history = LinkHistory(self, max_ues=history_max_ues)
+        # degrades the emulation step by step when the loops fall behind
+        self.overload = OverloadMonitor()
+        # co-channel interferers near each receiver; every active one when pruning is off
+        self.interference = InterferenceIndex()
+        self.pruning_interference: bool = True
+        self._interference_built: tuple[int, float] | None = None  # (topology version, when)
+        self._interference_lock = threading.Lock()
+        # divides each tower's band among the UEs with frames queued on it
+        self.scheduler = CellScheduler()
+        # (kind, bs id, ue id) -> (valid until ms, link figures), used under TICK_PHYSICS
+        self._tick_links: dict[tuple[int, int, int], tuple[float, tuple]] = {}
+        # set by join_cluster when this Glu simulates one region of a larger map
+        self.cluster: ClusterNode | None = None
+        self._cluster_totals: dict[tuple[str, int], int] = {}
+        # set by export_state while local processes read the state from shared memory
+        self.export: StateExport | None = None
+
+    @property
+    def ues(self) -> tuple[UE, ...]:
+        return self.topology.ues
+
+    @property
+    def base_stations(self) -> tuple[BaseStation, ...]:
+        return self.topology.base_stations
+
+    @property
+    def ues_by_ip(self):
+        return self.topology.ues_by_ip
+
+    # swap in a new snapshot with the given UEs and/or base stations
+    def publish(self, ues=None, base_stations=None, aliases=None) -> Topology:
+        with self._topology_lock:
+            self.topology = self.topology.replace(ues, base_stations, aliases)
+            return self.topology
 
     def active_towers(self) -> list[phy.Tower]:
-        return [
-            bs.tower
-            for bs in self.base_stations
-            if bs.tower.on and bs.active_upload_packets > 0
-        ]
+        return self.topology.active_towers() + self.remote_towers()
 
     def active_ues(self) -> list[phy.UE]:
-        return [ue.l1ue for ue in self.ues if ue.active_upload_packets > 0]
+        return self.topology.active_ues() + self.remote_ues()
+
+    # transmitters of the other regions, as last summarized by their nodes
+    def remote_towers(self) -> list[phy.Tower]:
+        return self.cluster.remote_towers if self.cluster else []
+
+    # the remote UEs transmitting on carrier_hz, all of them when None
+    def remote_ues(self, carrier_hz: float | None = None) -> list[phy.UE]:
+        if self.cluster is None:
+            return []
+        remote = self.cluster.remote_ues
+        if carrier_hz is None:
+            return [ue for ues in remote.values() for ue in ues]
+        return remote.get(carrier_hz, [])
+
+    # simulate the region of node name: frames to the other nodes' subnets are sent
+    # to them and their transmitters interfere with the local links
+    def join_cluster(
+        self, name: str, nodes: dict[str, NodeSpec], summary_period_s: float = 0.5
+    ) -> ClusterNode:
+        if nodes[name].subnet != self.subnet:
+            raise ValueError(f"node {name} has subnet {nodes[name].subnet}, not {self.subnet}")
+        self.cluster = ClusterNode(
+            name,
+            nodes,
+            self.receive_remote_frames,
+            self.cluster_summary,
+            summary_period_s,
+            on_summary=self.push_links,
+        )
+        self.cluster.start()
+        return self.cluster
+
+    # publish the state into the shared-memory region at path (see glu_state) for
+    # local readers, replacing any previous export
+    def export_state(
+        self, path: str, period_s: float = 0.1, link_period_s: float = 1.0
+    ) -> StateExport:
+        self.stop_export()
+        self.export = StateExport(self, path, period_s, link_period_s)
+        self.export.run()
+        return self.export
+
+    def stop_export(self) -> None:
+        if self.export is not None:
+            self.export.stop()
+            self.export = None
+
+    # frames from another region enter like frames from the internet
+    def receive_remote_frames(self, frames: list[bytes]) -> None:
+        for frame in frames:
+            self.handle_uplink_frame(frame)
+        self.frame_at_ue_ready.set()
+
+    # positions and techs of the towers and UEs that transmitted since the previous
+    # summary; a UE transmits on the carrier of its serving tower
+    def cluster_summary(self) -> dict:
+        topology = self.topology
+        last = self._cluster_totals
+        towers, ues = [], []
+        for bs in topology.base_stations:
+            tower = bs.tower
+            total = bs.total_upload_packets
+            if tower.on and total != last.get(("bs", bs.id), 0):
+                towers.append((tower.x, tower.y, tower.t.name))
+            last[("bs", bs.id)] = total
+        for ue in topology.ues:
+            total = ue.total_upload_packets
+            bs = ue.connected_to
+            if bs is not None and total != last.get(("ue", ue.id), 0):
+                l1ue = ue.l1ue
+                ues.append((l1ue.x, l1ue.y, bs.tower.t.name))
+            last[("ue", ue.id)] = total
+        return {"towers": towers, "ues": ues}
 
     def add_ue(self, x: float, y: float) -> UE:
         ip = str(self.generate_next_ip())
         self.cabernet.create_ue(ip)
         l1ue = phy.UE(x, y)
-        ue = UE(self.ue_id_counter, l1ue, ip)
-        self.ues.append(ue)
-        self.ue_id_counter += 1
-        self.syncronize_map()
+        with self._topology_lock:
+            ue = UE(self.ue_id_counter, l1ue, ip)
+            self.ue_id_counter += 1
+            self.mobility.track(ue)
+            self.publish(ues=self.topology.ues + (ue,))
+            self.syncronize_map()
+        return ue
+
+    # provision many UEs at once: layer3 creates the namespaces in parallel and the
+    # association runs once at the end instead of after every UE
+    def add_ues(
+        self,
+        points: list[tuple[float, float]],
+        ips: list[str] | None = None,
+        ids: list[int] | None = None,
+    ) -> list[UE]:
+        taken: list[str] = []
+        try:
+            if ips is None:
+                for _ in points:
+                    taken.append(str(self.generate_next_ip()))
+            else:
+                for ip in ips:
+                    self.ip_pool.claim(ipaddress.ip_address(ip))
+                    taken.append(ip)
+            self.cabernet.create_ues(taken)
+        except ValueError:
+            self._release_ues(taken)
+            raise
+        ips = taken
+        if ids is None:
+            ids = list(range(self.ue_id_counter, self.ue_id_counter + len(points)))
+        added = []
+        with self._topology_lock:
+            for ue_id, (x, y), ip in zip(ids, points, ips):
+                ue = UE(ue_id, phy.UE(x, y), ip)
+                self.mobility.track(ue)
+                added.append(ue)
+            self.ue_id_counter = max([self.ue_id_counter - 1, *ids]) + 1
+            self.publish(ues=self.topology.ues + tuple(added))
+            self.syncronize_map()
+        return added
+
+    # undo a failed add_ues: layer3 keeps the UEs it created before the failure
+    def _release_ues(self, ips: list[str]) -> None:
+        for ip in ips:
+            try:
+                self.cabernet.delete_ue(ip)
+            except ValueError:
+                pass  # never created
+            self.ip_pool.release(ipaddress.ip_address(ip))
+
+    # take a UE out of the simulation and tear down its namespace
+    def remove_ue(self, ue_id: int) -> UE | None:
+        with self._topology_lock:
+            ue = self.get_ue(ue_id)
+            if ue is None:
+                return None
+            self.publish(ues=tuple(other for other in self.topology.ues if other is not ue))
+            self.mobility.untrack(ue)
+            # its queued frames no longer hold up the rest of the cell
+            self.scheduler.forget(ue)
+            self.history.forget_ue(ue.id)
+        self.cabernet.delete_ue(ue.ip)
+        self.ip_pool.release(ipaddress.ip_address(ue.ip))
+        self.push_links()
+        return ue
+
+    # move a single UE and re-attach only that UE
+    def move_ue(self, ue_id: int, x: float, y: float) -> UE | None:
+        ue = self.get_ue(ue_id)
+        if ue is None:
+            return None
+        ue.l1ue = phy.UE(x, y)
+        # a new version, so the interferer index picks up the move
+        self.publish()
+        self.mobility.set_position(ue, x, y)
+        self.mobility.reassociate_ue(ue)
+        self.push_links()
         return ue
 
     def get_ue(self, ue_id: int) -> UE | None:
-        for ue in self.ues:
-            if ue.id == ue_id:
-                return ue
-        return None
+        return self.topology.get_ue(ue_id)
 
     def update_ue_ip(self, ue_id: int):
+        ue = self.get_ue(ue_id)
+        if ue is None:
+            return
+        old_ip = ue.ip
         new_ip = str(self.generate_next_ip())
-        for ue in self.ues:
-            if ue.id == ue_id:
-                self.cabernet.change_ip(ue.ip, new_ip)
-                ue.ip = new_ip
-                break
+        self.cabernet.change_ip(old_ip, new_ip)
+        with self._topology_lock:
+            # the index holds both addresses while the UE changes over, then only the new one
+            self.publish(aliases={new_ip: ue})
+            ue.ip = new_ip
+            self.publish()
+        self.ip_pool.release(ipaddress.ip_address(old_ip))
+        self.push_links()
 
     def add_tower(self, x: float, y: float, on: bool = True) -> BaseStation:
         l1tower = phy.Tower(x, y, on)
-        bs = BaseStation(self.tower_id_counter, l1tower)
-        self.base_stations.append(bs)
-        self.tower_id_counter += 1
-        self.syncronize_map()
+        with self._topology_lock:
+            bs = BaseStation(self.tower_id_counter, l1tower)
+            self.tower_id_counter += 1
+            self.publish(base_stations=self.topology.base_stations + (bs,))
+            self.coverage.invalidate_around(x, y, l1tower.t)
+            self.syncronize_map()
         return bs
 
+    def update_tower(self, bs_id: int, x: float, y: float, on: bool) -> BaseStation | None:
+        bs = self.get_tower(bs_id)
+        if bs is None:
+            return None
+        with self._topology_lock:
+            tower = bs.tower
+            if (tower.x, tower.y, tower.on) != (x, y, on):
+                self.coverage.invalidate_around(tower.x, tower.y, tower.t)
+                bs.tower = phy.Tower(x, y, on, tower.t)
+                self.coverage.invalidate_around(x, y, tower.t)
+                self.publish()
+            self.syncronize_map()
+        return bs
+
+    def set_tech(self, tech: phy.TechProfile) -> None:
+        with self._topology_lock:
+            for bs in self.base_stations:
+                tower = bs.tower
+                bs.tower = phy.Tower(tower.x, tower.y, tower.on, tech)
+            self.publish()
+            self.coverage.clear()
+            self.push_links()
+
+    def coverage_tile(self, z: int, tx: int, ty: int, metric: str = "sinr", fmt: str = "png") -> bytes:
+        # read by get_tile after it has taken the cache generation
+        def towers() -> list[phy.Tower]:
+            return [bs.tower for bs in self.base_stations]
+
+        return self.coverage.get_tile(z, tx, ty, towers, metric, fmt)
+
     def get_tower(self, bs_id: int) -> BaseStation | None:
-        for bs in self.base_stations:
-            if bs.id == bs_id:
-                return bs
-        return None
+        return self.topology.get_tower(bs_id)
 
     # update the UE to tower associations based on current positions and tower states
     def syncronize_map(self):
-        for ue in self.ues:
-            best_bs = None
-            best_dist = float("inf")
-            for bs in self.base_stations:
-                if not bs.tower.on:
-                    continue
-                d_serv = phy.ue_tower_dist(ue.l1ue, bs.tower)
-                if d_serv < best_dist:
-                    best_dist = d_serv
-                    best_bs = bs
-            ue.connected_to = best_bs
+        with self._topology_lock:
+            topology = self.topology
+            towers = [(bs, bs.tower) for bs in topology.base_stations]
+            for ue in topology.ues:
+                l1ue = ue.l1ue
+                best_bs = None
+                best_dist = float("inf")
+                for bs, tower in towers:
+                    if not tower.on:
+                        continue
+                    d_serv = phy.ue_tower_dist(l1ue, tower)
+                    if d_serv < best_dist:
+                        best_dist = d_serv
+                        best_bs = bs
+                ue.connected_to = best_bs
+            self.mobility.sync_serving()
+            self.push_links()
+
+    # the index as last rebuilt; the forwarding path only reads it
+    def interference_index(self, topology: Topology) -> InterferenceIndex:
+        if self._interference_built is None:
+            self.rebuild_interference()
+        return self.interference
+
+    def rebuild_interference(self, max_age_s: float | None = INTERFERENCE_REBUILD_S) -> None:
+        """
+        Rebuild the interferer index if the topology changed since the last
+        build, or if that is older than max_age_s, which picks up moves and
+        re-associations that do not publish a new topology. Runs on the threads
+        that change the topology (through push_links) and on the mobility thread,
+        never on the forwarding path, which keeps using the previous grids until
+        the new ones replace them in one assignment.
+        """
+        topology = self.topology
+        now = time.monotonic()
+        with self._interference_lock:
+            built = self._interference_built
+            if (
+                built is not None
+                and built[0] == topology.version
+                and (max_age_s is None or now - built[1] < max_age_s)
+            ):
+                return
+            self.interference.build(
+                [
+                    (bs, bs.tower.x, bs.tower.y, bs.tower.t)
+                    for bs in topology.base_stations
+                    if bs.tower.on
+                ],
+                # a UE transmits on the carrier of its serving tower
+                [
+                    (ue, ue.l1ue.x, ue.l1ue.y, serving.tower.t)
+                    for ue in topology.ues
+                    if (serving := ue.connected_to) is not None
+                ],
+            )
+            self._interference_built = (topology.version, now)
+
+    # active UEs interfering with uplinks to bs: those transmitting on its carrier,
+    # which is the carrier of their own serving tower
+    def uplink_interferers(self, topology: Topology, bs: BaseStation) -> list[phy.UE]:
+        tower = bs.tower
+        carrier = tower.t.carrier_freq
+        if not self.pruning_interference:
+            local = []
+            for ue in topology.ues:
+                serving = ue.connected_to
+                if (
+                    ue.active_upload_packets > 0
+                    and serving is not None
+                    and serving.tower.t.carrier_freq == carrier
+                ):
+                    local.append(ue.l1ue)
+        else:
+            near = self.interference_index(topology).ues_near(tower.x, tower.y, tower.t)
+            local = [ue.l1ue for ue in near if ue.active_upload_packets > 0]
+        return local + self.remote_ues(carrier)
+
+    # active towers interfering with downlinks from bs to ue
+    def downlink_interferers(
+        self, topology: Topology, bs: BaseStation, ue: UE
+    ) -> list[phy.Tower]:
+        if not self.pruning_interference:
+            return topology.active_towers() + self.remote_towers()
+        l1ue = ue.l1ue
+        near = self.interference_index(topology).towers_near(l1ue.x, l1ue.y, bs.tower.t)
+        return [
+            other.tower
+            for other in near
+            if other.tower.on and other.active_upload_packets > 0
+        ] + self.remote_towers()
+
+    def configure_interference(
+        self, threshold_db: float, cutoff_m: float | None, enabled: bool = True
+    ) -> None:
+        with self._interference_lock:
+            self.interference.configure(threshold_db, cutoff_m)
+            self.pruning_interference = enabled
+            self._interference_built = None
+        self.push_links()
+
+    # recompute the per-link radio parameters used by the native data plane,
+    # and the interferer index the Python one reads them from
+    def push_links(self) -> None:
+        self.rebuild_interference()
+        if not self.native_dataplane:
+            return
+        topology = self.topology
+        links = []
+        for ue in topology.ues:
+            bs = ue.connected_to
+            if bs is None:
+                continue
+            tower = bs.tower
+            l1ue = ue.l1ue
+            ues = self.uplink_interferers(topology, bs)
+            towers = self.downlink_interferers(topology, bs, ue)
+            links.append(
+                (
+                    ue.ip,
+                    tower.upload_link(l1ue, ues, self.rng.link(PHY_UL, bs.id, ue.id)),
+                    tower.download_link(l1ue, towers, self.rng.link(PHY_DL, bs.id, ue.id)),
+                )
+            )
+        self.cabernet.set_links(links)
 
-    def try_poll_ue(self,src_ip) -> bool:
+    def try_poll_ue(self, src_ip) -> bool:
+        timer = self.profiler.sample("poll_ue")
         frame = self.cabernet.poll_frame_from_ue(src_ip)
+        if timer:
+            timer.mark("tun_poll")
         # None means no frame available
         if not frame:
             return False
-        
-        (src_ip, _) = extract_ips_from_frame(frame)
-
-        # packet source is internet: forward to tower
-        if ipaddress.ip_address(src_ip) not in self.subnet:
-            packet = Packet(now_in_ms(), frame, 0.0, None, None)
-            self.upload_queue.enqueue(packet)
-            self.log_queue.put(packet)
-            return True
-
-        src_ue = self.get_ue_by_ip(src_ip)
-
-        # source UE not found or not connected: drop frame
-        if not src_ue or src_ue.connected_to is None:
+        self.profiler.count("poll_ue")
+        return self.handle_uplink_frame(frame, timer)
+
+    # timeout_ms > 0 blocks until a frame arrives or the timeout passes
+    def try_poll_ues(self, timeout_ms: int = 0) -> bool:
+        timer = self.profiler.sample("poll_ues")
+        # with several gateway queues the gateway workers own the gateway
+        include_gateway = self.gateway_queues == 1
+        if timeout_ms:
+            frame = self.cabernet.poll_frame_timeout(timeout_ms, include_gateway)
+        else:
+            frame = self.cabernet.poll_frame(include_gateway)
+        if timer:
+            timer.mark("tun_poll")
+        # None means no frame available
+        if not frame:
             return False
+        self.profiler.count("poll_ues")
+        return self.handle_uplink_frame(frame, timer)
 
-
-        if not self.delaying_packets:
-            upload_latency = 0
+    def try_poll_gateway(self, queue: int, timeout_ms: int = 0) -> bool:
+        timer = self.profiler.sample("poll_gateway")
+        if timeout_ms:
+            frame = self.cabernet.poll_frame_from_gateway_timeout(queue, timeout_ms)
         else:
-            upload_latency = src_ue.connected_to.tower.upload_latency(
-                src_ue.l1ue, len(frame), self.active_ues()
-            )
-        packet_error_rate = src_ue.connected_to.tower.upload_packet_error_rate(
-            src_ue.l1ue, len(frame), self.active_ues()
-        )
-        packet = Packet(
-            now_in_ms() + upload_latency,
-            frame,
-            packet_error_rate,
-            src_ue,
-            src_ue.connected_to,
-        )
-        self.upload_queue.enqueue(packet)
-        self.log_queue.put(packet)
-        return True
-
-    def try_poll_ues(self) -> bool:
-        frame = self.cabernet.poll_frame()
+            frame = self.cabernet.poll_frame_from_gateway(queue)
+        if timer:
+            timer.mark("tun_poll")
         # None means no frame available
         if not frame:
             return False
+        self.profiler.count("poll_gateway")
+        return self.handle_uplink_frame(frame, timer)
 
-        (src, _) = extract_ips_from_frame(frame)
+    def handle_uplink_frame(self, frame: bytes, timer: StageTimer | None = None) -> bool:
+        # overloaded: drop before spending anything on the frame
+        if self.overload.shed():
+            return False
+        (src_ip, dst_ip) = extract_ips_from_frame(frame)
+        if timer:
+            timer.mark("extract_ips")
 
         # packet source is internet: forward to tower
-        if ipaddress.ip_address(src) not in self.subnet:
-            packet = Packet(now_in_ms(), frame, 0.0, None, None)
+        if ipaddress.ip_address(src_ip) not in self.subnet:
+            now = now_in_ms()
+            dst_ue = self.topology.ues_by_ip.get(dst_ip)
+            flow = self.flows.observe(frame, now, dst_ue.id if dst_ue else None)
+            if timer:
+                timer.mark("flows")
+            packet = Packet(now, frame, 0.0, None, None, flow=flow)
             self.upload_queue.enqueue(packet)
-            self.log_queue.put(packet)
+            self.log_packet(packet)
+            if timer:
+                timer.mark("enqueue")
             return True
 
-        src_ue = self.get_ue_by_ip(src)
+        topology = self.topology
+        src_ue = topology.ues_by_ip.get(src_ip)
+        now = now_in_ms()
+        flow = self.flows.observe(frame, now, src_ue.id if src_ue else None)
+        if timer:
+            timer.mark("flows")
 
         # source UE not found or not connected: drop frame
-        if not src_ue or src_ue.connected_to is None:
+        bs = src_ue.connected_to if src_ue else None
+        if bs is None:
+            self.flows.drop(flow)
+            self.upload_timer.count(unassociated=1)
             return False
 
+        packet = self.queue_frame(
+            True, bs, src_ue, frame, flow, (src_ip, dst_ip), now, topology, timer
+        )
+        self.log_packet(packet)
+        if timer:
+            timer.mark("enqueue")
+        return True
 
+    # queue a frame between a UE and its tower: the frame joins the flow's open burst on
+    # this tower if there is one, else the link is computed and the frame gets its own slot
+    def queue_frame(
+        self,
+        uplink: bool,
+        bs: BaseStation,
+        ue: UE,
+        frame: bytes,
+        flow: Flow | None,
+        ips: tuple,
+        now: float,
+        topology,
+        timer=None,
+    ) -> Packet:
+        queue = self.upload_queue if uplink else self.download_queue
+        phy_kind = PHY_UL if uplink else PHY_DL
+        burst = None
+        key = flow if flow is not None else ips
+        if self.coalescing:
+            burst = queue.open_burst(key, now, self.burst_window_ms, MAX_BURST)
+            if burst is not None and burst.bs is not bs:
+                burst = None
+        link = burst.link if burst is not None else self.tick_link(phy_kind, bs, ue, now)
+        if link is None:
+            phy_rng = self.rng.link(phy_kind, bs.id, ue.id)
+            if uplink:
+                link = bs.tower.upload_link(
+                    ue.l1ue, self.uplink_interferers(topology, bs), phy_rng
+                )
+            else:
+                link = bs.tower.download_link(
+                    ue.l1ue, self.downlink_interferers(topology, bs, ue), phy_rng
+                )
+            self.keep_tick_link(phy_kind, bs, ue, now, link)
+        prop_ms, ms_per_byte, ber = link
+        packet_error_rate = packet_error_prob_bytes(ber, len(frame))
         if not self.delaying_packets:
-            upload_latency = 0
+            arrival = now
         else:
-            upload_latency = src_ue.connected_to.tower.upload_latency(
-                src_ue.l1ue, len(frame), self.active_ues()
+            # the frame is sent once the frames ahead of it on this link are,
+            # at the share of the cell's band the scheduler gives the UE
+            start, sent = self.scheduler.reserve(
+                UL if uplink else DL, bs, ue, now, len(frame), ms_per_byte
             )
-        packet_error_rate = src_ue.connected_to.tower.upload_packet_error_rate(
-            src_ue.l1ue, len(frame), self.active_ues()
-        )
-        packet = Packet(
-            now_in_ms() + upload_latency,
-            frame,
-            packet_error_rate,
-            src_ue,
-            src_ue.connected_to,
-        )
-        self.upload_queue.enqueue(packet)
-        self.log_queue.put(packet)
-        return True
+            self.flows.queued(flow, start - now)
+            arrival = sent + prop_ms
+        if timer:
+            timer.mark("physics")
+        if uplink:
+            loss_rng = self.rng.link(LOSS_UL, bs.id, ue.id)
+            packet = Packet(arrival, frame, packet_error_rate, ue, bs, loss_rng, flow)
+        else:
+            loss_rng = self.rng.link(LOSS_DL, bs.id, ue.id)
+            packet = Packet(arrival, frame, packet_error_rate, bs, ue, loss_rng, flow)
+        if burst is None or not queue.append(burst, packet):
+            if self.coalescing:
+                queue.enqueue_burst(key, packet, bs, link, now)
+            else:
+                queue.enqueue(packet)
+        return packet
+
+    def log_packet(self, packet: Packet) -> None:
+        if self.logging_packets and self.overload.log_packet():
+            self.log_queue.put(packet)
+
+    # link figures computed within the last tick, only while degraded to TICK_PHYSICS
+    def tick_link(self, kind: int, bs: BaseStation, ue: UE, now_ms: float) -> tuple | None:
+        if self.overload.level < TICK_PHYSICS:
+            return None
+        cached = self._tick_links.get((kind, bs.id, ue.id))
+        if cached is None or cached[0] <= now_ms:
+            return None
+        return cached[1]
+
+    def keep_tick_link(
+        self, kind: int, bs: BaseStation, ue: UE, now_ms: float, link: tuple
+    ) -> None:
+        if self.overload.level >= TICK_PHYSICS:
+            self._tick_links[(kind, bs.id, ue.id)] = (now_ms + self.overload.tick_ms, link)
+
+    # report one iteration of a forwarding loop to the overload monitor
+    def observe_loop(self, loop: str, start: float, lag_ms: float) -> None:
+        level = self.overload.observe(loop, lag_ms, (time.perf_counter() - start) * 1000)
+        if level < TICK_PHYSICS and self._tick_links:
+            self._tick_links.clear()
 
     def try_poll_towers(self) -> bool:
-        ready_packets: List[Packet] = self.upload_queue.pop_arrived()
+        start = time.perf_counter()
+        lag_ms = self.upload_queue.lag_ms()
+        polled = self._poll_towers()
+        self.observe_loop("poll_towers", start, lag_ms)
+        return polled
+
+    def _poll_towers(self) -> bool:
+        timer = self.profiler.sample("poll_towers")
+        ready_packets: List[Packet] = self.upload_queue.pop_arrived(self.upload_timer.slack_ms)
+        if timer:
+            timer.mark("pop_arrived")
 
         # no packets to process: block until next poll
         if len(ready_packets) == 0:
             return False
-
-        for packet in ready_packets:
+        self.upload_timer.record(ready_packets)
+        self.profiler.count("poll_towers", len(ready_packets))
+
+        # one topology snapshot for the whole batch
+        topology = self.topology
+        corrupted = corruption_mask(ready_packets) if self.dropping_packets else None
+        forwarded = forwarded_bytes = dropped = unassociated = 0
+        for i, packet in enumerate(ready_packets):
             packet.deliver()
             # arrived packet is corrupted: continue
-            if self.dropping_packets:
-                if packet.is_corrupted():
-                    continue
-
-            (_, dst) = extract_ips_from_frame(packet.frame)
+            if corrupted is not None and corrupted[i]:
+                self.flows.drop(packet.flow)
+                dropped += 1
+                continue
 
-            # packet destination is internet: forward to cabernet
-            if ipaddress.ip_address(dst) not in self.subnet:
-                self.cabernet.send_frame(packet.frame)
+            (src, dst) = extract_ips_from_frame(packet.frame)
+            if timer:
+                timer.mark("extract_ips")
+
+            # packet destination is another region or the internet: forward to its node or cabernet
+            dst_ip = ipaddress.ip_address(dst)
+            if dst_ip not in self.subnet:
+                forwarded += 1
+                forwarded_bytes += len(packet.frame)
+                if self.cluster is None or not self.cluster.forward(dst_ip, packet.frame):
+                    self.cabernet.send_frame(packet.frame)
+                if timer:
+                    timer.mark("send_frame")
                 continue
 
-            dst_ue = self.get_ue_by_ip(dst)
+            dst_ue = topology.ues_by_ip.get(dst)
 
             # destination ip is in subnet but UE not found or not connected: drop packet
-            if not dst_ue or not dst_ue.connected_to:
+            bs = dst_ue.connected_to if dst_ue else None
+            if bs is None:
+                self.flows.drop(packet.flow)
+                unassociated += 1
                 continue
 
-            if not self.delaying_packets:
-                download_latency = 0
-            else:
-                download_latency = dst_ue.connected_to.tower.download_latency(
-                    dst_ue.l1ue, len(packet.frame), self.active_towers()
-                )
-
-
-            packet_error_rate = dst_ue.connected_to.tower.download_packet_error_rate(
-                dst_ue.l1ue, len(packet.frame), self.active_towers()
+            forwarded += 1
+            forwarded_bytes += len(packet.frame)
+            now = now_in_ms()
+            self.queue_frame(
+                False, bs, dst_ue, packet.frame, packet.flow, (src, dst), now, topology, timer
             )
-            packet = Packet(
-                now_in_ms() + download_latency,
-                packet.frame,
-                packet_error_rate,
-                dst_ue.connected_to,
-                dst_ue,
-            )
-            self.download_queue.enqueue(packet)
+            if timer:
+                timer.mark("enqueue")
+        self.upload_timer.count(forwarded, forwarded_bytes, dropped, unassociated)
         return True
 
     def try_send_frame(self) -> bool:
-        ready_packets: List[Packet] = self.download_queue.pop_arrived()
+        start = time.perf_counter()
+        lag_ms = self.download_queue.lag_ms()
+        sent = self._send_frames()
+        self.observe_loop("send", start, lag_ms)
+        return sent
+
+    def _send_frames(self) -> bool:
+        timer = self.profiler.sample("send")
+        ready_packets: List[Packet] = self.download_queue.pop_arrived(
+            self.download_timer.slack_ms
+        )
+        if timer:
+            timer.mark("pop_arrived")
 
         # no packets to process: block until next poll
         if len(ready_packets) == 0:
             return False
+        self.download_timer.record(ready_packets)
+        self.profiler.count("send", len(ready_packets))
 
-        for packet in ready_packets:
+        corrupted = corruption_mask(ready_packets) if self.dropping_packets else None
+        forwarded = forwarded_bytes = dropped = 0
+        for i, packet in enumerate(ready_packets):
             packet.deliver()
 
             # arrived packet is corrupted: continue
-            if self.dropping_packets:
-                if packet.is_corrupted():
-                    continue
+            if corrupted is not None and corrupted[i]:
+                self.flows.drop(packet.flow)
+                dropped += 1
+                continue
 
             self.cabernet.send_frame(packet.frame)
+            forwarded += 1
+            forwarded_bytes += len(packet.frame)
+            if timer:
+                timer.mark("send_frame")
+        self.download_timer.count(forwarded, forwarded_bytes, dropped)
         return True
 
-
-
     def __run_poll_ues(self):
         while True:
             if self.paused:
                 self.pause_event.wait()
                 continue
-            polled = self.try_poll_ues()
+            if self.native_dataplane:
+                self.native_off_event.wait()
+                continue
+            polled = self.try_poll_ues(POLL_TIMEOUT_MS)
+            if polled:
+                self.frame_at_ue_ready.set()
+
+    def __run_poll_gateway(self, queue: int):
+        while True:
+            if self.paused:
+                self.pause_event.wait()
+                continue
+            if self.native_dataplane:
+                self.native_off_event.wait()
+                continue
+            polled = self.try_poll_gateway(queue, POLL_TIMEOUT_MS)
             if polled:
                 self.frame_at_ue_ready.set()
 
@@ -270,26 +805,29 @@ class Glu:
             if self.paused:
                 self.pause_event.wait()
                 continue
+            if self.native_dataplane:
+                self.native_off_event.wait()
+                continue
+            # cleared before polling, so a frame queued after the poll still wakes the wait
+            self.frame_at_ue_ready.clear()
             polled = self.try_poll_towers()
             if polled:
                 self.frame_at_tower_ready.set()
             else:
-                should_sleep, timeout = self.upload_queue.next_ready_timeout()
-                if not should_sleep:
-                    continue
-                self.frame_at_ue_ready.wait(timeout=timeout)
+                self.upload_timer.wait(self.upload_queue, self.frame_at_ue_ready)
 
     def __run_send(self):
         while True:
             if self.paused:
                 self.pause_event.wait()
                 continue
+            if self.native_dataplane:
+                self.native_off_event.wait()
+                continue
+            self.frame_at_tower_ready.clear()
             sent = self.try_send_frame()
             if not sent:
-                should_sleep, timeout = self.download_queue.next_ready_timeout()
-                if not should_sleep:
-                    continue
-                self.frame_at_tower_ready.wait(timeout=timeout)
+                self.download_timer.wait(self.download_queue, self.frame_at_tower_ready)
 
     def __run_stat(self, log_to_sdout: bool = True):
         while True:
@@ -316,12 +854,12 @@ class Glu:
                     show += "\n" + "  not connected to any tower"
                 show += (
                     "\n"
-                    + f"  DL QPSK PER: {bs.tower.download_packet_error_rate(ue.l1ue, 1024, towers) if bs else 'N/A'}"
+                    + f"  DL PER: {bs.tower.download_packet_error_rate(ue.l1ue, 1024, towers) if bs else 'N/A'}"
                 )
 
                 show += (
                     "\n"
-                    + f"  UL QPSK PER: {bs.tower.upload_packet_error_rate(ue.l1ue, 1024, ues) if bs else 'N/A'}"
+                    + f"  UL PER: {bs.tower.upload_packet_error_rate(ue.l1ue, 1024, ues) if bs else 'N/A'}"
                 )
 
                 show += (
@@ -345,6 +883,16 @@ class Glu:
         poll_t.start()
         return poll_t
 
+    def run_poll_gateway(self, queue: int) -> threading.Thread:
+        poll_t = threading.Thread(
+            target=self.__run_poll_gateway,
+            args=(queue,),
+            name=f"GluPollGateway{queue}",
+            daemon=True,
+        )
+        poll_t.start()
+        return poll_t
+
     def run_poll_towers(self) -> threading.Thread:
         poll_t = threading.Thread(
             target=self.__run_poll_towers, name="GluPollTowers", daemon=True
@@ -364,68 +912,145 @@ class Glu:
         stat_t.start()
         return stat_t
 
-    def run(self, log_to_sdout: bool = True) -> None:
-        t1 = self.run_poll_ues()
-        t2 = self.run_poll_towers()
-        t3 = self.run_send()
-        t4 = self.run_stat(log_to_sdout)
-        self.threads.extend([t1, t2, t3, t4])
-
-    def run_single_threaded(self) -> None:
+    # stats redraws the terminal and glu_stat.txt; history samples link metrics for the UI
+    def run(self, log_to_sdout: bool = True, stats: bool = True, history: bool = True) -> None:
+        self.threads.extend([self.run_poll_ues(), self.run_poll_towers(), self.run_send()])
+        if stats:
+            self.threads.append(self.run_stat(log_to_sdout))
+        self.threads.append(self.mobility.run())
+        if history:
+            self.threads.append(self.history.run())
+        if self.gateway_queues > 1:
+            for q in range(self.gateway_queues):
+                self.threads.append(self.run_poll_gateway(q))
+
+    def run_single_threaded(self, history: bool = True) -> None:
         def single_thread_run():
             while True:
                 if self.paused:
                     self.pause_event.wait()
                     continue
+                if self.native_dataplane:
+                    self.native_off_event.wait()
+                    continue
+                busy = False
                 for ue in self.ues:
-                    self.try_poll_ue(ue.ip)
-                self.try_poll_ue(str(self.gateway_ip))
-                self.try_poll_towers()
-                self.try_send_frame()
+                    busy |= self.try_poll_ue(ue.ip)
+                for q in range(self.gateway_queues):
+                    busy |= self.try_poll_gateway(q)
+                busy |= self.try_poll_towers()
+                busy |= self.try_send_frame()
+                if not busy:
+                    self.idle_wait()
 
         t = threading.Thread( target=single_thread_run, name="GluAll", daemon=True)
         t.start()
         self.threads.append(t)
+        self.threads.append(self.mobility.run())
+        if history:
+            self.threads.append(self.history.run())
+
+    # ms the single loop can block for before a queued packet is due
+    def idle_timeout_ms(self) -> float:
+        # the blocking poll leaves out the gateway when it has queues of its own
+        cap = POLL_TIMEOUT_MS if self.gateway_queues == 1 else 1
+        deadlines = [
+            d
+            for d in (self.upload_queue.next_deadline(), self.download_queue.next_deadline())
+            if d is not None
+        ]
+        if not deadlines:
+            return cap
+        return max(0.0, min(cap, min(deadlines) - now_in_ms()))
+
+    # nothing was polled or delivered: block on the UE (and gateway) interfaces
+    # until the earlier queue deadline, taking any frame that comes in meanwhile;
+    # within a millisecond of it, only yield, as the poll timeout is in whole ms
+    def idle_wait(self) -> None:
+        wait_ms = self.idle_timeout_ms()
+        if wait_ms >= 1:
+            self.try_poll_ues(int(wait_ms))
+        else:
+            time.sleep(0)
 
     def block(self) -> None:
         for t in self.threads:
             t.join()
 
     def get_ue_by_ip(self, ip: str) -> UE | None:
-        for ue in self.ues:
-            if ue.ip == ip:
-                return ue
-        return None
+        return self.ues_by_ip.get(ip)
 
     def toggle_pause(self) -> None:
         self.paused = not self.paused
         if not self.paused:
             self.pause_event.set()
+        self.push_dataplane_flags()
 
     def toggle_drop(self) -> None:
         self.dropping_packets = not self.dropping_packets
+        self.push_dataplane_flags()
 
     def toggle_delay(self) -> None:
         self.delaying_packets = not self.delaying_packets
+        self.push_dataplane_flags()
+
+    # move forwarding between the Python threads and the native engine in layer3
+    def toggle_native_dataplane(self) -> None:
+        if self.native_dataplane:
+            self.native_dataplane = False
+            self.cabernet.stop_dataplane()
+            self.native_off_event.set()
+            return
+        self.native_off_event.clear()
+        self.native_dataplane = True
+        self.cabernet.start_dataplane(self.seed)
+        self.push_dataplane_flags()
+        self.push_links()
+
+    def push_dataplane_flags(self) -> None:
+        if not self.native_dataplane:
+            return
+        self.cabernet.set_dataplane_flags(
+            self.paused, self.dropping_packets, self.delaying_packets
+        )
 
-    def set_starting_ip(self, ip: str = "10.0.0.1") -> None:
-        self.starting_ip = ipaddress.ip_address(ip)
+    def toggle_coalescing(self) -> None:
+        self.coalescing = not self.coalescing
 
-    def generate_next_ip(self) -> ipaddress.IPv4Address:
-        last_ip = self.last_assigned_ip
+    def toggle_mobility(self) -> None:
+        self.mobility.running = not self.mobility.running
+
+    def toggle_flows(self) -> None:
+        self.flows.enabled = not self.flows.enabled
+        if not self.flows.enabled:
+            self.flows.clear()
 
-        if last_ip is None:
-            next_ip = self.starting_ip
+    def toggle_profile(self, sample_every: int = 100, trace_memory: bool = False) -> None:
+        if self.profiler.enabled:
+            self.profiler.disable()
         else:
-            next_ip = last_ip + 1
+            self.profiler.reset()
+            self.profiler.enable(sample_every, trace_memory)
 
-        self.last_assigned_ip = next_ip
+    def set_starting_ip(self, ip: str = "10.0.0.1") -> None:
+        self.starting_ip = ipaddress.ip_address(ip)
+        self.ip_pool.set_start(self.starting_ip)
 
-        return next_ip
+    def generate_next_ip(self) -> ipaddress.IPv4Address:
+        return self.ip_pool.allocate()
 
     def set_pixels_per_meter(self, ppm: float) -> None:
+        self.set_map_size(
+            self.map_width_m * self.pixels_per_meter / ppm,
+            self.map_height_m * self.pixels_per_meter / ppm,
+        )
         self.pixels_per_meter = ppm
 
+    def set_map_size(self, width_m: float, height_m: float) -> None:
+        self.map_width_m = width_m
+        self.map_height_m = height_m
+        self.coverage.resize(width_m, height_m)
+
 
 def extract_ips_from_frame(frame: bytes) -> tuple[str, str]:
     # assuming IPv4 and no options
@@ -434,8 +1059,9 @@ def extract_ips_from_frame(frame: bytes) -> tuple[str, str]:
     return (src_ip, dst_ip)
 
 
-def now_in_ms() -> int:
-    return int(time.time() * 1000)
+# wall-clock ms with sub-millisecond precision, the time base of packet arrivals
+def now_in_ms() -> float:
+    return time.time() * 1000
 
 
 def demo():
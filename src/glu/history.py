@@ -0,0 +1,299 @@
+import threading
+import time
+from typing import TYPE_CHECKING, Iterable
+
+import numpy as np
+
+from layer1.capacity import LINK_METRICS, link_quality
+
+if TYPE_CHECKING:
+    from .glu import Glu
+
+# (resolution in seconds, points kept) from finest to coarsest; each resolution is a
+# multiple of the previous one, whose points are averaged into it.
+# One minute at 1 s, ten at 10 s and an hour at 1 min: 180 points of 9 float32 UE
+# metrics, about 6.5 kB per UE and 65 MB for 10k UEs
+TIERS = ((1.0, 60), (10.0, 60), (60.0, 60))
+
+UE_METRICS = LINK_METRICS + ("queue", "up_pps", "down_pps")
+TOWER_METRICS = ("ues", "queue", "up_pps", "down_pps", "sinr_dl_db_mean")
+
+
+class _Tier:
+    __slots__ = ("resolution_s", "size", "ratio", "times", "data", "count")
+
+    def __init__(self, resolution_s: float, size: int, ratio: int, n_metrics: int):
+        self.resolution_s = resolution_s
+        self.size = size
+        # points of the finer tier averaged into one point of this one
+        self.ratio = ratio
+        self.times = np.full(size, np.nan)
+        self.data = np.full((0, size, n_metrics), np.nan, dtype=np.float32)
+        self.count = 0
+
+
+class MetricHistory:
+    """
+    Fixed-size history of a few metrics for up to max_entities UEs or towers.
+    Each tier is a ring of points shared by all entities, stored as one
+    (entities, points, metrics) float32 array; a full ring overwrites its
+    oldest point, so memory never exceeds memory_bytes(max_entities).
+    Entities missing from a sample get NaN for it, and NaNs are skipped
+    when averaging into coarser tiers. A forgotten entity's row is cleared
+    and handed to the next new entity, so churn does not use up max_entities.
+    """
+
+    def __init__(
+        self,
+        metrics: Iterable[str],
+        tiers: Iterable[tuple[float, int]] = TIERS,
+        max_entities: int = 10000,
+    ):
+        self.metrics = tuple(metrics)
+        self.max_entities = max_entities
+        self._lock = threading.Lock()
+        self.tiers: list[_Tier] = []
+        prev = None
+        for resolution_s, size in tiers:
+            ratio = 1 if prev is None else round(resolution_s / prev.resolution_s)
+            if prev is not None and (ratio < 1 or ratio > prev.size):
+                raise ValueError(f"tier of {resolution_s} s does not fit the previous tier")
+            prev = _Tier(resolution_s, size, ratio, len(self.metrics))
+            self.tiers.append(prev)
+        self.rows: dict[int, int] = {}  # entity id -> row
+        self._free: list[int] = []  # rows of forgotten entities
+        self._used = 0  # rows ever handed out
+        self.untracked: int = 0
+
+    def memory_bytes(self, entities: int | None = None) -> int:
+        n = self.max_entities if entities is None else entities
+        return sum(n * t.size * len(self.metrics) * 4 + t.size * 8 for t in self.tiers)
+
+    def _row(self, entity_id: int) -> int | None:
+        row = self.rows.get(entity_id)
+        if row is not None:
+            return row
+        if self._free:
+            row = self._free.pop()
+            self.rows[entity_id] = row
+            return row
+        row = self._used
+        if row >= self.max_entities:
+            self.untracked += 1
+            return None
+        capacity = len(self.tiers[0].data)
+        if row >= capacity:
+            new_capacity = min(self.max_entities, max(row + 1, 2 * capacity, 64))
+            for tier in self.tiers:
+                grown = np.full(
+                    (new_capacity, tier.size, len(self.metrics)), np.nan, dtype=np.float32
+                )
+                grown[:capacity] = tier.data
+                tier.data = grown
+        self._used += 1
+        self.rows[entity_id] = row
+        return row
+
+    # drop an entity that left the simulation; its row goes to the next new one
+    def forget(self, entity_id: int) -> None:
+        with self._lock:
+            row = self.rows.pop(entity_id, None)
+            if row is None:
+                return
+            for tier in self.tiers:
+                tier.data[row] = np.nan
+            self._free.append(row)
+
+    def record(self, now_s: float, ids: list[int], values: np.ndarray) -> None:
+        """Append one point at the finest resolution; values is shaped (len(ids), metrics)."""
+        with self._lock:
+            rows = [self._row(i) for i in ids]
+            keep = [k for k, row in enumerate(rows) if row is not None]
+            rows = np.array([rows[k] for k in keep], dtype=np.int64)
+
+            fine = self.tiers[0]
+            slot = fine.count % fine.size
+            fine.times[slot] = now_s
+            fine.data[:, slot] = np.nan
+            fine.data[rows, slot] = values[keep]
+            fine.count += 1
+
+            for prev, tier in zip(self.tiers, self.tiers[1:]):
+                if prev.count % tier.ratio:
+                    break
+                # average the last ratio points of the finer tier
+                last = (prev.count - 1 - np.arange(tier.ratio)) % prev.size
+                window = prev.data[:, last]
+                valid = ~np.isnan(window)
+                total = np.where(valid, window, 0.0).sum(axis=1)
+                n = valid.sum(axis=1)
+                slot = tier.count % tier.size
+                tier.times[slot] = prev.times[last[0]]
+                with np.errstate(invalid="ignore", divide="ignore"):
+                    tier.data[:, slot] = np.where(n > 0, total / n, np.nan)
+                tier.count += 1
+
+    def query(
+        self,
+        entity_id: int,
+        start_s: float | None = None,
+        end_s: float | None = None,
+        resolution_s: float | None = None,
+    ) -> dict | None:
+        """
+        Points of one entity between start_s and end_s (unix seconds), oldest first.
+        Without a resolution, the finest tier that still reaches back to start_s is used.
+        """
+        with self._lock:
+            row = self.rows.get(entity_id)
+            if row is None:
+                return None
+            if resolution_s is not None:
+                tier = min(self.tiers, key=lambda t: abs(t.resolution_s - resolution_s))
+            else:
+                tier = self.tiers[-1]
+                for t in self.tiers:
+                    oldest = np.nanmin(t.times) if t.count else np.inf
+                    if start_s is None or oldest <= start_s or t.count < t.size:
+                        tier = t
+                        break
+            n = min(tier.count, tier.size)
+            order = (tier.count - n + np.arange(n)) % tier.size
+            times = tier.times[order]
+            values = tier.data[row, order].astype(np.float64)
+        keep = np.ones(n, dtype=bool)
+        if start_s is not None:
+            keep &= times >= start_s
+        if end_s is not None:
+            keep &= times <= end_s
+        values = values[keep]
+        return {
+            "resolution_s": tier.resolution_s,
+            "t": times[keep].tolist(),
+            **{
+                name: [None if np.isnan(v) else float(v) for v in values[:, k]]
+                for k, name in enumerate(self.metrics)
+            },
+        }
+
+
+class LinkHistory:
+    """
+    Samples the link figures of every UE and the load of every tower once per
+    finest-tier period into bounded histories.
+    Link figures are the mean (unshadowed) ones of layer1.capacity.link_quality;
+    packet rates come from the per-UE and per-tower packet totals.
+    """
+
+    def __init__(
+        self,
+        glu: "Glu",
+        tiers: Iterable[tuple[float, int]] = TIERS,
+        max_ues: int = 10000,
+        max_towers: int = 1000,
+    ):
+        self.glu = glu
+        tiers = tuple(tiers)
+        self.period_s = tiers[0][0]
+        self.ues = MetricHistory(UE_METRICS, tiers, max_ues)
+        self.towers = MetricHistory(TOWER_METRICS, tiers, max_towers)
+        # (id) -> (upload total, download total) at the previous sample
+        self._last_ue: dict[int, tuple[int, int]] = {}
+        self._last_tower: dict[int, tuple[int, int]] = {}
+        self._last_s: float | None = None
+
+    def memory_bytes(self) -> int:
+        return self.ues.memory_bytes() + self.towers.memory_bytes()
+
+    def forget_ue(self, ue_id: int) -> None:
+        self.ues.forget(ue_id)
+        self._last_ue.pop(ue_id, None)
+
+    def summary(self) -> dict:
+        return {
+            "tiers": [
+                {"resolution_s": t.resolution_s, "points": t.size} for t in self.ues.tiers
+            ],
+            "ues": len(self.ues.rows),
+            "towers": len(self.towers.rows),
+            "max_ues": self.ues.max_entities,
+            "max_towers": self.towers.max_entities,
+            "memory_bytes": self.ues.memory_bytes(len(self.ues.rows))
+            + self.towers.memory_bytes(len(self.towers.rows)),
+            "max_memory_bytes": self.memory_bytes(),
+        }
+
+    @staticmethod
+    def _rates(entities, last: dict, dt: float | None) -> np.ndarray:
+        out = np.full((len(entities), 2), np.nan)
+        for k, e in enumerate(entities):
+            totals = (e.total_upload_packets, e.total_download_packets)
+            prev = last.get(e.id)
+            if prev is not None and dt:
+                out[k] = ((totals[0] - prev[0]) / dt, (totals[1] - prev[1]) / dt)
+            last[e.id] = totals
+        return out
+
+    def sample(self, now_s: float | None = None) -> None:
+        now_s = time.time() if now_s is None else now_s
+        dt = None if self._last_s is None else now_s - self._last_s
+        self._last_s = now_s
+
+        topology = self.glu.topology
+        ues = topology.ues
+        stations = topology.base_stations
+        towers = [bs.tower for bs in stations]
+        index = {bs.id: j for j, bs in enumerate(stations)}
+        serving = np.array(
+            [index.get(ue.connected_to.id, -1) if ue.connected_to else -1 for ue in ues],
+            dtype=np.int64,
+        )
+        l1ues = [ue.l1ue for ue in ues]
+        ue_xy = np.array([(u.x, u.y) for u in l1ues]).reshape(-1, 2)
+        ue_active = np.array([ue.active_upload_packets > 0 for ue in ues], dtype=bool)
+        tower_busy = np.array(
+            [t.on and bs.active_upload_packets > 0 for bs, t in zip(stations, towers)],
+            dtype=bool,
+        )
+        quality = link_quality(ue_xy, towers, serving, ue_active, tower_busy)
+
+        queue = np.array(
+            [ue.active_upload_packets + ue.active_download_packets for ue in ues], dtype=np.float64
+        )
+        ue_values = np.column_stack(
+            [quality[name] for name in LINK_METRICS] + [queue, self._rates(ues, self._last_ue, dt)]
+        ).reshape(len(ues), len(UE_METRICS))
+        self.ues.record(now_s, [ue.id for ue in ues], ue_values)
+        # a UE removed while this sample was taken was recorded again: drop it
+        live = self.glu.topology.ues
+        if len(self.ues.rows) > len(live):
+            live_ids = {ue.id for ue in live}
+            for ue_id in [i for i in list(self.ues.rows) if i not in live_ids]:
+                self.forget_ue(ue_id)
+
+        served = serving >= 0
+        attached = np.bincount(serving[served], minlength=len(stations))
+        sinr_sum = np.bincount(
+            serving[served], weights=quality["sinr_dl_db"][served], minlength=len(stations)
+        )
+        with np.errstate(invalid="ignore", divide="ignore"):
+            sinr_mean = np.where(attached > 0, sinr_sum / attached, np.nan)
+        tower_queue = np.array(
+            [bs.active_upload_packets + bs.active_download_packets for bs in stations],
+            dtype=np.float64,
+        )
+        # a station uploads what it sends to UEs, so its counters are swapped for up/down
+        tower_rates = self._rates(stations, self._last_tower, dt)[:, ::-1]
+        tower_values = np.column_stack([attached, tower_queue, tower_rates, sinr_mean]).reshape(len(stations), len(TOWER_METRICS))
+        self.towers.record(now_s, [bs.id for bs in stations], tower_values)
+
+    def __run(self):
+        while True:
+            start = time.monotonic()
+            self.sample()
+            time.sleep(max(0.0, self.period_s - (time.monotonic() - start)))
+
+    def run(self) -> threading.Thread:
+        t = threading.Thread(target=self.__run, name="GluHistory", daemon=True)
+        t.start()
+        return t
@@ -0,0 +1,91 @@
+import ipaddress
+import threading
+from collections import deque
+from typing import Iterable
+
+
+class IpPool:
+    """
+    Host address allocator for one subnet.
+    A bitmap tracks addresses in use, released addresses are reused first
+    from a free list, and never-used ones are handed out from a cursor, so
+    allocate and release are O(1) (amortized while the cursor skips
+    reserved addresses).
+    """
+
+    def __init__(
+        self,
+        subnet: ipaddress.IPv4Network,
+        reserved: Iterable[ipaddress.IPv4Address] = (),
+        start: ipaddress.IPv4Address | None = None,
+    ):
+        self.subnet = subnet
+        self._base = int(subnet.network_address)
+        # offsets 0 (network) and size - 1 (broadcast) are never handed out
+        self._size = subnet.num_addresses
+        self._in_use = bytearray(self._size)
+        self._reserved: set[int] = {0, self._size - 1}
+        for ip in reserved:
+            self._reserved.add(self._offset(ip))
+        self._free: deque[int] = deque()
+        self._cursor = 1
+        self._scanned = 0
+        self.allocated: int = 0
+        self._lock = threading.Lock()
+        if start is not None:
+            self.set_start(start)
+
+    @property
+    def capacity(self) -> int:
+        return self._size - len(self._reserved)
+
+    def _offset(self, ip: ipaddress.IPv4Address) -> int:
+        offset = int(ip) - self._base
+        if not 0 <= offset < self._size:
+            raise ValueError(f"{ip} is not in {self.subnet}")
+        return offset
+
+    # hand out never-used addresses starting from ip
+    def set_start(self, ip: ipaddress.IPv4Address) -> None:
+        with self._lock:
+            self._cursor = self._offset(ip)
+            self._scanned = 0
+
+    def allocate(self) -> ipaddress.IPv4Address:
+        with self._lock:
+            while self._free:
+                offset = self._free.popleft()
+                if not self._in_use[offset] and offset not in self._reserved:
+                    return self._take(offset)
+            # walk the cursor at most once around the subnet
+            while self._scanned < self._size:
+                offset = self._cursor
+                self._cursor = (self._cursor + 1) % self._size
+                self._scanned += 1
+                if not self._in_use[offset] and offset not in self._reserved:
+                    return self._take(offset)
+            raise ValueError(f"subnet {self.subnet} has no free addresses")
+
+    def _take(self, offset: int) -> ipaddress.IPv4Address:
+        self._in_use[offset] = 1
+        self.allocated += 1
+        return ipaddress.IPv4Address(self._base + offset)
+
+    # mark a specific address as used, e.g. when restoring a saved topology
+    def claim(self, ip: ipaddress.IPv4Address) -> None:
+        with self._lock:
+            offset = self._offset(ip)
+            if offset in self._reserved:
+                raise ValueError(f"{ip} is reserved")
+            if self._in_use[offset]:
+                raise ValueError(f"{ip} is already in use")
+            self._take(offset)
+
+    def release(self, ip: ipaddress.IPv4Address) -> None:
+        with self._lock:
+            offset = self._offset(ip)
+            if not self._in_use[offset]:
+                return
+            self._in_use[offset] = 0
+            self.allocated -= 1
+            self._free.append(offset)
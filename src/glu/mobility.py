@@ -0,0 +1,361 @@
+import csv
+import threading
+import time
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+import layer1 as phy
+from .model import UE
+
+if TYPE_CHECKING:
+    from .glu import Glu
+
+# mobility models
+STATIC = 0
+RANDOM_WAYPOINT = 1
+LINEAR = 2
+TRACE = 3
+
+MODELS = {
+    "static": STATIC,
+    "random_waypoint": RANDOM_WAYPOINT,
+    "linear": LINEAR,
+    "trace": TRACE,
+}
+
+
+class MobilityEngine:
+    """
+    Steps every tracked UE position at once on each tick.
+    Positions live in struct-of-arrays form (one row per UE, in the order the
+    UEs were tracked, a removed UE's row taken over by the last one); only
+    UEs whose nearest active tower changed are re-associated.
+    """
+
+    # the per-row arrays, and the value rows beyond the tracked ones hold
+    ROW_ARRAYS = {
+        "pos": 0,
+        "target": 0,
+        "vel": 0,
+        "speed": 0,
+        "min_speed": 0,
+        "max_speed": 0,
+        "pause_s": 0,
+        "resume_at": 0,
+        "model": 0,
+        "serving": -1,
+        "trace_start": 0,
+        "trace_end": 0,
+        "trace_cursor": 0,
+    }
+
+    def __init__(self, glu: "Glu", seed: int, tick_hz: float = 10.0):
+        self.glu = glu
+        self.tick_hz = tick_hz
+        self.running: bool = False
+        self.rng = np.random.Generator(np.random.Philox(seed))
+        self._lock = threading.Lock()
+
+        self.ues: list[UE] = []
+        self.index: dict[int, int] = {}  # UE id -> row
+        self._n = 0
+        self.pos = np.zeros((0, 2))
+        self.target = np.zeros((0, 2))
+        self.vel = np.zeros((0, 2))
+        self.speed = np.zeros(0)
+        self.min_speed = np.zeros(0)
+        self.max_speed = np.zeros(0)
+        self.pause_s = np.zeros(0)
+        self.resume_at = np.zeros(0)
+        self.model = np.zeros(0, dtype=np.int8)
+        self.serving = np.zeros(0, dtype=np.int64)  # index into the tower arrays, -1 if none
+
+        # trace samples of all UEs concatenated, sorted by (row, time)
+        self.trace_t = np.zeros(0)
+        self.trace_xy = np.zeros((0, 2))
+        self.trace_start = np.zeros(0, dtype=np.int64)
+        self.trace_end = np.zeros(0, dtype=np.int64)
+        self.trace_cursor = np.zeros(0, dtype=np.int64)
+
+        self.sim_time: float = 0.0
+        self.last_tick_s: float = 0.0
+        self.handovers: int = 0
+
+    def _grow(self, n: int) -> None:
+        capacity = len(self.speed)
+        if n <= capacity:
+            return
+        new_capacity = max(n, 2 * capacity, 64)
+
+        def grow(a: np.ndarray, fill=0) -> np.ndarray:
+            out = np.full((new_capacity,) + a.shape[1:], fill, dtype=a.dtype)
+            out[:capacity] = a
+            return out
+
+        for name, fill in self.ROW_ARRAYS.items():
+            setattr(self, name, grow(getattr(self, name), fill))
+
+    def track(self, ue: UE) -> None:
+        with self._lock:
+            row = self._n
+            self._grow(row + 1)
+            self.ues.append(ue)
+            self.index[ue.id] = row
+            self.pos[row] = (ue.l1ue.x, ue.l1ue.y)
+            self.model[row] = STATIC
+            self._n += 1
+
+    # stop moving a UE; the last row moves into its place
+    def untrack(self, ue: UE) -> None:
+        with self._lock:
+            row = self.index.pop(ue.id, None)
+            if row is None:
+                return
+            last = self._n - 1
+            for name, fill in self.ROW_ARRAYS.items():
+                a = getattr(self, name)
+                a[row] = a[last]
+                a[last] = fill
+            moved = self.ues.pop()
+            if row != last:
+                self.ues[row] = moved
+                self.index[moved.id] = row
+            self._n = last
+
+    def set_position(self, ue: UE, x: float, y: float) -> None:
+        with self._lock:
+            row = self.index[ue.id]
+            self.pos[row] = (x, y)
+
+    def set_model(
+        self,
+        ue_ids: list[int],
+        model: str,
+        min_speed: float = 1.0,
+        max_speed: float = 2.0,
+        pause_s: float = 0.0,
+        heading_deg: float | None = None,
+    ) -> None:
+        code = MODELS[model]
+        with self._lock:
+            rows = np.array([self.index[i] for i in ue_ids], dtype=np.int64)
+            if len(rows) == 0:
+                return
+            if code == TRACE and not np.all(self.trace_end[rows] > self.trace_start[rows]):
+                raise ValueError("trace model requires a loaded trace for every UE")
+            self.model[rows] = code
+            self.min_speed[rows] = min_speed
+            self.max_speed[rows] = max_speed
+            self.pause_s[rows] = pause_s
+            self.resume_at[rows] = self.sim_time
+            self.speed[rows] = self.rng.uniform(min_speed, max_speed, len(rows))
+            if code == RANDOM_WAYPOINT:
+                self.target[rows] = self._random_points(len(rows))
+            elif code == LINEAR:
+                if heading_deg is None:
+                    heading = self.rng.uniform(0.0, 2 * np.pi, len(rows))
+                else:
+                    heading = np.full(len(rows), np.radians(heading_deg))
+                self.vel[rows, 0] = np.cos(heading) * self.speed[rows]
+                self.vel[rows, 1] = np.sin(heading) * self.speed[rows]
+            elif code == TRACE:
+                self.trace_cursor[rows] = self.trace_start[rows]
+
+    def load_trace(self, path: str) -> list[int]:
+        """
+        Load a CSV trace with rows "t,ue_id,x,y" (seconds, meters).
+        Time is relative to when the trace model is assigned; positions are
+        interpolated linearly between samples and held after the last one.
+        The new trace replaces the old one: UEs playing a trace that are not
+        in the file stop where they are (static model).
+        Returns the UE ids that got a trace.
+        """
+        samples: dict[int, list[tuple[float, float, float]]] = {}
+        with open(path, newline="") as f:
+            for row in csv.reader(f):
+                if not row or row[0].startswith("#") or row[0] == "t":
+                    continue
+                t, ue_id, x, y = row[:4]
+                samples.setdefault(int(ue_id), []).append((float(t), float(x), float(y)))
+
+        with self._lock:
+            unknown = [i for i in samples if i not in self.index]
+            if unknown:
+                raise ValueError(f"trace references unknown UEs {unknown}")
+            times, points = [], []
+            self.trace_start[: self._n] = 0
+            self.trace_end[: self._n] = 0
+            offset = 0
+            for ue_id, rows in sorted(samples.items(), key=lambda s: self.index[s[0]]):
+                rows.sort()
+                row = self.index[ue_id]
+                self.trace_start[row] = offset
+                self.trace_end[row] = offset + len(rows)
+                offset += len(rows)
+                times.extend(r[0] for r in rows)
+                points.extend((r[1], r[2]) for r in rows)
+            self.trace_t = np.array(times, dtype=np.float64)
+            self.trace_xy = np.array(points, dtype=np.float64).reshape(-1, 2)
+            self.trace_cursor[: self._n] = self.trace_start[: self._n]
+            n = self._n
+            orphaned = (self.model[:n] == TRACE) & (self.trace_end[:n] == self.trace_start[:n])
+            self.model[:n][orphaned] = STATIC
+        return list(samples)
+
+    def _random_points(self, n: int) -> np.ndarray:
+        return np.column_stack(
+            (
+                self.rng.uniform(0.0, self.glu.map_width_m, n),
+                self.rng.uniform(0.0, self.glu.map_height_m, n),
+            )
+        )
+
+    def step(self, dt: float) -> np.ndarray:
+        """Advance every moving UE by dt seconds; returns the rows that moved."""
+        with self._lock:
+            return self._step(dt)
+
+    # rows are only meaningful while the lock is held: untrack moves them
+    def _step(self, dt: float) -> np.ndarray:
+        n = self._n
+        self.sim_time += dt
+        model = self.model[:n]
+        pos = self.pos[:n]
+        moved = np.zeros(n, dtype=bool)
+
+        rwp = np.flatnonzero((model == RANDOM_WAYPOINT) & (self.resume_at[:n] <= self.sim_time))
+        if len(rwp):
+            delta = self.target[rwp] - pos[rwp]
+            dist = np.hypot(delta[:, 0], delta[:, 1])
+            step = self.speed[rwp] * dt
+            arrived = dist <= step
+            go = ~arrived
+            pos[rwp[go]] += delta[go] * (step[go] / dist[go])[:, None]
+            done = rwp[arrived]
+            if len(done):
+                pos[done] = self.target[done]
+                self.target[done] = self._random_points(len(done))
+                self.speed[done] = self.rng.uniform(self.min_speed[done], self.max_speed[done])
+                self.resume_at[done] = self.sim_time + self.pause_s[done]
+            moved[rwp] = True
+
+        lin = np.flatnonzero(model == LINEAR)
+        if len(lin):
+            p = pos[lin] + self.vel[lin] * dt
+            v = self.vel[lin]
+            bounds = np.array([self.glu.map_width_m, self.glu.map_height_m])
+            # reflect off the map edges
+            low = p < 0.0
+            high = p > bounds
+            p = np.where(low, -p, p)
+            p = np.where(high, 2 * bounds - p, p)
+            v = np.where(low | high, -v, v)
+            pos[lin] = np.clip(p, 0.0, bounds)
+            self.vel[lin] = v
+            moved[lin] = True
+
+        tr = np.flatnonzero(model == TRACE)
+        if len(tr):
+            t = self.sim_time - self.resume_at[tr]
+            cursor = self.trace_cursor[tr]
+            end = self.trace_end[tr]
+            # advance each cursor to the last sample at or before t
+            while True:
+                nxt = cursor + 1
+                adv = (nxt < end) & (self.trace_t[np.minimum(nxt, len(self.trace_t) - 1)] <= t)
+                if not adv.any():
+                    break
+                cursor = np.where(adv, nxt, cursor)
+            self.trace_cursor[tr] = cursor
+            nxt = np.minimum(cursor + 1, end - 1)
+            t0 = self.trace_t[cursor]
+            t1 = self.trace_t[nxt]
+            span = np.where(t1 > t0, t1 - t0, 1.0)
+            frac = np.clip((t - t0) / span, 0.0, 1.0)[:, None]
+            pos[tr] = self.trace_xy[cursor] * (1 - frac) + self.trace_xy[nxt] * frac
+            moved[tr] = True
+
+        rows = np.flatnonzero(moved)
+        for row, (x, y) in zip(rows.tolist(), pos[rows].tolist()):
+            # replaced, not mutated, so readers never see half a move
+            self.ues[row].l1ue = phy.UE(x, y)
+        return rows
+
+    def reassociate_ue(self, ue: UE) -> int:
+        """Re-attach one UE to its nearest active tower; returns the handover count."""
+        with self.glu._topology_lock, self._lock:
+            row = self.index.get(ue.id)
+            if row is None:
+                return 0
+            return self._reassociate(np.array([row]))
+
+    # re-attach the given rows to their nearest active tower; associations are
+    # written under the topology lock, like syncronize_map's, and rows need
+    # the mobility lock, so the caller holds both
+    def _reassociate(self, rows: np.ndarray) -> int:
+        if len(rows) == 0:
+            return 0
+        towers = [(bs, bs.tower) for bs in self.glu.topology.base_stations]
+        active = [bs for bs, tower in towers if tower.on]
+        if not active:
+            best = np.full(len(rows), -1)
+        else:
+            txy = np.array([(tower.x, tower.y) for _, tower in towers if tower.on])
+            d2 = ((self.pos[rows, None, :] - txy[None, :, :]) ** 2).sum(axis=2)
+            best = np.argmin(d2, axis=1)
+        best_ids = np.array([bs.id for bs in active] + [-1])[best]
+        changed = np.flatnonzero(best_ids != self.serving[rows])
+        for i in changed.tolist():
+            row = rows[i]
+            self.serving[row] = best_ids[i]
+            self.ues[row].connected_to = active[best[i]] if best[i] >= 0 else None
+        self.handovers += len(changed)
+        return len(changed)
+
+    # keep the cached associations in line with a full syncronize_map pass
+    def sync_serving(self) -> None:
+        with self._lock:
+            for row, ue in enumerate(self.ues):
+                self.serving[row] = ue.connected_to.id if ue.connected_to else -1
+
+    def tick(self) -> None:
+        now = time.monotonic()
+        dt = now - self.last_tick_s if self.last_tick_s else 1.0 / self.tick_hz
+        self.last_tick_s = now
+        # one hold for both, so no UE is removed between the move and the handover
+        with self.glu._topology_lock, self._lock:
+            rows = self._step(dt)
+            self._reassociate(rows)
+        if len(rows):
+            self.glu.push_links()
+
+    def __run(self):
+        period = 1.0 / self.tick_hz
+        while True:
+            if not self.running:
+                self.last_tick_s = 0.0
+                # nothing moves: rebuild the interferer index only for a new topology
+                self.glu.rebuild_interference(None)
+                time.sleep(period)
+                continue
+            start = time.monotonic()
+            self.tick()
+            self.glu.rebuild_interference()
+            time.sleep(max(0.0, period - (time.monotonic() - start)))
+
+    def run(self) -> threading.Thread:
+        t = threading.Thread(target=self.__run, name="GluMobility", daemon=True)
+        t.start()
+        return t
+
+    def summary(self) -> dict:
+        with self._lock:
+            counts = np.bincount(self.model[: self._n], minlength=len(MODELS))
+        return {
+            "running": self.running,
+            "tick_hz": self.tick_hz,
+            "sim_time": self.sim_time,
+            "handovers": self.handovers,
+            "models": {name: int(counts[code]) for name, code in MODELS.items()},
+        }
@@ -10,13 +10,20 @@ class UE:
         self.connected_to: BaseStation | None = None
         self.active_upload_packets: int = 0
         self.active_download_packets: int = 0
+        # packets ever sent and received, for rates
+        self.total_upload_packets: int = 0
+        self.total_download_packets: int = 0
         self.last_upload_epoch: int = 0
         self.last_download_epoch: int = 0
+        # when the radio link in each direction finishes its current transmissions (ms)
+        self.upload_busy_until_ms: float = 0.0
+        self.download_busy_until_ms: float = 0.0
         self.lock = threading.Lock()
 
     def inc_upload_packets(self):
         with self.lock:
             self.active_upload_packets += 1
+            self.total_upload_packets += 1
             self.last_upload_epoch = int(time.time() * 1000)
 
     def dec_upload_packets(self):
@@ -26,12 +33,27 @@ class UE:
     def inc_download_packets(self):
         with self.lock:
             self.active_download_packets += 1
+            self.total_download_packets += 1
             self.last_download_epoch = int(time.time() * 1000)
 
     def dec_download_packets(self):
         with self.lock:
             self.active_download_packets -= 1
 
+    # queue a transmission of tx_ms behind the ones already on the uplink;
+    # returns when it finishes (ms)
+    def reserve_upload(self, now_ms: float, tx_ms: float) -> float:
+        with self.lock:
+            start = max(now_ms, self.upload_busy_until_ms)
+            self.upload_busy_until_ms = start + tx_ms
+            return self.upload_busy_until_ms
+
+    def reserve_download(self, now_ms: float, tx_ms: float) -> float:
+        with self.lock:
+            start = max(now_ms, self.download_busy_until_ms)
+            self.download_busy_until_ms = start + tx_ms
+            return self.download_busy_until_ms
+
 
 class BaseStation:
     def __init__(self, id: int, l1tower: phy.Tower):
@@ -39,11 +61,14 @@ class BaseStation:
         self.id = id
         self.active_upload_packets: int = 0
         self.active_download_packets: int = 0
+        self.total_upload_packets: int = 0
+        self.total_download_packets: int = 0
         self.lock = threading.Lock()
 
     def inc_upload_packets(self):
         with self.lock:
             self.active_upload_packets += 1
+            self.total_upload_packets += 1
 
     def dec_upload_packets(self):
         with self.lock:
@@ -52,6 +77,7 @@ class BaseStation:
     def inc_download_packets(self):
         with self.lock:
             self.active_download_packets += 1
+            self.total_download_packets += 1
 
     def dec_download_packets(self):
         with self.lock:
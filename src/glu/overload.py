@@ -0,0 +1,152 @@
+import threading
+import time
+from typing import Iterable
+
+# degradation levels, each keeping the measures of the ones before it
+NORMAL = 0
+SAMPLE_LOG = 1  # only every LOG_SAMPLE-th packet goes to the packet log
+TICK_PHYSICS = 2  # link figures are reused for tick_ms instead of computed per packet
+SHED = 3  # frames entering the simulation are dropped and counted
+LEVELS = ("normal", "sample_log", "tick_physics", "shed")
+
+LOG_SAMPLE = 16
+# lag and iteration time (ms) entering SAMPLE_LOG, TICK_PHYSICS and SHED
+LAG_THRESHOLDS_MS = (10.0, 50.0, 200.0)
+ITERATION_THRESHOLDS_MS = (5.0, 20.0, 100.0)
+# a level is left once its thresholds times HYSTERESIS have not been crossed for cooldown_s
+HYSTERESIS = 0.5
+# weight of a new measurement in the smoothed lag and iteration time
+SMOOTHING = 0.1
+
+
+class OverloadMonitor:
+    """
+    Tracks how far the forwarding loops fall behind and picks a degradation level.
+    Every loop iteration reports the lag of its queue (now minus the arrival time
+    of the overdue head, 0 when nothing is overdue) and how long the iteration took.
+    Both are smoothed per loop; the worst loop sets the level, and a loop that
+    has not reported for cooldown_s no longer counts. Crossing a threshold
+    raises the level at once, while lowering it waits for cooldown_s below the
+    thresholds scaled by HYSTERESIS, one level at a time, so the loop does not flap.
+    """
+
+    def __init__(
+        self,
+        lag_thresholds_ms: Iterable[float] = LAG_THRESHOLDS_MS,
+        iteration_thresholds_ms: Iterable[float] = ITERATION_THRESHOLDS_MS,
+        cooldown_s: float = 2.0,
+        tick_ms: float = 10.0,
+    ):
+        self.configure(lag_thresholds_ms, iteration_thresholds_ms, cooldown_s, tick_ms)
+        self._lock = threading.Lock()
+        self.level: int = NORMAL
+        self._changed_at = time.monotonic()
+        # loop -> [smoothed lag ms, smoothed iteration ms, max lag ms, last report]
+        self._loops: dict[str, list[float]] = {}
+        self._log_counter = 0
+        self.log_skipped = 0
+        self.shed_frames = 0
+        # level -> times entered
+        self.entered = [0] * len(LEVELS)
+
+    def configure(
+        self,
+        lag_thresholds_ms: Iterable[float] = LAG_THRESHOLDS_MS,
+        iteration_thresholds_ms: Iterable[float] = ITERATION_THRESHOLDS_MS,
+        cooldown_s: float = 2.0,
+        tick_ms: float = 10.0,
+    ) -> None:
+        lag = tuple(lag_thresholds_ms)
+        iteration = tuple(iteration_thresholds_ms)
+        for thresholds in (lag, iteration):
+            if len(thresholds) != len(LEVELS) - 1 or list(thresholds) != sorted(thresholds):
+                raise ValueError(f"need {len(LEVELS) - 1} increasing thresholds, got {thresholds}")
+        self.lag_thresholds_ms = lag
+        self.iteration_thresholds_ms = iteration
+        self.cooldown_s = cooldown_s
+        self.tick_ms = tick_ms
+
+    def _target(self, scale: float, now: float) -> int:
+        target = NORMAL
+        for lag, iteration, _, updated in self._loops.values():
+            if now - updated > self.cooldown_s:
+                continue
+            for level in range(len(LEVELS) - 1, NORMAL, -1):
+                if (
+                    lag >= self.lag_thresholds_ms[level - 1] * scale
+                    or iteration >= self.iteration_thresholds_ms[level - 1] * scale
+                ):
+                    target = max(target, level)
+                    break
+        return target
+
+    def observe(self, loop: str, lag_ms: float, iteration_ms: float) -> int:
+        """Record one iteration of loop and return the level to apply."""
+        now = time.monotonic()
+        with self._lock:
+            m = self._loops.get(loop)
+            if m is None:
+                m = self._loops[loop] = [lag_ms, iteration_ms, lag_ms, now]
+            else:
+                m[0] += SMOOTHING * (lag_ms - m[0])
+                m[1] += SMOOTHING * (iteration_ms - m[1])
+                m[2] = max(m[2], lag_ms)
+                m[3] = now
+            return self._update(now)
+
+    def refresh(self) -> int:
+        """Re-evaluate the level without a new measurement, e.g. while loops are idle."""
+        with self._lock:
+            return self._update(time.monotonic())
+
+    def _update(self, now: float) -> int:
+        up = self._target(1.0, now)
+        if up > self.level:
+            self.level = up
+            self._changed_at = now
+            self.entered[up] += 1
+        elif self.level > NORMAL and now - self._changed_at >= self.cooldown_s:
+            if self._target(HYSTERESIS, now) < self.level:
+                self.level -= 1
+                self._changed_at = now
+                self.entered[self.level] += 1
+        return self.level
+
+    def log_packet(self) -> bool:
+        """Whether the next packet should go to the packet log."""
+        if self.level < SAMPLE_LOG:
+            return True
+        self._log_counter += 1
+        if self._log_counter % LOG_SAMPLE:
+            self.log_skipped += 1
+            return False
+        return True
+
+    def shed(self) -> bool:
+        """Whether to drop the frame now entering the simulation; drops are counted."""
+        # shedding can empty the queues and idle the loops that would report recovery
+        if self.level < SHED or self.refresh() < SHED:
+            return False
+        self.shed_frames += 1
+        return True
+
+    def stats(self) -> dict:
+        self.refresh()
+        with self._lock:
+            loops = {
+                name: {"lag_ms": lag, "iteration_ms": iteration, "max_lag_ms": max_lag}
+                for name, (lag, iteration, max_lag, _) in self._loops.items()
+            }
+            level = self.level
+        return {
+            "level": level,
+            "state": LEVELS[level],
+            "loops": loops,
+            "lag_thresholds_ms": list(self.lag_thresholds_ms),
+            "iteration_thresholds_ms": list(self.iteration_thresholds_ms),
+            "cooldown_s": self.cooldown_s,
+            "tick_ms": self.tick_ms,
+            "log_skipped": self.log_skipped,
+            "shed_frames": self.shed_frames,
+            "entered": {name: n for name, n in zip(LEVELS, self.entered)},
+        }
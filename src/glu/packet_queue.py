@@ -1,13 +1,21 @@
 import threading
-import random
 import time
 import heapq
+from operator import attrgetter
 from queue import Queue
-from typing import Tuple
+from typing import Hashable, List
 
-from typing import List
+import numpy as np
+
+import layer1 as phy
+from layer1.core import RNG_SEED
+from layer1.rng import uniform_batch
+from .flows import Flow
 from .model import UE, BaseStation
 
+# loss stream for packets created without a per-link stream
+DEFAULT_LOSS_STREAM = phy.RngStream(RNG_SEED, 0)
+
 
 class Packet:
     def __init__(
@@ -17,22 +25,28 @@ class Packet:
         packet_error_rate: float,
         src: UE | BaseStation | None,
         dst: UE | BaseStation | None,
+        rng: phy.RngStream | None = None,
+        flow: Flow | None = None,
     ):
         self.arrival_time = arrival_time
         self.frame = frame
         self.packet_error_rate = packet_error_rate
         self.src = src
         self.dst = dst
+        # the corruption draw is fixed by (stream, counter) when the packet is created
+        self.rng = rng or DEFAULT_LOSS_STREAM
+        self.rng_counter = self.rng.next_counter()
+        self.flow = flow
         if self.src:
             self.src.inc_upload_packets()
         if self.dst:
             self.dst.inc_download_packets()
 
     def is_corrupted(self) -> bool:
-        return random.random() < self.packet_error_rate
+        return self.rng.uniform_at(self.rng_counter) < self.packet_error_rate
 
-    def has_arrived(self) -> bool:
-        return time.time() * 1000 >= self.arrival_time
+    def has_arrived(self, slack_ms: float = 0.0) -> bool:
+        return time.time() * 1000 + slack_ms >= self.arrival_time
 
     def deliver(self):
         if self.src:
@@ -44,32 +58,138 @@ class Packet:
         return self.arrival_time < other.arrival_time
 
 
+ARRIVAL = attrgetter("arrival_time")
+
+
+class Burst:
+    """
+    Consecutive packets of one flow held by a single queue entry.
+    They share the link figures of the first one (link, as returned by
+    Tower.upload_link or download_link, towards base station bs) but keep
+    their own arrival times, error rates and corruption draws. The entry is
+    ordered by the arrival of its earliest packet; packets are appended in
+    arrival order, so appending never moves it in the heap.
+    """
+
+    __slots__ = ("key", "packets", "bs", "link", "opened_ms", "closed", "arrival_time")
+
+    def __init__(
+        self, key: Hashable, packet: Packet, bs: BaseStation, link: tuple, opened_ms: float
+    ):
+        self.key = key
+        self.packets: List[Packet] = [packet]
+        self.bs = bs
+        self.link = link
+        self.opened_ms = opened_ms
+        # set once the queue starts delivering it; nothing is appended after that
+        self.closed = False
+        self.arrival_time = packet.arrival_time
+
+    def __lt__(self, other) -> bool:
+        return self.arrival_time < other.arrival_time
+
+
 class PacketQueue:
     def __init__(self):
-        self._queue: List[Packet] = []
+        self._queue: List[Packet | Burst] = []
         # self._queue=Queue()
         self._lock = threading.Lock()
+        # key -> the burst still accepting packets of that flow
+        self._open: dict[Hashable, Burst] = {}
 
     def enqueue(self, item: Packet):
         # self._queue.put(item)
-        heapq.heappush(self._queue, item)
+        with self._lock:
+            heapq.heappush(self._queue, item)
+
+    # the burst of key that a packet created at now_ms can still join, if any
+    def open_burst(
+        self, key: Hashable, now_ms: float, window_ms: float, max_packets: int
+    ) -> Burst | None:
+        burst = self._open.get(key)
+        if (
+            burst is None
+            or burst.closed
+            or now_ms - burst.opened_ms > window_ms
+            or len(burst.packets) >= max_packets
+        ):
+            return None
+        return burst
+
+    # False when the burst closed in the meantime and the packet was not added
+    def append(self, burst: Burst, packet: Packet) -> bool:
+        with self._lock:
+            if burst.closed:
+                return False
+            burst.packets.append(packet)
+            return True
+
+    def enqueue_burst(
+        self, key: Hashable, packet: Packet, bs: BaseStation, link: tuple, now_ms: float
+    ) -> Burst:
+        burst = Burst(key, packet, bs, link, now_ms)
+        with self._lock:
+            self._open[key] = burst
+            heapq.heappush(self._queue, burst)
+        return burst
 
-    def pop_arrived(self) -> List[Packet]:
+    # packets due within slack_ms from now count as arrived; the undue rest of
+    # a burst goes back into the queue as its own entry
+    def pop_arrived(self, slack_ms: float = 0.0) -> List[Packet]:
         matched: List[Packet] = []
+        limit = time.time() * 1000 + slack_ms
+        queue = self._queue
+        bursts = False
 
-        while len(self._queue) > 0 and self._queue[0].has_arrived():
-        # while self._queue.qsize() > 0 and self._queue.queue[0].has_arrived():
-            item = heapq.heappop(self._queue)
-            # item = self._queue.get()
-            matched.append(item)
+        with self._lock:
+            while len(queue) > 0 and queue[0].arrival_time <= limit:
+            # while self._queue.qsize() > 0 and self._queue.queue[0].has_arrived():
+                item = heapq.heappop(queue)
+                # item = self._queue.get()
+                if type(item) is not Burst:
+                    matched.append(item)
+                    continue
+                if not item.closed:
+                    item.closed = True
+                    if self._open.get(item.key) is item:
+                        del self._open[item.key]
+                bursts = True
+                packets = item.packets
+                k = 0
+                while k < len(packets) and packets[k].arrival_time <= limit:
+                    k += 1
+                matched.extend(packets[:k])
+                if k < len(packets):
+                    item.packets = packets[k:]
+                    item.arrival_time = item.packets[0].arrival_time
+                    heapq.heappush(queue, item)
+        # bursts hand over runs of packets; restore arrival order across them
+        if bursts:
+            matched.sort(key=ARRIVAL)
         return matched
 
-    def next_ready_timeout(self) -> Tuple[bool, float | None]:
-        if len(self._queue) == 0:
-        # if self._queue.empty():
-            return True, None
-        # timeout_ms = self._queue.queue[0].arrival_time - time.time() * 1000
-        timeout_ms = self._queue[0].arrival_time - time.time() * 1000
-        if timeout_ms < 10:
-            return False, None
-        return True, timeout_ms / 1000
+    # arrival time (ms) of the earliest packet, None when empty
+    def next_deadline(self) -> float | None:
+        queue = self._queue
+        return queue[0].arrival_time if queue else None
+
+    # how long the earliest packet is overdue (ms), 0 when nothing is
+    def lag_ms(self) -> float:
+        deadline = self.next_deadline()
+        if deadline is None:
+            return 0.0
+        return max(0.0, time.time() * 1000 - deadline)
+
+    # entries in the heap; a burst counts once
+    def __len__(self) -> int:
+        return len(self._queue)
+
+
+def corruption_mask(packets: List[Packet]) -> np.ndarray:
+    """Corruption decisions for a whole batch, drawn in one vectorized call."""
+    n = len(packets)
+    pers = np.fromiter((p.packet_error_rate for p in packets), np.float64, n)
+    seeds = np.fromiter((p.rng.seed for p in packets), np.uint64, n)
+    streams = np.fromiter((p.rng.stream_id for p in packets), np.uint64, n)
+    counters = np.fromiter((p.rng_counter for p in packets), np.uint64, n)
+    return uniform_batch(seeds, streams, counters) < pers
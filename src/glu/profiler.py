@@ -0,0 +1,141 @@
+import threading
+import time
+import tracemalloc
+
+
+class StageTimer:
+    """Times consecutive stages of one sampled loop iteration."""
+
+    __slots__ = ("_profiler", "_root", "_last")
+
+    def __init__(self, profiler: "Profiler", root: str):
+        self._profiler = profiler
+        self._root = root
+        self._last = time.perf_counter_ns()
+
+    # record the time elapsed since the previous mark under the given stage
+    def mark(self, stage: str) -> None:
+        now = time.perf_counter_ns()
+        self._profiler.record(self._root, stage, now - self._last)
+        self._last = now
+
+
+class Profiler:
+    """
+    Sampling per-stage profiler for the Glu forwarding loops.
+    When disabled, sample() returns None and the loops skip every mark.
+    Frames handled per loop are counted on every iteration (not just the
+    sampled ones) to report throughput.
+    """
+
+    def __init__(self):
+        self.enabled: bool = False
+        self.sample_every: int = 100
+        self.trace_memory: bool = False
+        self._counter: int = 0
+        self._lock = threading.Lock()
+        # (root, stage) -> [count, total_ns, max_ns]
+        self._stages: dict[tuple[str, str], list[int]] = {}
+        self._mem_baseline: tracemalloc.Snapshot | None = None
+        # loop -> frames handled since _since
+        self._frames: dict[str, int] = {}
+        self._since: float = time.monotonic()
+
+    def enable(self, sample_every: int = 100, trace_memory: bool = False) -> None:
+        self.sample_every = max(1, sample_every)
+        self.trace_memory = trace_memory
+        if trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            self._mem_baseline = tracemalloc.take_snapshot()
+        self.enabled = True
+
+    def disable(self) -> None:
+        self.enabled = False
+        if self.trace_memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        self.trace_memory = False
+        self._mem_baseline = None
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stages = {}
+            self._frames = {}
+            self._since = time.monotonic()
+
+    # returns a timer for roughly one in sample_every calls, None otherwise
+    def sample(self, root: str) -> StageTimer | None:
+        if not self.enabled:
+            return None
+        self._counter += 1
+        if self._counter % self.sample_every:
+            return None
+        return StageTimer(self, root)
+
+    def count(self, root: str, frames: int = 1) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self._frames[root] = self._frames.get(root, 0) + frames
+
+    # frames per second handled by each loop since profiling was enabled or reset
+    def throughput(self) -> dict[str, float]:
+        with self._lock:
+            frames = dict(self._frames)
+            elapsed = time.monotonic() - self._since
+        return {root: n / elapsed for root, n in sorted(frames.items())} if elapsed > 0 else {}
+
+    def record(self, root: str, stage: str, elapsed_ns: int) -> None:
+        key = (root, stage)
+        with self._lock:
+            entry = self._stages.get(key)
+            if entry is None:
+                self._stages[key] = [1, elapsed_ns, elapsed_ns]
+                return
+            entry[0] += 1
+            entry[1] += elapsed_ns
+            if elapsed_ns > entry[2]:
+                entry[2] = elapsed_ns
+
+    def stats(self) -> list[dict]:
+        with self._lock:
+            items = list(self._stages.items())
+        return [
+            {
+                "loop": root,
+                "stage": stage,
+                "samples": count,
+                "total_ms": total / 1e6,
+                "mean_us": total / count / 1e3,
+                "max_us": max_ns / 1e3,
+            }
+            for (root, stage), (count, total, max_ns) in sorted(
+                items, key=lambda item: -item[1][1]
+            )
+        ]
+
+    # collapsed stack lines ("Glu;loop;stage <microseconds>") for flamegraph.pl / speedscope
+    def collapsed(self) -> str:
+        with self._lock:
+            items = list(self._stages.items())
+        lines = [
+            f"Glu;{root};{stage} {total // 1000}"
+            for (root, stage), (_, total, _) in sorted(items)
+        ]
+        return "\n".join(lines) + "\n" if lines else ""
+
+    # top allocation growth since profiling was enabled, grouped by source line
+    def memory_growth(self, limit: int = 10) -> list[dict]:
+        if not self.trace_memory or self._mem_baseline is None:
+            return []
+        snapshot = tracemalloc.take_snapshot()
+        diffs = snapshot.compare_to(self._mem_baseline, "lineno")[:limit]
+        return [
+            {
+                "location": str(diff.traceback),
+                "size_diff_kb": diff.size_diff / 1024,
+                "size_kb": diff.size / 1024,
+                "count_diff": diff.count_diff,
+            }
+            for diff in diffs
+        ]
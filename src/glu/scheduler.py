@@ -0,0 +1,290 @@
+import math
+import threading
+import time
+
+import numpy as np
+
+from .model import UE, BaseStation
+
+# how a cell divides its band among the UEs with queued frames each TTI
+FULL_BAND = "full"  # every UE gets the whole band, as if alone in the cell
+ROUND_ROBIN = "rr"  # equal shares
+PROPORTIONAL_FAIR = "pf"  # the band goes to the UE with the best rate over its average
+MODES = (FULL_BAND, ROUND_ROBIN, PROPORTIONAL_FAIR)
+
+UL = "ul"
+DL = "dl"
+
+# averaging windows of the allocated shares, which set how fast a UE's frames slow
+# down when others start sending, and of the proportional-fair throughput
+SHARE_WINDOW_TTIS = 10
+PF_WINDOW_TTIS = 100
+# TTIs replayed when a cell catches up after a quiet spell; older ones are skipped,
+# having decayed out of the averages
+MAX_CATCHUP_TTIS = 2 * PF_WINDOW_TTIS
+# floor on a share, so one frame never waits more than 1000 times its full-band time
+MIN_SHARE = 1e-3
+
+
+# exponential moving average of current after the rows of values, (steps, slots)
+def _average(current: np.ndarray, values: np.ndarray, alpha: float) -> np.ndarray:
+    n = len(values)
+    weights = alpha * (1.0 - alpha) ** np.arange(n - 1, -1, -1)
+    return current * (1.0 - alpha) ** n + weights @ values
+
+
+class _Cell:
+    """
+    The UEs of one tower in one direction, one slot per UE in arrays that the
+    per-TTI allocation works on as a whole. A UE is backlogged while its
+    queued frames keep it busy past the TTI.
+    """
+
+    def __init__(self, tti_ms: float):
+        self.tti_ms = tti_ms
+        self.lock = threading.Lock()
+        self.slots: dict[int, int] = {}  # UE id -> slot
+        self._free: list[int] = []
+        self.busy_until = np.zeros(0)  # ms at which each UE's queued frames are sent
+        self.rate = np.zeros(0)  # bytes per ms over the whole band, from the last frame
+        self.throughput = np.zeros(0)  # average bytes per ms actually allocated
+        self.share = np.zeros(0)  # average fraction of the band allocated
+        self.next_tti_ms: float | None = None
+        self.ttis = 0
+
+    # busy_until of a new slot carries over frames the UE queued before joining
+    def slot(self, ue_id: int, busy_until_ms: float = 0.0) -> int:
+        i = self.slots.get(ue_id)
+        if i is not None:
+            return i
+        if self._free:
+            i = self._free.pop()
+        else:
+            i = len(self.slots)
+            if i >= len(self.rate):
+                grow = max(8, len(self.rate))
+                for name in ("busy_until", "rate", "throughput", "share"):
+                    setattr(self, name, np.concatenate([getattr(self, name), np.zeros(grow)]))
+        self.slots[ue_id] = i
+        self.busy_until[i] = busy_until_ms
+        return i
+
+    def remove(self, ue_id: int) -> None:
+        i = self.slots.pop(ue_id, None)
+        if i is None:
+            return
+        self.busy_until[i] = self.rate[i] = self.throughput[i] = self.share[i] = 0.0
+        self._free.append(i)
+
+    def advance(self, now_ms: float, mode: str) -> None:
+        """Allocate every TTI that started before now_ms."""
+        tti = self.tti_ms
+        if self.next_tti_ms is None:
+            self.next_tti_ms = math.floor(now_ms / tti) * tti
+        n = int((now_ms - self.next_tti_ms) // tti) + 1
+        if n <= 0:
+            return
+        if n > MAX_CATCHUP_TTIS:
+            self.next_tti_ms += (n - MAX_CATCHUP_TTIS) * tti
+            n = MAX_CATCHUP_TTIS
+        busy_until, rate = self.busy_until, self.rate
+        starts = self.next_tti_ms + tti * np.arange(n)
+        # backlogged UEs of every TTI at once, (TTIs, slots)
+        active = busy_until[None, :] > starts[:, None]
+        if mode == ROUND_ROBIN:
+            alloc = active / np.maximum(active.sum(axis=1, keepdims=True), 1)
+            # the n moving-average steps in one go: older TTIs weigh less
+            self.share = _average(self.share, alloc, 1.0 / SHARE_WINDOW_TTIS)
+            self.throughput = _average(self.throughput, alloc * rate, 1.0 / PF_WINDOW_TTIS)
+        else:
+            # the winner of each TTI depends on the averages left by the previous one
+            for k in range(n):
+                alloc_k = np.zeros(len(rate))
+                if active[k].any():
+                    metric = np.where(active[k], rate / np.maximum(self.throughput, 1e-9), -1.0)
+                    alloc_k[int(np.argmax(metric))] = 1.0
+                self.share += (alloc_k - self.share) / SHARE_WINDOW_TTIS
+                self.throughput += (alloc_k * rate - self.throughput) / PF_WINDOW_TTIS
+        self.next_tti_ms += n * tti
+        self.ttis += n
+
+    def backlogged(self, now_ms: float) -> int:
+        return int(np.count_nonzero(self.busy_until > now_ms))
+
+    # average share of slot i; a UE that was idle joins with an equal split
+    def share_of(self, i: int, now_ms: float) -> float:
+        if self.busy_until[i] <= now_ms:
+            self.share[i] = max(self.share[i], 1.0 / (self.backlogged(now_ms) + 1))
+        return max(float(self.share[i]), MIN_SHARE)
+
+
+def _busy_until(direction: str, ue: UE) -> float:
+    return ue.upload_busy_until_ms if direction == UL else ue.download_busy_until_ms
+
+
+class CellScheduler:
+    """
+    Divides each tower's band among its UEs, per direction. Every TTI of the
+    tower's profile, the UEs with frames queued on the link get a fraction of
+    the band: equal shares under ROUND_ROBIN, all of it to the UE with the
+    highest rate over average throughput under PROPORTIONAL_FAIR. A UE's
+    share is averaged over SHARE_WINDOW_TTIS, and a frame it queues takes its
+    full-band transmission time divided by that share. TTIs are allocated
+    lazily, when a frame of the cell is queued, for all its UEs at once.
+
+    The time each UE's queued frames are sent is mirrored into its
+    upload_busy_until_ms and download_busy_until_ms, so it survives a handover
+    and a switch of mode: a slot joining a cell starts from it.
+    """
+
+    def __init__(self, mode: str = ROUND_ROBIN):
+        self.mode = FULL_BAND
+        self._cells: dict[tuple[str, int], _Cell] = {}
+        # (direction, UE id) -> base station id of the cell holding the UE
+        self._serving: dict[tuple[str, int], int] = {}
+        self._lock = threading.Lock()
+        self.configure(mode)
+
+    def configure(self, mode: str) -> None:
+        if mode not in MODES:
+            raise ValueError(f"unknown scheduler {mode!r}, expected one of {MODES}")
+        with self._lock:
+            # rr and pf keep the cells and their averages; the UEs' busy_until
+            # fields carry the queues into and out of FULL_BAND
+            if mode == FULL_BAND or self.mode == FULL_BAND:
+                self._cells = {}
+                self._serving = {}
+            self.mode = mode
+
+    def _cell(self, direction: str, bs: BaseStation, ue: UE) -> _Cell:
+        key = (direction, bs.id)
+        tti_ms = bs.tower.t.tti_ms
+        cell = self._cells.get(key)
+        previous = self._serving.get((direction, ue.id))
+        if cell is not None and cell.tti_ms == tti_ms and previous == bs.id:
+            return cell
+        with self._lock:
+            cell = self._cells.get(key)
+            if cell is None or cell.tti_ms != tti_ms:
+                cell = self._cells[key] = _Cell(tti_ms)
+            # handed over: leave the old cell
+            if previous is not None and previous != bs.id:
+                self._leave(direction, previous, ue.id)
+            self._serving[(direction, ue.id)] = bs.id
+        return cell
+
+    def _leave(self, direction: str, bs_id: int, ue_id: int) -> None:
+        cell = self._cells.get((direction, bs_id))
+        if cell is not None:
+            with cell.lock:
+                cell.remove(ue_id)
+
+    # the cell of bs if it holds ue, without adding it
+    def _held(self, direction: str, bs: BaseStation, ue: UE) -> _Cell | None:
+        if self._serving.get((direction, ue.id)) != bs.id:
+            return None
+        cell = self._cells.get((direction, bs.id))
+        if cell is None or cell.tti_ms != bs.tower.t.tti_ms:
+            return None
+        return cell
+
+    # drop a UE that left the simulation from the cells holding it
+    def forget(self, ue: UE) -> None:
+        with self._lock:
+            for direction in (UL, DL):
+                bs_id = self._serving.pop((direction, ue.id), None)
+                if bs_id is not None:
+                    self._leave(direction, bs_id, ue.id)
+
+    def reserve(
+        self,
+        direction: str,
+        bs: BaseStation,
+        ue: UE,
+        now_ms: float,
+        nbytes: int,
+        ms_per_byte: float,
+    ) -> tuple[float, float]:
+        """Queue nbytes on the link; returns when its transmission starts and ends (ms)."""
+        tx_ms = nbytes * ms_per_byte
+        if self.mode == FULL_BAND:
+            reserve = ue.reserve_upload if direction == UL else ue.reserve_download
+            sent = reserve(now_ms, tx_ms)
+            return sent - tx_ms, sent
+        cell = self._cell(direction, bs, ue)
+        with cell.lock:
+            cell.advance(now_ms, self.mode)
+            i = cell.slot(ue.id, _busy_until(direction, ue))
+            cell.rate[i] = 1.0 / ms_per_byte
+            share = cell.share_of(i, now_ms)
+            start = max(now_ms, float(cell.busy_until[i]))
+            sent = start + tx_ms / share
+            cell.busy_until[i] = sent
+            if direction == UL:
+                ue.upload_busy_until_ms = sent
+            else:
+                ue.download_busy_until_ms = sent
+        return start, sent
+
+    def expected_share(
+        self, direction: str, bs: BaseStation, ue: UE, now_ms: float | None = None
+    ) -> float:
+        """The share a frame queued now by ue would get."""
+        if self.mode == FULL_BAND:
+            return 1.0
+        if now_ms is None:
+            now_ms = time.time() * 1000
+        cell = self._cells.get((direction, bs.id))
+        if cell is None or cell.tti_ms != bs.tower.t.tti_ms:
+            return 1.0
+        with cell.lock:
+            cell.advance(now_ms, self.mode)
+            # read only: a UE not in the cell yet is not added to it
+            i = cell.slots.get(ue.id) if self._held(direction, bs, ue) is cell else None
+            share = float(cell.share[i]) if i is not None else 0.0
+            if i is None or cell.busy_until[i] <= now_ms:
+                # an idle UE joins the backlogged ones with an equal split
+                share = max(share, 1.0 / (cell.backlogged(now_ms) + 1))
+            return max(share, MIN_SHARE)
+
+    def backlog_ms(
+        self, direction: str, bs: BaseStation, ue: UE, now_ms: float | None = None
+    ) -> float:
+        """ms of queued transmissions still ahead of a frame ue queues now."""
+        if now_ms is None:
+            now_ms = time.time() * 1000
+        busy_until = _busy_until(direction, ue)
+        cell = self._held(direction, bs, ue) if self.mode != FULL_BAND else None
+        if cell is not None:
+            with cell.lock:
+                i = cell.slots.get(ue.id)
+                if i is not None:
+                    busy_until = float(cell.busy_until[i])
+        return max(0.0, busy_until - now_ms)
+
+    def stats(self) -> dict:
+        now_ms = time.time() * 1000
+        cells = {UL: [], DL: []}
+        with self._lock:
+            items = list(self._cells.items())
+        for (direction, bs_id), cell in items:
+            with cell.lock:
+                backlogged = cell.busy_until > now_ms
+                shares = cell.share[backlogged]
+                cells[direction].append(
+                    {
+                        "bs": bs_id,
+                        "tti_ms": cell.tti_ms,
+                        "ttis": cell.ttis,
+                        "ues": len(cell.slots),
+                        "backlogged": int(backlogged.sum()),
+                        "mean_share": float(shares.mean()) if len(shares) else None,
+                    }
+                )
+        return {
+            "mode": self.mode,
+            "share_window_ttis": SHARE_WINDOW_TTIS,
+            "pf_window_ttis": PF_WINDOW_TTIS,
+            "uplink": sorted(cells[UL], key=lambda c: c["bs"]),
+            "downlink": sorted(cells[DL], key=lambda c: c["bs"]),
+        }
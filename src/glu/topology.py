@@ -0,0 +1,74 @@
+from types import MappingProxyType
+from typing import Iterable
+
+import layer1 as phy
+from .model import UE, BaseStation
+
+
+class Topology:
+    """
+    Immutable view of the simulated towers and UEs.
+    Writers build a new one and publish it by rebinding Glu.topology, a single
+    reference swap, so a reader that takes the current snapshot once sees a
+    consistent set of towers and UEs without locking. Positions, on/off state
+    and tech are changed by replacing a UE's l1ue or a station's tower object,
+    never by mutating it, so those reads are consistent too.
+
+    The snapshot holds the UE and BaseStation records themselves, not copies,
+    so two UE fields are shared by every snapshot: connected_to, which the
+    association passes assign, and ip. Both are only written under the
+    topology lock of Glu, so writers never interleave, but a lock-free reader
+    can see them change under a snapshot; it reads each once per use. The ip
+    index is republished around an address change so that it always holds
+    the UE's current address.
+    """
+
+    __slots__ = ("ues", "base_stations", "ues_by_ip", "version")
+
+    def __init__(
+        self,
+        ues: Iterable[UE] = (),
+        base_stations: Iterable[BaseStation] = (),
+        version: int = 0,
+        aliases: dict[str, UE] | None = None,
+    ):
+        self.ues: tuple[UE, ...] = tuple(ues)
+        self.base_stations: tuple[BaseStation, ...] = tuple(base_stations)
+        # aliases are addresses a UE is about to take, indexed ahead of the change
+        self.ues_by_ip = MappingProxyType({**{ue.ip: ue for ue in self.ues}, **(aliases or {})})
+        self.version = version
+
+    def replace(
+        self,
+        ues: Iterable[UE] | None = None,
+        base_stations: Iterable[BaseStation] | None = None,
+        aliases: dict[str, UE] | None = None,
+    ) -> "Topology":
+        return Topology(
+            self.ues if ues is None else ues,
+            self.base_stations if base_stations is None else base_stations,
+            self.version + 1,
+            aliases,
+        )
+
+    def active_towers(self) -> list[phy.Tower]:
+        return [
+            bs.tower
+            for bs in self.base_stations
+            if bs.tower.on and bs.active_upload_packets > 0
+        ]
+
+    def active_ues(self) -> list[phy.UE]:
+        return [ue.l1ue for ue in self.ues if ue.active_upload_packets > 0]
+
+    def get_ue(self, ue_id: int) -> UE | None:
+        for ue in self.ues:
+            if ue.id == ue_id:
+                return ue
+        return None
+
+    def get_tower(self, bs_id: int) -> BaseStation | None:
+        for bs in self.base_stations:
+            if bs.id == bs_id:
+                return bs
+        return None
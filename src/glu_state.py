@@ -0,0 +1,268 @@
+"""
+Shared-memory export of the simulation state, readable by local processes
+without going through the API server.
+
+The region is a file (by default under /dev/shm) holding a fixed header and
+one array per field for the UEs and one per field for the towers (struct of
+arrays), each sized for the region's capacity. The writer is a seqlock:
+it makes the sequence number odd, updates the arrays in place and makes it
+even again, so a reader that sees the same even number before and after
+copying got a consistent snapshot. When the simulation outgrows the region,
+the writer atomically replaces the file with a larger one and marks the old
+one stale; readers then reopen the path.
+
+Only this module and numpy are needed to read it:
+
+    from glu_state import StateReader
+    reader = StateReader("/dev/shm/glu-state")
+    state = reader.read()
+    state["ue"]["sinr_dl_db"], state["tower"]["x"], state["seq"]
+"""
+
+import mmap
+import os
+import struct
+import time
+
+import numpy as np
+
+MAGIC = b"GLUSTATE"
+LAYOUT_VERSION = 1
+DEFAULT_PATH = "/dev/shm/glu-state"
+
+# magic, layout version, stale, seq, UE capacity, tower capacity, UEs, towers,
+# wall time of the last update (s), time of the last link figures (s), topology version
+HEADER = struct.Struct("<8sIIQIIIIddQ")
+HEADER_SIZE = 64
+SEQ_OFFSET = 16
+STALE_OFFSET = 12
+
+# link figures are the mean (unshadowed) ones of layer1.capacity.link_quality, NaN
+# for UEs without a serving tower; serving is a tower id, -1 for none
+UE_FIELDS = (
+    ("id", "<i4"),
+    ("x", "<f8"),
+    ("y", "<f8"),
+    ("serving", "<i4"),
+    ("queue", "<i4"),
+    ("total_up", "<u8"),
+    ("total_down", "<u8"),
+    ("sinr_dl_db", "<f4"),
+    ("sinr_ul_db", "<f4"),
+    ("rate_dl_mbps", "<f4"),
+    ("rate_ul_mbps", "<f4"),
+    ("per_dl", "<f4"),
+    ("per_ul", "<f4"),
+)
+TOWER_FIELDS = (
+    ("id", "<i4"),
+    ("x", "<f8"),
+    ("y", "<f8"),
+    ("on", "u1"),
+    ("ues", "<i4"),
+    ("queue", "<i4"),
+    ("total_up", "<u8"),
+    ("total_down", "<u8"),
+)
+
+
+def _layout(fields, capacity: int, offset: int) -> tuple[dict, int]:
+    out = {}
+    for name, dtype in fields:
+        out[name] = (offset, np.dtype(dtype))
+        # keep every array 8-byte aligned
+        offset += -(-capacity * np.dtype(dtype).itemsize // 8) * 8
+    return out, offset
+
+
+def region_size(ue_capacity: int, tower_capacity: int) -> int:
+    _, end = _layout(UE_FIELDS, ue_capacity, HEADER_SIZE)
+    _, end = _layout(TOWER_FIELDS, tower_capacity, end)
+    return end
+
+
+class _Region:
+    """An open region: the header and numpy views of every array over the mapping."""
+
+    def __init__(self, fd: int, writable: bool):
+        size = os.fstat(fd).st_size
+        access = mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ
+        self.map = mmap.mmap(fd, size, access=access)
+        magic, version, _, _, ue_capacity, tower_capacity, *_ = HEADER.unpack_from(self.map)
+        if magic != MAGIC or version != LAYOUT_VERSION:
+            self.map.close()
+            raise ValueError(f"not a layout {LAYOUT_VERSION} state region")
+        self.ue_capacity = ue_capacity
+        self.tower_capacity = tower_capacity
+        ue_layout, end = _layout(UE_FIELDS, ue_capacity, HEADER_SIZE)
+        tower_layout, _ = _layout(TOWER_FIELDS, tower_capacity, end)
+        self.ue = self._views(ue_layout, ue_capacity)
+        self.tower = self._views(tower_layout, tower_capacity)
+        self.seq = np.frombuffer(self.map, np.uint64, 1, SEQ_OFFSET)
+
+    def _views(self, layout: dict, capacity: int) -> dict[str, np.ndarray]:
+        return {
+            name: np.frombuffer(self.map, dtype, capacity, offset)
+            for name, (offset, dtype) in layout.items()
+        }
+
+    def header(self) -> tuple:
+        return HEADER.unpack_from(self.map)
+
+    def close(self) -> None:
+        # the views must go before the mapping can be closed
+        self.ue = self.tower = self.seq = None
+        try:
+            self.map.close()
+        except BufferError:
+            # a caller still holds views; the mapping goes with the last of them
+            pass
+
+
+class StateWriter:
+    """
+    Owns the region at path. update() publishes one snapshot given as
+    {field: array} for the UEs and the towers; missing fields are left as
+    they were, so slowly changing ones can be written less often.
+    """
+
+    def __init__(self, path: str = DEFAULT_PATH, ue_capacity: int = 1024, tower_capacity: int = 64):
+        self.path = path
+        self.region: _Region | None = None
+        self._create(ue_capacity, tower_capacity)
+
+    def _create(self, ue_capacity: int, tower_capacity: int) -> None:
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        fd = os.open(tmp, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            os.ftruncate(fd, region_size(ue_capacity, tower_capacity))
+            os.pwrite(
+                fd,
+                HEADER.pack(MAGIC, LAYOUT_VERSION, 0, 0, ue_capacity, tower_capacity, 0, 0, 0.0, 0.0, 0),
+                0,
+            )
+            region = _Region(fd, writable=True)
+            self._inode = os.fstat(fd).st_ino
+        finally:
+            os.close(fd)
+        old, self.region = self.region, region
+        if old is not None:
+            # sequence numbers carry on, so readers never see one twice
+            region.seq[0] = old.seq[0]
+        os.replace(tmp, self.path)
+        if old is not None:
+            struct.pack_into("<I", old.map, STALE_OFFSET, 1)
+            old.close()
+
+    def update(
+        self,
+        ues: dict[str, np.ndarray],
+        towers: dict[str, np.ndarray],
+        n_ues: int,
+        n_towers: int,
+        links_time_s: float | None = None,
+        topology_version: int = 0,
+    ) -> None:
+        region = self.region
+        if n_ues > region.ue_capacity or n_towers > region.tower_capacity:
+            self._create(
+                max(n_ues, 2 * region.ue_capacity), max(n_towers, 2 * region.tower_capacity)
+            )
+            region = self.region
+        seq = int(region.seq[0])
+        region.seq[0] = seq + 1
+        for views, values, n in ((region.ue, ues, n_ues), (region.tower, towers, n_towers)):
+            for name, value in values.items():
+                views[name][:n] = value
+        header = region.header()
+        struct.pack_into(
+            "<IIddQ",
+            region.map,
+            32,
+            n_ues,
+            n_towers,
+            time.time(),
+            header[9] if links_time_s is None else links_time_s,
+            topology_version,
+        )
+        region.seq[0] = seq + 2
+
+    def close(self) -> None:
+        self.region.close()
+        try:
+            # unless a newer writer has taken the path over
+            if os.stat(self.path).st_ino == self._inode:
+                os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class StateReader:
+    """
+    Reads the region at path. read() copies a consistent snapshot; views()
+    returns zero-copy arrays over the mapping together with the sequence
+    number they were taken at, which the caller passes to unchanged() after
+    using them to know whether the writer got in between.
+    """
+
+    def __init__(self, path: str = DEFAULT_PATH):
+        self.path = path
+        self.region: _Region | None = None
+        self._open()
+
+    def _open(self) -> None:
+        fd = os.open(self.path, os.O_RDONLY)
+        try:
+            region = _Region(fd, writable=False)
+        finally:
+            os.close(fd)
+        if self.region is not None:
+            self.region.close()
+        self.region = region
+
+    def _fresh(self) -> _Region:
+        if self.region.header()[2]:
+            self._open()
+        return self.region
+
+    def seq(self) -> int:
+        return int(self._fresh().seq[0])
+
+    def views(self, timeout_s: float = 1.0) -> dict:
+        """The current arrays without copying; check them with unchanged(state["seq"])."""
+        deadline = time.monotonic() + timeout_s
+        while True:
+            region = self._fresh()
+            seq = int(region.seq[0])
+            if seq % 2 == 0:
+                break
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"{self.path} stayed mid-update for {timeout_s} s")
+        _, _, _, _, _, _, n_ues, n_towers, updated_s, links_s, version = region.header()
+        return {
+            "seq": seq,
+            "time_s": updated_s,
+            "links_time_s": links_s,
+            "topology_version": version,
+            "ue": {name: a[:n_ues] for name, a in region.ue.items()},
+            "tower": {name: a[:n_towers] for name, a in region.tower.items()},
+        }
+
+    def unchanged(self, seq: int) -> bool:
+        region = self.region
+        return not region.header()[2] and int(region.seq[0]) == seq
+
+    def read(self, timeout_s: float = 1.0) -> dict:
+        """A consistent copy of the state, retried while the writer is updating it."""
+        deadline = time.monotonic() + timeout_s
+        while True:
+            state = self.views(timeout_s)
+            for kind in ("ue", "tower"):
+                state[kind] = {name: a.copy() for name, a in state[kind].items()}
+            if self.unchanged(state["seq"]):
+                return state
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"no consistent snapshot of {self.path} in {timeout_s} s")
+
+    def close(self) -> None:
+        self.region.close()
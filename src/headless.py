@@ -0,0 +1,197 @@
+"""
+Run a saved scenario without the web server, UI hooks or packet log.
+The scenario is a checkpoint written by /checkpoint/save (or the same
+JSON uncompressed). Traffic comes from whatever runs in the UE namespaces
+and behind the gateway, e.g. iperf3; the runner only forwards it and, at
+the end or on Ctrl-C, prints the throughput of each direction, with the
+delivery timing when Python forwards. Throughput counts the frames that
+were forwarded on, after every drop decision; lost frames are counted
+apart. With --native it comes from the layer3 engine's counters, which
+count the same way but have no timing.
+
+    python headless.py scenario.ckpt -t 60
+    python headless.py scenario.ckpt -t 60 --native --json
+"""
+
+import argparse
+import json
+import time
+
+from glu import Glu
+from glu import checkpoint
+
+
+def build(args) -> tuple[Glu, dict]:
+    state = checkpoint.read(args.scenario)
+    g = Glu(
+        subnet=state["subnet"],
+        seed=state["seed"],
+        gateway_queues=args.gateway_queues,
+        timer_accuracy_us=args.timer_accuracy_us,
+    )
+    restored = checkpoint.restore(g, args.scenario)
+    g.logging_packets = False
+    g.flows.enabled = args.flows
+    g.coalescing = not args.no_coalesce
+    return g, restored
+
+
+def start(g: Glu, args) -> str:
+    if args.native:
+        g.toggle_native_dataplane()
+        mode = "native"
+    elif args.single_threaded:
+        g.run_single_threaded(history=False)
+        mode = "single_threaded"
+    else:
+        g.run(log_to_sdout=False, stats=False, history=False)
+        mode = "threaded"
+    g.toggle_pause()  # unpause
+    return mode
+
+
+def direction(stats: dict, elapsed: float) -> dict:
+    out = {
+        "packets": stats["forwarded"],
+        "pps": stats["forwarded"] / elapsed,
+        "mbps": stats["forwarded_bytes"] * 8 / elapsed / 1e6,
+        "dropped": stats["dropped"],
+        "unassociated": stats["unassociated"],
+    }
+    for key in ("mean_us", "p50_us", "p99_us", "max_us", "within_accuracy"):
+        if key in stats:
+            out[f"late_{key}" if key != "within_accuracy" else key] = stats[key]
+    return out
+
+
+# what each direction forwarded and lost, out of the native engine's counters
+def native_directions(start: dict, end: dict) -> tuple[dict, dict]:
+    def delta(key: str) -> int:
+        return end.get(key, 0) - start.get(key, 0)
+
+    uplink = {
+        "forwarded": delta("delivered_uplink"),
+        "forwarded_bytes": delta("delivered_uplink_bytes"),
+        "dropped": delta("dropped_uplink"),
+        "unassociated": delta("unassociated"),
+    }
+    downlink = {
+        "forwarded": delta("sent_to_ues"),
+        "forwarded_bytes": delta("sent_to_ues_bytes"),
+        "dropped": delta("dropped_downlink"),
+        "unassociated": 0,
+    }
+    return uplink, downlink
+
+
+def summary(
+    g: Glu, restored: dict, mode: str, elapsed: float, native_start: dict | None = None
+) -> dict:
+    overload = g.overload.stats()
+    if mode == "native":
+        native = g.cabernet.dataplane_stats()
+        uplink, downlink = native_directions(native_start or {}, native)
+    else:
+        uplink, downlink = g.upload_timer.stats(), g.download_timer.stats()
+    out = {
+        "scenario": restored["path"],
+        "towers": restored["towers"],
+        "ues": restored["ues"],
+        "associated": restored["associated"],
+        "restore_s": restored["total_s"],
+        "mode": mode,
+        "seconds": elapsed,
+        # UE/gateway to tower and tower to UE: frames forwarded on after every drop
+        # decision, counted the same way by the delay queues and the native engine;
+        # frames lost on the link and without an attached UE are counted apart
+        "uplink": direction(uplink, elapsed),
+        "downlink": direction(downlink, elapsed),
+        "overload": {
+            "state": overload["state"],
+            "shed_frames": overload["shed_frames"],
+            "entered": overload["entered"],
+        },
+    }
+    if mode == "native":
+        out["native"] = native
+    if g.flows.enabled:
+        out["top_flows"] = g.flows.top(5, "bytes", time.time() * 1000)
+    return out
+
+
+def print_summary(s: dict) -> None:
+    print(
+        f"{s['scenario']}: {s['towers']} towers, {s['ues']} UEs ({s['associated']} associated),"
+        f" restored in {s['restore_s']:.2f} s"
+    )
+    print(f"{s['mode']} for {s['seconds']:.1f} s")
+    for name in ("uplink", "downlink"):
+        d = s[name]
+        line = (
+            f"  {name:8} {d['packets']:>10} packets {d['pps']:>10.0f} pps {d['mbps']:>9.2f} Mbps"
+            f" {d['dropped']:>8} lost {d['unassociated']:>8} unassociated"
+        )
+        if "late_p50_us" in d:
+            line += (
+                f"  late p50 {d['late_p50_us']:g} us p99 {d['late_p99_us']:g} us"
+                f" max {d['late_max_us']:.0f} us"
+            )
+        print(line)
+    o = s["overload"]
+    print(f"  overload {o['state']}, {o['shed_frames']} frames shed")
+    for flow in s.get("top_flows", []):
+        print(f"  flow {json.dumps(flow)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a Glu scenario without the web server")
+    parser.add_argument("scenario", help="checkpoint written by /checkpoint/save")
+    parser.add_argument(
+        "-t", "--seconds", type=float, default=0, help="run time (default: until Ctrl-C)"
+    )
+    parser.add_argument(
+        "-w", "--warmup", type=float, default=0, help="seconds left out of the summary"
+    )
+    parser.add_argument("--native", action="store_true", help="forward in the layer3 engine")
+    parser.add_argument(
+        "--single-threaded", action="store_true", help="one Python loop instead of one per stage"
+    )
+    parser.add_argument("--gateway-queues", type=int, default=1)
+    parser.add_argument("--timer-accuracy-us", type=float, default=100.0)
+    parser.add_argument("--flows", action="store_true", help="track flows and report the top 5")
+    parser.add_argument("--no-coalesce", action="store_true", help="queue every frame on its own")
+    parser.add_argument("--json", action="store_true", help="print the summary as JSON")
+    parser.add_argument(
+        "--export", metavar="PATH", help="publish the state to PATH for glu_state.StateReader"
+    )
+    args = parser.parse_args()
+
+    g, restored = build(args)
+    if args.export:
+        g.export_state(args.export)
+    mode = start(g, args)
+    if args.warmup:
+        time.sleep(args.warmup)
+    g.upload_timer.reset()
+    g.download_timer.reset()
+    native_start = g.cabernet.dataplane_stats() if mode == "native" else None
+    started = time.monotonic()
+    try:
+        if args.seconds:
+            time.sleep(args.seconds)
+        else:
+            while True:
+                time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    elapsed = time.monotonic() - started
+    s = summary(g, restored, mode, elapsed, native_start)
+    if args.json:
+        print(json.dumps(s))
+    else:
+        print_summary(s)
+    g.stop_export()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+"""
+Host several isolated simulations on one machine. Each instance is a
+main.py server in its own process, so it has its own Glu, forwarding
+threads and interpreter lock, and with --pin its own share of the cores.
+Instances need disjoint subnets outside 10.200.0.0/16, which holds the
+host links; each also gets its own namespace prefix and host link in
+layer3 (GLU_NETNS_PREFIX, GLU_TRANSIT), so their UE namespaces and
+gateway veths do not collide.
+
+The instances are a JSON object mapping each name to its subnet, with an
+optional namespace prefix (default: the name) and extra environment, e.g.
+
+    {"exp1": {"subnet": "10.0.0.0/24"},
+     "exp2": {"subnet": "10.0.1.0/24", "env": {"GLU_GATEWAY_QUEUES": "2"}}}
+
+Instance i listens on port + 1 + i. The front server on port lists them
+on GET /instances and forwards HTTP requests for /<name>/<path> to
+<path> on the instance; the web UI and websockets connect to the
+instance port directly.
+
+    python instances.py instances.json --port 8000 --pin
+"""
+
+import argparse
+import ipaddress
+import json
+import logging
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import httpx
+import uvicorn
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse
+
+logger = logging.getLogger("instances")
+
+# each instance gets 10.200.<transit>.0/24 to the host, so at most 256 of them
+MAX_INSTANCES = 256
+TRANSIT_NETWORK = ipaddress.ip_network("10.200.0.0/16")
+MAX_NETNS_PREFIX_LEN = 7
+# hop-by-hop headers that must not be forwarded
+HOP_HEADERS = {"connection", "keep-alive", "transfer-encoding", "upgrade", "host", "content-length"}
+
+
+class InstanceSpec:
+    """One simulation: its subnet, layer3 namespace prefix and host link, and extra env."""
+
+    def __init__(
+        self,
+        name: str,
+        subnet: str,
+        transit: int,
+        netns_prefix: str | None = None,
+        env: dict | None = None,
+    ):
+        self.name = name
+        self.subnet = ipaddress.ip_network(subnet)
+        self.transit = transit
+        self.netns_prefix = netns_prefix or name
+        self.env = {k: str(v) for k, v in (env or {}).items()}
+        if self.subnet.overlaps(TRANSIT_NETWORK):
+            raise ValueError(
+                f"instance {name}: subnet {self.subnet} overlaps the host links"
+                f" in {TRANSIT_NETWORK}"
+            )
+        if not (
+            self.netns_prefix.isascii()
+            and self.netns_prefix.isalnum()
+            and len(self.netns_prefix) <= MAX_NETNS_PREFIX_LEN
+        ):
+            raise ValueError(
+                f"instance {name}: namespace prefix {self.netns_prefix!r} must be"
+                f" 1 to {MAX_NETNS_PREFIX_LEN} letters or digits, set one with \"prefix\""
+            )
+
+
+def load_config(path: str) -> dict[str, InstanceSpec]:
+    with open(path) as f:
+        config = json.load(f)
+    if len(config) > MAX_INSTANCES:
+        raise ValueError(f"at most {MAX_INSTANCES} instances, got {len(config)}")
+    specs = {
+        name: InstanceSpec(name, spec["subnet"], transit, spec.get("prefix"), spec.get("env"))
+        for transit, (name, spec) in enumerate(config.items())
+    }
+    names = list(specs)
+    for i, a in enumerate(names):
+        for b in names[i + 1 :]:
+            if specs[a].subnet.overlaps(specs[b].subnet):
+                raise ValueError(f"subnets of {a} and {b} overlap")
+            if specs[a].netns_prefix == specs[b].netns_prefix:
+                raise ValueError(f"{a} and {b} share the namespace prefix {specs[a].netns_prefix}")
+    return specs
+
+
+class Instance:
+    """A running main.py for one spec."""
+
+    def __init__(self, spec: InstanceSpec, port: int, cores: list[int] | None):
+        self.spec = spec
+        self.port = port
+        self.cores = cores
+        env = {
+            **os.environ,
+            **spec.env,
+            "GLU_SUBNET": str(spec.subnet),
+            "GLU_NETNS_PREFIX": spec.netns_prefix,
+            "GLU_TRANSIT": str(spec.transit),
+            "GLU_PORT": str(port),
+        }
+        self.process = subprocess.Popen(
+            [sys.executable, "main.py"],
+            cwd=Path(__file__).parent,
+            env=env,
+            # pinned before exec, so every thread of the instance inherits it
+            preexec_fn=(lambda: os.sched_setaffinity(0, cores)) if cores else None,
+        )
+
+    def status(self) -> dict:
+        code = self.process.poll()
+        return {
+            "subnet": str(self.spec.subnet),
+            "netns_prefix": self.spec.netns_prefix,
+            "transit": f"10.200.{self.spec.transit}.0/24",
+            "port": self.port,
+            "pid": self.process.pid,
+            "cores": self.cores,
+            "running": code is None,
+            "exit_code": code,
+        }
+
+    def stop(self) -> None:
+        if self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+
+
+# the cores split evenly among n instances, or None for each when there are fewer cores
+def split_cores(n: int) -> list[list[int] | None]:
+    cores = sorted(os.sched_getaffinity(0))
+    per = len(cores) // n
+    if per == 0:
+        return [None] * n
+    return [cores[i * per : (i + 1) * per] for i in range(n)]
+
+
+def front(instances: dict[str, Instance]) -> FastAPI:
+    app = FastAPI()
+    client = httpx.AsyncClient(timeout=None)
+
+    @app.get("/instances")
+    async def list_instances():
+        return {name: instance.status() for name, instance in instances.items()}
+
+    # e.g. curl -X POST http://localhost:8000/exp1/control/pause
+    @app.api_route("/{name}/{path:path}", methods=["GET", "POST", "PUT", "PATCH", "DELETE"])
+    async def forward(name: str, path: str, request: Request):
+        instance = instances.get(name)
+        if instance is None:
+            return JSONResponse({"error": f"no instance named {name}"}, 404)
+        headers = {k: v for k, v in request.headers.items() if k.lower() not in HOP_HEADERS}
+        try:
+            upstream = await client.request(
+                request.method,
+                f"http://127.0.0.1:{instance.port}/{path}",
+                params=request.query_params,
+                headers=headers,
+                content=await request.body(),
+            )
+        except httpx.TransportError as e:
+            return JSONResponse({"error": f"instance {name} unreachable: {e}"}, 502)
+        return Response(
+            upstream.content,
+            upstream.status_code,
+            {k: v for k, v in upstream.headers.items() if k.lower() not in HOP_HEADERS},
+        )
+
+    @app.on_event("shutdown")
+    async def close_client():
+        await client.aclose()
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run several isolated Glu servers")
+    parser.add_argument("config", help="JSON object of instance name -> {subnet, prefix, env}")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000, help="front server; instances follow")
+    parser.add_argument(
+        "--pin", action="store_true", help="give each instance its own share of the cores"
+    )
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    specs = load_config(args.config)
+    cores = split_cores(len(specs)) if args.pin else [None] * len(specs)
+    instances: dict[str, Instance] = {}
+    try:
+        for i, (name, spec) in enumerate(specs.items()):
+            instances[name] = Instance(spec, args.port + 1 + i, cores[i])
+            logger.info("%s: %s on port %d", name, spec.subnet, args.port + 1 + i)
+        uvicorn.run(front(instances), host=args.host, port=args.port)
+    finally:
+        for instance in instances.values():
+            instance.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,5 @@
 from .api import UE, Tower
 from .api import ue_tower_dist
 from .api import TechProfile, LTE_20, NR_100
+from .raster import best_server_grid
+from .rng import RngStream, RngStreams
@@ -1,12 +1,25 @@
 from .core import TechProfile
+from .rng import RngStream
 from . import core
 from typing import List
 
-LTE_20 = TechProfile("LTE-20MHz", carrier_hz=2.6e9, bandwidth_hz=20e6, eta_eff=0.50)
-NR_100 = TechProfile("NR-100MHz", carrier_hz=3.5e9, bandwidth_hz=100e6, eta_eff=0.60)
+LTE_20 = TechProfile(
+    "LTE-20MHz", carrier_hz=2.6e9, bandwidth_hz=20e6, eta_eff=0.50, modulations=(4, 16, 64)
+)
+NR_100 = TechProfile(
+    "NR-100MHz",
+    carrier_hz=3.5e9,
+    bandwidth_hz=100e6,
+    eta_eff=0.60,
+    modulations=(4, 16, 64, 256),
+    tti_ms=0.5,  # 30 kHz subcarriers, two slots per LTE subframe
+)
 
 
 class UE:
+    # positions are replaced, never mutated, and a tick creates one per moving UE
+    __slots__ = ("x", "y")
+
     def __init__(self, x: float, y: float):
         self.x = x
         self.y = y
@@ -27,22 +40,33 @@ class Tower:
     def __eq__(self, value: object) -> bool:
         return self.x == value.x and self.y == value.y
 
-    def upload_latency(self, ue: UE, nbytes: int, active_ues: List[UE]) -> float:
+    def upload_latency(
+        self, ue: UE, nbytes: int, active_ues: List[UE], rng: RngStream | None = None
+    ) -> float:
         distances = [ue_tower_dist(aue, self) for aue in active_ues if aue != ue]
-        return self.t.up_latency(ue_tower_dist(ue, self), nbytes, distances)
+        return self.t.up_latency(ue_tower_dist(ue, self), nbytes, distances, rng)
+
+    # distances to a UE of the other towers on this tower's carrier; other carriers do not interfere
+    def interferer_distances(self, ue: UE, active_towers: List["Tower"]) -> List[float]:
+        carrier = self.t.carrier_freq
+        return [
+            ue_tower_dist(ue, tower)
+            for tower in active_towers
+            if self != tower and tower.t.carrier_freq == carrier
+        ]
 
     def download_latency(
-        self, ue: UE, nbytes: int, active_towers: List["Tower"]
+        self,
+        ue: UE,
+        nbytes: int,
+        active_towers: List["Tower"],
+        rng: RngStream | None = None,
     ) -> float:
-        distances = [
-            ue_tower_dist(ue, tower) for tower in active_towers if self != tower
-        ]
-        return self.t.down_latency(ue_tower_dist(ue, self), nbytes, distances)
+        distances = self.interferer_distances(ue, active_towers)
+        return self.t.down_latency(ue_tower_dist(ue, self), nbytes, distances, rng)
 
     def download_bandwidth_mbps(self, ue: UE, active_towers: List["Tower"]) -> float:
-        distances = [
-            ue_tower_dist(ue, tower) for tower in active_towers if self != tower
-        ]
+        distances = self.interferer_distances(ue, active_towers)
         return (
             self.t.rate_bps(self.t.sinr_dl(ue_tower_dist(ue, self), distances)) / 1e6
         )  # convert to Mbps
@@ -54,20 +78,44 @@ class Tower:
         )  # convert to Mbps
 
     def download_packet_error_rate(
-        self, ue: UE, nbytes: int, active_towers: List["Tower"]
+        self,
+        ue: UE,
+        nbytes: int,
+        active_towers: List["Tower"],
+        rng: RngStream | None = None,
     ) -> float:
-        distances = [
-            ue_tower_dist(ue, tower) for tower in active_towers if self != tower
-        ]
-        return self.t.per_dl_qpsk(ue_tower_dist(ue, self), nbytes, distances)
+        distances = self.interferer_distances(ue, active_towers)
+        return self.t.per_dl(ue_tower_dist(ue, self), nbytes, distances, rng)
 
     def upload_packet_error_rate(
-        self, ue: UE, nbytes: int, active_ues: List[UE]
+        self, ue: UE, nbytes: int, active_ues: List[UE], rng: RngStream | None = None
     ) -> float:
         distances = [ue_tower_dist(aue, self) for aue in active_ues if aue != ue]
-        return self.t.per_ul_qpsk(ue_tower_dist(ue, self), nbytes, distances)
+        return self.t.per_ul(ue_tower_dist(ue, self), nbytes, distances, rng)
 
 
+    def download_modulation(self, ue: UE, active_towers: List["Tower"]) -> str:
+        distances = self.interferer_distances(ue, active_towers)
+        return self.t.modulation(self.t.sinr_dl(ue_tower_dist(ue, self), distances))
+
+    def upload_modulation(self, ue: UE, active_ues: List[UE]) -> str:
+        distances = [ue_tower_dist(aue, self) for aue in active_ues if aue != ue]
+        return self.t.modulation(self.t.sinr_ul(ue_tower_dist(ue, self), distances))
+
+    def upload_link(
+        self, ue: UE, active_ues: List[UE], rng: RngStream | None = None
+    ) -> tuple[float, float, float]:
+        distances = [ue_tower_dist(aue, self) for aue in active_ues if aue != ue]
+        d = ue_tower_dist(ue, self)
+        return self.t.link_budget(d, self.t.sinr_ul(d, distances, rng))
+
+    def download_link(
+        self, ue: UE, active_towers: List["Tower"], rng: RngStream | None = None
+    ) -> tuple[float, float, float]:
+        distances = self.interferer_distances(ue, active_towers)
+        d = ue_tower_dist(ue, self)
+        return self.t.link_budget(d, self.t.sinr_dl(d, distances, rng))
+
 # distance helper to calculate the distance between a UE and a tower
 def ue_tower_dist(ue: UE, tower: Tower) -> float:
     return core.dist((ue.x, ue.y), (tower.x, tower.y))
@@ -0,0 +1,157 @@
+"""
+Vectorized capacity of a whole layout: every UE against every tower at once.
+Uses the same mean path loss as best_server_grid (no shadowing) with a
+configurable path-loss exponent, for offline sweeps that never bring up
+the TUN data plane.
+"""
+
+from typing import List
+
+import numpy as np
+
+from .api import Tower
+from .core import (
+    BS_GAIN_DBI,
+    BS_TX_POWER_DBM,
+    PATHLOSS_N,
+    UE_GAIN_DBI,
+    UE_TX_POWER,
+    TechProfile,
+)
+
+LINK_METRICS = ("sinr_dl_db", "sinr_ul_db", "rate_dl_mbps", "rate_ul_mbps", "per_dl", "per_ul")
+
+
+def grid_towers(n: int, width_m: float, height_m: float) -> np.ndarray:
+    """n tower positions on a near-square grid centred in the map, shaped (n, 2)."""
+    cols = int(np.ceil(np.sqrt(n * width_m / height_m)))
+    rows = int(np.ceil(n / cols))
+    xs = (np.arange(cols) + 0.5) * width_m / cols
+    ys = (np.arange(rows) + 0.5) * height_m / rows
+    gx, gy = np.meshgrid(xs, ys)
+    return np.column_stack([gx.ravel(), gy.ravel()])[:n]
+
+
+def evaluate_layout(
+    ue_xy: np.ndarray,
+    tower_xy: np.ndarray,
+    tech: TechProfile,
+    pathloss_n: float = PATHLOSS_N,
+    min_sinr_db: float = -6.0,
+) -> dict:
+    """
+    Downlink and uplink figures of UEs attached to their strongest tower.
+    Downlink interference comes from every other tower (reuse-1, all busy).
+    Uplink interference at a tower is one transmitting UE per other cell,
+    taken as that cell's mean UE. Cell capacity is shared equally by the
+    UEs of the cell. Rates are in Mbps and SINRs in dB; UEs below
+    min_sinr_db count as uncovered and get no rate.
+    """
+    n_ues = len(ue_xy)
+    n_towers = len(tower_xy)
+    d = np.hypot(
+        ue_xy[:, None, 0] - tower_xy[None, :, 0], ue_xy[:, None, 1] - tower_xy[None, :, 1]
+    )
+    pl = tech.mean_pathloss_db(d, pathloss_n)
+    dl_mw = 10 ** ((BS_TX_POWER_DBM + BS_GAIN_DBI + UE_GAIN_DBI - pl) / 10.0)
+    ul_mw = 10 ** ((UE_TX_POWER + UE_GAIN_DBI + BS_GAIN_DBI - pl) / 10.0)
+
+    rows = np.arange(n_ues)
+    best = np.argmax(dl_mw, axis=1)
+    s_dl = dl_mw[rows, best]
+    sinr_dl = s_dl / (dl_mw.sum(axis=1) - s_dl + tech.noise_mw)
+
+    # mean power each cell's UEs put on every tower: (n_towers, n_towers)
+    load = np.bincount(best, minlength=n_towers)
+    cell_mw = np.zeros((n_towers, n_towers))
+    np.add.at(cell_mw, best, ul_mw)
+    cell_mw /= np.maximum(load, 1)[:, None]
+    ul_interference = cell_mw.sum(axis=0) - np.diag(cell_mw)
+    sinr_ul = ul_mw[rows, best] / (ul_interference[best] + tech.noise_mw)
+
+    sinr_dl_db = 10 * np.log10(sinr_dl)
+    sinr_ul_db = 10 * np.log10(sinr_ul)
+    covered = sinr_dl_db >= min_sinr_db
+    # link-adapted rate shared by the UEs of the cell, in Mbps
+    share = load[best] * 1e6 / (tech.eta_eff * tech.bandwidth_hz)
+    rate_dl = np.where(covered, tech.amc.lookup_array(sinr_dl)[0] / share, 0.0)
+    rate_ul = np.where(covered, tech.amc.lookup_array(sinr_ul)[0] / share, 0.0)
+
+    return {
+        "coverage": float(covered.mean()),
+        "sinr_dl_db_mean": float(sinr_dl_db.mean()),
+        "sinr_dl_db_p5": float(np.percentile(sinr_dl_db, 5)),
+        "sinr_ul_db_mean": float(sinr_ul_db.mean()),
+        "sinr_ul_db_p5": float(np.percentile(sinr_ul_db, 5)),
+        "rate_dl_mbps_mean": float(rate_dl.mean()),
+        "rate_dl_mbps_p5": float(np.percentile(rate_dl, 5)),
+        "rate_ul_mbps_mean": float(rate_ul.mean()),
+        "rate_ul_mbps_p5": float(np.percentile(rate_ul, 5)),
+        "throughput_dl_mbps": float(rate_dl.sum()),
+        "throughput_ul_mbps": float(rate_ul.sum()),
+        "max_cell_load": int(load.max()),
+    }
+
+
+def link_quality(
+    ue_xy: np.ndarray,
+    towers: List[Tower],
+    serving: np.ndarray,
+    ue_active: np.ndarray,
+    tower_busy: np.ndarray,
+    nbytes: int = 1024,
+) -> dict[str, np.ndarray]:
+    """
+    Mean link figures of every UE towards its serving tower (index into
+    towers, -1 for none), with the interferers Tower.upload_link and
+    download_link use: the other busy towers on the downlink and the other
+    active UEs on the uplink, both on the serving tower's carrier (a UE
+    transmits on the carrier of its own serving tower). Without shadowing, so a UE's figures only move
+    when the layout or the load does. NaN for UEs without a serving tower.
+    """
+    n_ues = len(ue_xy)
+    if not towers or n_ues == 0:
+        nan = np.full(n_ues, np.nan)
+        return {name: nan for name in LINK_METRICS}
+    tower_xy = np.array([(t.x, t.y) for t in towers])
+    d = np.hypot(
+        ue_xy[:, None, 0] - tower_xy[None, :, 0], ue_xy[:, None, 1] - tower_xy[None, :, 1]
+    )
+    pl = np.empty_like(d)
+    for j, t in enumerate(towers):
+        pl[:, j] = t.t.mean_pathloss_db(d[:, j])
+    dl_mw = 10 ** ((BS_TX_POWER_DBM + BS_GAIN_DBI + UE_GAIN_DBI - pl) / 10.0)
+    ul_mw = 10 ** ((UE_TX_POWER + UE_GAIN_DBI + BS_GAIN_DBI - pl) / 10.0)
+
+    rows = np.arange(n_ues)
+    ok = serving >= 0
+    s = np.where(ok, serving, 0)
+    noise_mw = np.array([t.t.noise_mw for t in towers])[s]
+    bandwidth = np.array([t.t.eta_eff * t.t.bandwidth_hz for t in towers])[s]
+
+    # co-channel: [u, j] when tower j shares the carrier of UE u's serving tower
+    carrier = np.array([t.t.carrier_freq for t in towers])
+    same = carrier[s][:, None] == carrier[None, :]
+
+    s_dl = dl_mw[rows, s]
+    i_dl = (dl_mw * same) @ tower_busy.astype(np.float64) - np.where(tower_busy[s], s_dl, 0.0)
+    sinr_dl = s_dl / (i_dl + noise_mw)
+    s_ul = ul_mw[rows, s]
+    transmitting = (ue_active & ok).astype(np.float64)
+    i_ul = (transmitting @ (ul_mw * same))[s] - np.where(ue_active & ok, s_ul, 0.0)
+    sinr_ul = s_ul / (i_ul + noise_mw)
+
+    # the serving tower's profile picks the modulation
+    profiles = {id(t.t): t.t for t in towers}
+    tech_of = np.array([list(profiles).index(id(t.t)) for t in towers])[s]
+    out = {}
+    for way, sinr in (("dl", sinr_dl), ("ul", sinr_ul)):
+        efficiency = np.empty(n_ues)
+        ber = np.empty(n_ues)
+        for k, tech in enumerate(profiles.values()):
+            mask = tech_of == k
+            efficiency[mask], ber[mask] = tech.amc.lookup_array(sinr[mask])
+        out[f"sinr_{way}_db"] = np.where(ok, 10 * np.log10(sinr), np.nan)
+        out[f"rate_{way}_mbps"] = np.where(ok, bandwidth * efficiency / 1e6, np.nan)
+        out[f"per_{way}"] = np.where(ok, 1.0 - (1.0 - ber) ** (nbytes * 8), np.nan)
+    return out
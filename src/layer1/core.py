@@ -8,9 +8,13 @@ Physical Layer for 4G/LTE & 5G
 """
 
 import math
-import random
+import zlib
 from typing import List, Tuple
 
+import numpy as np
+
+from .rng import RngStream
+
 # Physical layer constants
 BACKGROUND_NOISE = -174.0  # thermal noise density (dBm/Hz)
 PATHLOSS_N = 5.0  # path-loss exponent (4–6 urban)
@@ -22,18 +26,36 @@ BS_TX_POWER_DBM = 40.0  # Base station transmit power 10 W macro
 UE_TX_POWER = 23.0  # UE transmit power ~200 mW
 RNG_SEED = 7  # random number generator seed
 
+# Link adaptation
+TARGET_BER = 1e-5  # highest modulation meeting this BER is used (~10% PER on 1500 bytes)
+AMC_SINR_MIN_DB = -20.0  # SINR grid of the precomputed tables
+AMC_SINR_MAX_DB = 50.0
+AMC_SINR_STEP_DB = 0.05
+MODULATIONS = {4: "QPSK", 16: "16QAM", 64: "64QAM", 256: "256QAM"}
+
 
 # Tech profiles (LTE/5G)
 class TechProfile:
     def __init__(
-        self, name: str, carrier_hz: float, bandwidth_hz: float, eta_eff: float
+        self,
+        name: str,
+        carrier_hz: float,
+        bandwidth_hz: float,
+        eta_eff: float,
+        modulations: Tuple[int, ...] = (4, 16, 64, 256),
+        tti_ms: float = 1.0,
     ):  # constructor
         self.name = name
         self.carrier_freq = carrier_hz
         self.bandwidth_hz = bandwidth_hz
         self.eta_eff = eta_eff
+        # modulation, BER and spectral efficiency over SINR, built once per profile
+        self.amc = AmcTable(modulations)
+        # scheduling interval: the cell divides its resources among UEs once per TTI
+        self.tti_ms = tti_ms
 
-        self.rng = random.Random(RNG_SEED)
+        # default shadowing stream for callers that do not pass a per-link one
+        self.rng = RngStream(RNG_SEED, zlib.crc32(name.encode()))
         # Precompute noise for this bandwidth
         self.noise_dbm = BACKGROUND_NOISE + 10.0 * math.log10(self.bandwidth_hz)
         self.noise_mw = db_to_lin(self.noise_dbm)  # convert noise density to linear
@@ -45,62 +67,111 @@ class TechProfile:
         return 20.0 * math.log10((4 * math.pi * 1) / lambda_wavelength)
 
     # Real life path loss
-    def pathloss_db(self, d_m: float) -> float:
+    def pathloss_db(self, d_m: float, rng: RngStream | None = None) -> float:
         d = max(MIN_DISTANCE_M, d_m)
         base = self.pl1m_db() + 10.0 * PATHLOSS_N * math.log10(d)
         # signal changing randomly for realistic simulations
-        shadow = self.rng.gauss(0.0, SHADOW_SIGMA_DB)
+        shadow = (rng or self.rng).gauss(0.0, SHADOW_SIGMA_DB)
         return base + shadow
 
+    # Path loss without shadowing, vectorized over an array of distances
+    def mean_pathloss_db(self, d_m: np.ndarray, pathloss_n: float = PATHLOSS_N) -> np.ndarray:
+        d = np.maximum(MIN_DISTANCE_M, d_m)
+        return self.pl1m_db() + 10.0 * pathloss_n * np.log10(d)
+
+    # Distance at which the mean downlink power falls margin_db below the noise floor
+    def dl_range_m(self, margin_db: float = 10.0) -> float:
+        budget = BS_TX_POWER_DBM + BS_GAIN_DBI + UE_GAIN_DBI - self.pl1m_db()
+        return 10 ** ((budget - self.noise_dbm + margin_db) / (10.0 * PATHLOSS_N))
+
     # Received power (dBm)
     def rx_power_dbm(
-        self, tx_dbm: float, tx_g_dbi: float, rx_g_dbi: float, d_m: float
+        self,
+        tx_dbm: float,
+        tx_g_dbi: float,
+        rx_g_dbi: float,
+        d_m: float,
+        rng: RngStream | None = None,
     ) -> float:
-        pl = self.pathloss_db(d_m)
+        pl = self.pathloss_db(d_m, rng)
         # received power = transmitter power + transmitter gain + receiver gain - path loss
         p_dbm = tx_dbm + tx_g_dbi + rx_g_dbi - pl
         return p_dbm
 
     # Downlink SINR (linear), tower to UE
-    def sinr_dl(self, d_serv_m: float, active_towers_to_ue_distance: List[float]) -> float:
+    def sinr_dl(
+        self,
+        d_serv_m: float,
+        active_towers_to_ue_distance: List[float],
+        rng: RngStream | None = None,
+    ) -> float:
         # signal
-        s_dbm = self.rx_power_dbm(BS_TX_POWER_DBM, BS_GAIN_DBI, UE_GAIN_DBI, d_serv_m)
+        s_dbm = self.rx_power_dbm(
+            BS_TX_POWER_DBM, BS_GAIN_DBI, UE_GAIN_DBI, d_serv_m, rng
+        )
         s_mw = db_to_lin(s_dbm)  # convert received power to linear
         # interference (reuse-1, all towers 100% busy)
         I_mw = 0.0
         if active_towers_to_ue_distance:
             for d_i in active_towers_to_ue_distance:
                 p_i_dbm = self.rx_power_dbm(
-                    BS_TX_POWER_DBM, BS_GAIN_DBI, UE_GAIN_DBI, d_i
+                    BS_TX_POWER_DBM, BS_GAIN_DBI, UE_GAIN_DBI, d_i, rng
                 )
                 I_mw += db_to_lin(p_i_dbm)
         return s_mw / (I_mw + self.noise_mw)
 
     # Uplink SINR (linear), UE to tower
-    def sinr_ul(self, d_serv_m: float, active_ue_to_tower_distance: List[float]) -> float:
-        s_dbm = self.rx_power_dbm(UE_TX_POWER, UE_GAIN_DBI, BS_GAIN_DBI, d_serv_m)
+    def sinr_ul(
+        self,
+        d_serv_m: float,
+        active_ue_to_tower_distance: List[float],
+        rng: RngStream | None = None,
+    ) -> float:
+        s_dbm = self.rx_power_dbm(UE_TX_POWER, UE_GAIN_DBI, BS_GAIN_DBI, d_serv_m, rng)
         s_mw = db_to_lin(s_dbm)
         I_mw = 0.0
         if active_ue_to_tower_distance:
             for d_i in active_ue_to_tower_distance:
-                p_i_dbm = self.rx_power_dbm(UE_TX_POWER, UE_GAIN_DBI, BS_GAIN_DBI, d_i)
+                p_i_dbm = self.rx_power_dbm(
+                    UE_TX_POWER, UE_GAIN_DBI, BS_GAIN_DBI, d_i, rng
+                )
                 I_mw += db_to_lin(p_i_dbm)
         return s_mw / (I_mw + self.noise_mw)
 
-    # Shannon throughput
+    # Throughput with the modulation link adaptation picks: Shannon capped at its bits per symbol
     def rate_bps(self, sinr_linear: float) -> float:
-        return self.eta_eff * self.bandwidth_hz * math.log2(1.0 + sinr_linear)
+        return self.eta_eff * self.bandwidth_hz * self.amc.lookup(sinr_linear)[1]
+
+    # Modulation picked for the given SINR
+    def modulation(self, sinr_linear: float) -> str:
+        return MODULATIONS[self.amc.lookup(sinr_linear)[0]]
+
+    # (propagation ms, transmission ms per byte, bit error rate) of a link at the given
+    # SINR; latency and PER of any frame size follow from these without recomputing the SINR
+    def link_budget(self, ue_distance: float, sinr_linear: float) -> tuple[float, float, float]:
+        c = 3e8  # speed of light in m/s
+        prop_ms = ue_distance / c * 1e3
+        _, efficiency, ber = self.amc.lookup(sinr_linear)
+        return prop_ms, 8e3 / (self.eta_eff * self.bandwidth_hz * efficiency), ber
 
     # Calculate uplink latency in ms
     def up_latency(
-        self, ue_distance: float, nbytes: int, active_ue_to_tower_distance: List[float]
+        self,
+        ue_distance: float,
+        nbytes: int,
+        active_ue_to_tower_distance: List[float],
+        rng: RngStream | None = None,
     ) -> float:
         c = 3e8  # speed of light in m/s
         prop = ue_distance / c
         transmission = (
             nbytes
             * 8
-            / (self.rate_bps(self.sinr_ul(ue_distance, active_ue_to_tower_distance)))
+            / (
+                self.rate_bps(
+                    self.sinr_ul(ue_distance, active_ue_to_tower_distance, rng)
+                )
+            )
         )
         up_latency = prop + transmission
         return up_latency * 1e3
@@ -111,12 +182,13 @@ class TechProfile:
         ue_distance: float,
         nbytes: int,
         active_towers_to_ue_distance: list[float],
+        rng: RngStream | None = None,
     ) -> float:
         c = 3e8  # speed of light in m/s
         prop = ue_distance / c
         interferer_ds = active_towers_to_ue_distance
         transmission = (
-            nbytes * 8 / (self.rate_bps(self.sinr_dl(ue_distance, interferer_ds)))
+            nbytes * 8 / (self.rate_bps(self.sinr_dl(ue_distance, interferer_ds, rng)))
         )
         downLatency = prop + transmission
         return downLatency * 1e3
@@ -126,8 +198,9 @@ class TechProfile:
         self,
         d_serv_m: float,
         active_towers_to_ue_distance: List[float],
+        rng: RngStream | None = None,
     ) -> float:
-        sinr = self.sinr_dl(d_serv_m, active_towers_to_ue_distance)
+        sinr = self.sinr_dl(d_serv_m, active_towers_to_ue_distance, rng)
         return ber_qpsk_awgn(sinr)
 
     # Bit Error Rate for QPSK modulation (uplink)
@@ -135,18 +208,42 @@ class TechProfile:
         self,
         d_serv_m: float,
         active_ues_to_tower_distance: List[float],
+        rng: RngStream | None = None,
     ) -> float:
-        sinr = self.sinr_ul(d_serv_m, active_ues_to_tower_distance)
+        sinr = self.sinr_ul(d_serv_m, active_ues_to_tower_distance, rng)
         return ber_qpsk_awgn(sinr)
 
+    # Packet Error Rate with link adaptation (downlink)
+    def per_dl(
+        self,
+        ue_distance: float,
+        nbytes: int,
+        active_towers_to_ue_distance: List[float],
+        rng: RngStream | None = None,
+    ) -> float:
+        sinr = self.sinr_dl(ue_distance, active_towers_to_ue_distance, rng)
+        return packet_error_prob_bytes(self.amc.lookup(sinr)[2], nbytes)
+
+    # Packet Error Rate with link adaptation (uplink)
+    def per_ul(
+        self,
+        ue_distance: float,
+        nbytes: int,
+        active_ues_to_tower_distance: List[float],
+        rng: RngStream | None = None,
+    ) -> float:
+        sinr = self.sinr_ul(ue_distance, active_ues_to_tower_distance, rng)
+        return packet_error_prob_bytes(self.amc.lookup(sinr)[2], nbytes)
+
     # Packet Error Rate for QPSK modulation (downlink)
     def per_dl_qpsk(
         self,
         ue_distance: float,
         nbytes: int,
         active_towers_to_ue_distance: List[float],
+        rng: RngStream | None = None,
     ) -> float:
-        ber = self.ber_dl_qpsk(ue_distance, active_towers_to_ue_distance)
+        ber = self.ber_dl_qpsk(ue_distance, active_towers_to_ue_distance, rng)
         return packet_error_prob_bytes(ber, nbytes)
 
     # Packet Error Rate for QPSK modulation (uplink)
@@ -155,8 +252,9 @@ class TechProfile:
         ue_distance: float,
         nbytes: int,
         active_ues_to_tower_distance: List[float],
+        rng: RngStream | None = None,
     ) -> float:
-        ber = self.ber_ul_qpsk(ue_distance, active_ues_to_tower_distance)
+        ber = self.ber_ul_qpsk(ue_distance, active_ues_to_tower_distance, rng)
         return packet_error_prob_bytes(ber, nbytes)
 
 
@@ -227,3 +325,63 @@ def ber_mqam_awgn(sinr_linear: float, M: int) -> float:
     return Pb_sym / k
 
 
+
+
+def ber_modulation(sinr_linear: float, M: int) -> float:
+    return ber_qpsk_awgn(sinr_linear) if M == 4 else ber_mqam_awgn(sinr_linear, M)
+
+
+class AmcTable:
+    """
+    Link adaptation on a precomputed SINR grid.
+    At each grid point the highest modulation whose BER meets TARGET_BER is
+    picked (the lowest one if none does); its BER and spectral efficiency,
+    Shannon capped at its bits per symbol, are tabulated. Lookups interpolate
+    linearly in dB between grid points, so the per-packet cost is one log10
+    instead of erfc and sqrt. PER of any size follows from the BER as
+    1 - (1 - ber) ** bits, exactly, so the table has no size axis.
+    """
+
+    def __init__(self, modulations: Tuple[int, ...] = (4, 16, 64, 256)):
+        self.modulations = tuple(sorted(modulations))
+        n = int(round((AMC_SINR_MAX_DB - AMC_SINR_MIN_DB) / AMC_SINR_STEP_DB)) + 1
+        self.sinr_db = np.linspace(AMC_SINR_MIN_DB, AMC_SINR_MAX_DB, n)
+        self.order: list[int] = []
+        self.ber: list[float] = []
+        self.efficiency: list[float] = []
+        for db in self.sinr_db.tolist():
+            sinr = db_to_lin(db)
+            chosen = self.modulations[0]
+            for M in self.modulations:
+                if ber_modulation(sinr, M) <= TARGET_BER:
+                    chosen = M
+            self.order.append(chosen)
+            self.ber.append(ber_modulation(sinr, chosen))
+            self.efficiency.append(min(math.log2(1.0 + sinr), math.log2(chosen)))
+        self._ber = np.array(self.ber)
+        self._efficiency = np.array(self.efficiency)
+
+    # (modulation order, spectral efficiency bit/s/Hz, BER) at the given SINR
+    def lookup(self, sinr_linear: float) -> tuple[int, float, float]:
+        if sinr_linear <= 0:
+            return self.order[0], self.efficiency[0], 0.5
+        x = (10.0 * math.log10(sinr_linear) - AMC_SINR_MIN_DB) / AMC_SINR_STEP_DB
+        last = len(self.order) - 1
+        if x <= 0:
+            return self.order[0], self.efficiency[0], self.ber[0]
+        if x >= last:
+            return self.order[last], self.efficiency[last], self.ber[last]
+        i = int(x)
+        frac = x - i
+        eff, ber = self.efficiency, self.ber
+        return (
+            self.order[i],
+            eff[i] + (eff[i + 1] - eff[i]) * frac,
+            ber[i] + (ber[i + 1] - ber[i]) * frac,
+        )
+
+    # vectorized lookup of (spectral efficiency, BER) over an array of linear SINRs
+    def lookup_array(self, sinr_linear: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        with np.errstate(divide="ignore"):
+            db = 10.0 * np.log10(sinr_linear)
+        return np.interp(db, self.sinr_db, self._efficiency), np.interp(db, self.sinr_db, self._ber)
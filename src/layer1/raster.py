@@ -0,0 +1,64 @@
+"""
+Vectorized downlink coverage over a grid of map points.
+Uses the same path-loss and interference model as TechProfile.sinr_dl,
+but evaluates every tower for every grid point at once and without
+shadowing, so the result is the mean coverage.
+"""
+
+from typing import List, Tuple
+
+import numpy as np
+
+from .api import Tower
+from .core import BS_GAIN_DBI, BS_TX_POWER_DBM, UE_GAIN_DBI
+
+
+def best_server_grid(
+    xs: np.ndarray, ys: np.ndarray, towers: List[Tower]
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Best-server downlink SINR and link-adapted rate for every point of xs × ys.
+    Interference comes from the other towers on the serving tower's carrier.
+    Returns (serving tower index, SINR linear, rate bps), each shaped (len(ys), len(xs));
+    the index is -1 and SINR/rate are 0 where no tower is on.
+    """
+    shape = (len(ys), len(xs))
+    towers = [t for t in towers if t.on]
+    if not towers:
+        return np.full(shape, -1), np.zeros(shape), np.zeros(shape)
+
+    gx, gy = np.meshgrid(xs, ys)
+    tx = np.array([t.x for t in towers])[:, None, None]
+    ty = np.array([t.y for t in towers])[:, None, None]
+    d = np.hypot(gx[None] - tx, gy[None] - ty)
+
+    rx_mw = np.empty((len(towers),) + shape)
+    for i, t in enumerate(towers):
+        p_dbm = BS_TX_POWER_DBM + BS_GAIN_DBI + UE_GAIN_DBI - t.t.mean_pathloss_db(d[i])
+        rx_mw[i] = 10 ** (p_dbm / 10.0)
+
+    best = np.argmax(rx_mw, axis=0)
+    s_mw = np.take_along_axis(rx_mw, best[None], axis=0)[0]
+
+    # co-channel interference: total power on the serving carrier minus the signal
+    carriers = np.array([t.t.carrier_freq for t in towers])
+    carrier_ids = np.unique(carriers, return_inverse=True)[1]
+    total_mw = np.zeros((carrier_ids.max() + 1,) + shape)
+    np.add.at(total_mw, carrier_ids, rx_mw)
+    serving_total = np.take_along_axis(total_mw, carrier_ids[best][None], axis=0)[0]
+    i_mw = np.maximum(serving_total - s_mw, 0.0)
+
+    noise_mw = np.array([t.t.noise_mw for t in towers])[best]
+    sinr = s_mw / (i_mw + noise_mw)
+
+    # spectral efficiency of the modulation the serving tower's profile picks
+    profiles = {id(t.t): t.t for t in towers}
+    tech_of = np.array([list(profiles).index(id(t.t)) for t in towers])[best]
+    efficiency = np.empty(shape)
+    for k, tech in enumerate(profiles.values()):
+        mask = tech_of == k
+        efficiency[mask] = tech.amc.lookup_array(sinr[mask])[0]
+    eta = np.array([t.t.eta_eff for t in towers])[best]
+    bw = np.array([t.t.bandwidth_hz for t in towers])[best]
+    rate = eta * bw * efficiency
+    return best, sinr, rate
@@ -0,0 +1,194 @@
+"""
+Counter-based random numbers (Philox4x32-10).
+A draw is a pure function of (seed, stream id, counter), so every link can
+own a stream whose values do not depend on how threads interleave, and a
+batch of draws from many streams can be computed in one vectorized call.
+"""
+
+import itertools
+import math
+import threading
+
+import numpy as np
+
+PHILOX_M0 = 0xD2511F53
+PHILOX_M1 = 0xCD9E8D57
+PHILOX_W0 = 0x9E3779B9
+PHILOX_W1 = 0xBB67AE85
+PHILOX_ROUNDS = 10
+MASK32 = 0xFFFFFFFF
+# normal draws are computed this many counters at a time and cached per stream
+GAUSS_BLOCK = 256
+
+# stream kinds, packed into the top byte of a link stream id
+PHY_UL = 1
+PHY_DL = 2
+LOSS_UL = 3
+LOSS_DL = 4
+
+
+def philox4x32(ctr: tuple[int, int, int, int], key: tuple[int, int]) -> tuple[int, int, int, int]:
+    c0, c1, c2, c3 = ctr
+    k0, k1 = key
+    for _ in range(PHILOX_ROUNDS):
+        p0 = PHILOX_M0 * c0
+        p1 = PHILOX_M1 * c2
+        c0, c1, c2, c3 = (
+            (p1 >> 32) ^ c1 ^ k0,
+            p1 & MASK32,
+            (p0 >> 32) ^ c3 ^ k1,
+            p0 & MASK32,
+        )
+        k0 = (k0 + PHILOX_W0) & MASK32
+        k1 = (k1 + PHILOX_W1) & MASK32
+    return c0, c1, c2, c3
+
+
+def philox4x32_batch(ctr: np.ndarray, key: np.ndarray) -> np.ndarray:
+    """Vectorized philox4x32 over ctr shaped (n, 4) and key shaped (2,) or (n, 2)."""
+    ctr = ctr.astype(np.uint64)
+    key = np.broadcast_to(key.astype(np.uint64), (len(ctr), 2))
+    c0, c1, c2, c3 = ctr[:, 0], ctr[:, 1], ctr[:, 2], ctr[:, 3]
+    k0, k1 = key[:, 0].copy(), key[:, 1].copy()
+    mask = np.uint64(MASK32)
+    shift = np.uint64(32)
+    for _ in range(PHILOX_ROUNDS):
+        p0 = np.uint64(PHILOX_M0) * c0
+        p1 = np.uint64(PHILOX_M1) * c2
+        c0, c1, c2, c3 = (
+            (p1 >> shift) ^ c1 ^ k0,
+            p1 & mask,
+            (p0 >> shift) ^ c3 ^ k1,
+            p0 & mask,
+        )
+        k0 = (k0 + np.uint64(PHILOX_W0)) & mask
+        k1 = (k1 + np.uint64(PHILOX_W1)) & mask
+    return np.stack([c0, c1, c2, c3], axis=1)
+
+
+def _split64(x: int) -> tuple[int, int]:
+    return x & MASK32, (x >> 32) & MASK32
+
+
+def _to_unit(a: int, b: int) -> float:
+    # 53-bit double in [0, 1)
+    return ((a >> 5) * 67108864 + (b >> 6)) / 9007199254740992.0
+
+
+def uniform(seed: int, stream_id: int, counter: int) -> float:
+    c0, c1 = _split64(counter)
+    c2, c3 = _split64(stream_id)
+    w = philox4x32((c0, c1, c2, c3), _split64(seed))
+    return _to_unit(w[0], w[1])
+
+
+def uniform_batch(
+    seed: int | np.ndarray, stream_ids: np.ndarray, counters: np.ndarray
+) -> np.ndarray:
+    """uniform() for many (seed, stream id, counter) triples at once."""
+    stream_ids = np.asarray(stream_ids, dtype=np.uint64)
+    counters = np.asarray(counters, dtype=np.uint64)
+    seeds = np.asarray(seed, dtype=np.uint64)
+    mask = np.uint64(MASK32)
+    shift = np.uint64(32)
+    ctr = np.stack(
+        [counters & mask, counters >> shift, stream_ids & mask, stream_ids >> shift],
+        axis=1,
+    )
+    key = np.stack([seeds & mask, seeds >> shift], axis=-1)
+    w = philox4x32_batch(ctr, key)
+    a = (w[:, 0] >> np.uint64(5)).astype(np.float64)
+    b = (w[:, 1] >> np.uint64(6)).astype(np.float64)
+    return (a * 67108864.0 + b) / 9007199254740992.0
+
+
+def normal_block(seed: int, stream_id: int, block: int) -> np.ndarray:
+    """Standard normal draws of counters block * GAUSS_BLOCK onwards, as gauss() gives them."""
+    counters = np.arange(block * GAUSS_BLOCK, (block + 1) * GAUSS_BLOCK, dtype=np.uint64)
+    mask = np.uint64(MASK32)
+    shift = np.uint64(32)
+    stream = np.uint64(stream_id)
+    ctr = np.stack(
+        [
+            counters & mask,
+            counters >> shift,
+            np.full(GAUSS_BLOCK, stream & mask),
+            np.full(GAUSS_BLOCK, stream >> shift),
+        ],
+        axis=1,
+    )
+    w = philox4x32_batch(ctr, np.array(_split64(seed), dtype=np.uint64))
+
+    def unit(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+        hi = (a >> np.uint64(5)).astype(np.float64)
+        lo = (b >> np.uint64(6)).astype(np.float64)
+        return (hi * 67108864.0 + lo) / 9007199254740992.0
+
+    # Box-Muller on the two 53-bit uniforms of each block
+    u1 = 1.0 - unit(w[:, 0], w[:, 1])
+    u2 = unit(w[:, 2], w[:, 3])
+    return np.sqrt(-2.0 * np.log(u1)) * np.cos(2.0 * np.pi * u2)
+
+
+def link_stream_id(kind: int, tower_id: int, ue_id: int) -> int:
+    """Stream id for one direction of one tower/UE link."""
+    return (kind << 56) | ((tower_id & 0xFFFFFF) << 32) | (ue_id & MASK32)
+
+
+class RngStream:
+    """
+    One counter-based stream. Every draw takes the next counter value,
+    which is atomic, so concurrent callers never share or skip a draw.
+    Provides the random()/gauss() subset of random.Random used by layer1.
+    gauss() takes its draw out of a block of GAUSS_BLOCK computed in one
+    vectorized call and cached (2 kB per stream), so the value of a counter
+    is the same as computed alone and a draw is mostly an array index.
+    """
+
+    def __init__(self, seed: int, stream_id: int):
+        self.seed = seed
+        self.stream_id = stream_id
+        self._counter = itertools.count()
+        self._normals: tuple[int, np.ndarray] = (-1, np.zeros(0))
+
+    def next_counter(self) -> int:
+        return next(self._counter)
+
+    def uniform_at(self, counter: int) -> float:
+        return uniform(self.seed, self.stream_id, counter)
+
+    def random(self) -> float:
+        return self.uniform_at(self.next_counter())
+
+    def gauss(self, mu: float = 0.0, sigma: float = 1.0) -> float:
+        counter = self.next_counter()
+        block, i = divmod(counter, GAUSS_BLOCK)
+        # (block, draws) swapped whole, so concurrent callers never see a torn pair
+        cached, draws = self._normals
+        if cached != block:
+            draws = normal_block(self.seed, self.stream_id, block)
+            self._normals = (block, draws)
+        return mu + sigma * float(draws[i])
+
+    def random_batch(self, n: int) -> np.ndarray:
+        counters = np.array([self.next_counter() for _ in range(n)], dtype=np.uint64)
+        return uniform_batch(self.seed, np.full(n, self.stream_id, dtype=np.uint64), counters)
+
+
+class RngStreams:
+    """Lazily created streams keyed by stream id, all sharing one seed."""
+
+    def __init__(self, seed: int):
+        self.seed = seed
+        self._streams: dict[int, RngStream] = {}
+        self._lock = threading.Lock()
+
+    def stream(self, stream_id: int) -> RngStream:
+        s = self._streams.get(stream_id)
+        if s is not None:
+            return s
+        with self._lock:
+            return self._streams.setdefault(stream_id, RngStream(self.seed, stream_id))
+
+    def link(self, kind: int, tower_id: int, ue_id: int) -> RngStream:
+        return self.stream(link_stream_id(kind, tower_id, ue_id))
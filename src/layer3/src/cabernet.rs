@@ -1,38 +1,248 @@
+use crate::dataplane::DataPlane;
 use crate::error::{CabernetError, Result};
+use crate::tun::wait_readable;
 use crate::ue::UE;
-use pyo3::{pyclass, pymethods};
+use pyo3::{pyclass, pymethods, Python};
+use std::collections::HashMap;
+use std::panic::{self, AssertUnwindSafe};
+use std::sync::atomic::{AtomicBool, AtomicUsize, Ordering};
+use std::sync::{Arc, Mutex, RwLock};
+
+/// Prefix length used when no subnet is given
+const DEFAULT_PREFIX_LEN: u8 = 24;
+/// Prefix of the namespace and veth names when none is given
+const DEFAULT_NETNS_PREFIX: &str = "cab";
+/// Longest namespace prefix: "{prefix}-ue-inet" must fit an interface name (15 bytes)
+const MAX_NETNS_PREFIX_LEN: usize = 7;
 
 /// Cabernet is responsible for spinning up the UEs and proxy the network layer traffic between UEs
 /// and the underlying implementation (e.g., a 5G core network).
+/// All methods take `&self`: the UE list is behind a lock and every UE is shared, so frames can be
+/// polled and sent from several threads while UEs are created or deleted.
 #[pyclass]
 pub struct Cabernet {
-    pub ues: Vec<UE>,
-    pub gateway: Option<UE>,
+    pub ues: Arc<RwLock<Vec<Arc<UE>>>>,
+    pub gateway: Option<Arc<UE>>,
+    /// Prefix length of the simulated subnet, applied to every UE address
+    pub prefix_len: u8,
+    /// Prefix of the names of the UE namespaces and of the gateway's veth pair, so that
+    /// several Cabernets (with disjoint subnets) can share a host
+    pub netns_prefix: String,
+    /// Native forwarding engine, while it is running
+    dataplane: Mutex<Option<DataPlane>>,
 }
 
 /// APIs
+/// The Python entry points release the GIL around syscalls and `ip` subprocesses, so Python
+/// threads doing TUN I/O or provisioning UEs overlap instead of serializing on the GIL.
 #[pymethods]
 impl Cabernet {
     #[new]
     pub fn new() -> Self {
         Cabernet {
-            ues: Vec::new(),
+            ues: Arc::new(RwLock::new(Vec::new())),
             gateway: None,
+            prefix_len: DEFAULT_PREFIX_LEN,
+            netns_prefix: DEFAULT_NETNS_PREFIX.into(),
+            dataplane: Mutex::new(None),
         }
     }
 
+    /// Create a Cabernet whose gateway UE routes the subnet to the internet.
+    /// `gateway_queues` > 1 opens the gateway TUN in multi-queue mode, one queue per worker.
+    /// Cabernets sharing a host need disjoint subnets, distinct `netns_prefix`es and distinct
+    /// `transit` numbers, which pick the 10.200.`transit`.0/24 link between host and gateway.
     #[staticmethod]
-    pub fn with_internet(gateway: &str, subnet: &str) -> Result<Self> {
-        let gw_ue = UE::with_gateway(gateway.into(), subnet);
-
-        Ok(Self {
-            ues: Vec::new(),
-            gateway: Some(gw_ue),
+    #[pyo3(
+        name = "with_internet",
+        signature = (gateway, subnet, gateway_queues=1, netns_prefix=DEFAULT_NETNS_PREFIX, transit=0)
+    )]
+    fn py_with_internet(
+        py: Python<'_>,
+        gateway: &str,
+        subnet: &str,
+        gateway_queues: usize,
+        netns_prefix: &str,
+        transit: u8,
+    ) -> Result<Self> {
+        py.allow_threads(|| {
+            Self::with_internet(gateway, subnet, gateway_queues, netns_prefix, transit)
         })
     }
 
     /// Send an IPv4 frame to the appropriate UE based on the destination IP address in the frame.
     /// If gateway is configured, send to gateway if no matching UE is found.
+    #[pyo3(name = "send_frame")]
+    fn py_send_frame(&self, py: Python<'_>, frame: Vec<u8>) -> Result<usize> {
+        py.allow_threads(|| self.send_frame(frame))
+    }
+
+    /// Poll an IPv4 frame received from any UE.
+    /// Returns None if no frame is available.
+    /// With `include_gateway=False` the gateway is skipped, for when its queues have their own
+    /// workers polling poll_frame_from_gateway.
+    #[pyo3(name = "poll_frame", signature = (include_gateway=true))]
+    fn py_poll_frame(&self, py: Python<'_>, include_gateway: bool) -> Option<Vec<u8>> {
+        py.allow_threads(|| self.poll_frame(include_gateway))
+    }
+
+    /// Like poll_frame, but blocks for up to `timeout_ms` until a frame arrives.
+    #[pyo3(name = "poll_frame_timeout", signature = (timeout_ms, include_gateway=true))]
+    fn py_poll_frame_timeout(
+        &self,
+        py: Python<'_>,
+        timeout_ms: i32,
+        include_gateway: bool,
+    ) -> Option<Vec<u8>> {
+        py.allow_threads(|| self.poll_frame_timeout(timeout_ms, include_gateway))
+    }
+
+    /// Number of queues of the gateway TUN (0 without a gateway)
+    pub fn gateway_queues(&self) -> usize {
+        self.gateway.as_deref().map_or(0, UE::queue_count)
+    }
+
+    /// Poll an IPv4 frame from one queue of the gateway TUN
+    #[pyo3(name = "poll_frame_from_gateway")]
+    fn py_poll_frame_from_gateway(&self, py: Python<'_>, queue: usize) -> Result<Option<Vec<u8>>> {
+        py.allow_threads(|| self.poll_frame_from_gateway(queue, 0))
+    }
+
+    /// Poll an IPv4 frame from one queue of the gateway TUN, waiting up to `timeout_ms`
+    #[pyo3(name = "poll_frame_from_gateway_timeout")]
+    fn py_poll_frame_from_gateway_timeout(
+        &self,
+        py: Python<'_>,
+        queue: usize,
+        timeout_ms: i32,
+    ) -> Result<Option<Vec<u8>>> {
+        py.allow_threads(|| self.poll_frame_from_gateway(queue, timeout_ms))
+    }
+
+    #[pyo3(name = "poll_frame_from_ue")]
+    fn py_poll_frame_from_ue(&self, py: Python<'_>, ip: &str) -> Result<Option<Vec<u8>>> {
+        py.allow_threads(|| self.poll_frame_from_ue(ip))
+    }
+
+    /// Poll an IPv4 frame from the UE with the given IP, waiting up to `timeout_ms`
+    #[pyo3(name = "poll_frame_from_ue_timeout")]
+    fn py_poll_frame_from_ue_timeout(
+        &self,
+        py: Python<'_>,
+        ip: &str,
+        timeout_ms: i32,
+    ) -> Result<Option<Vec<u8>>> {
+        py.allow_threads(|| self.get_ue(ip)?.recv_timeout(timeout_ms))
+    }
+
+    /// Create a new UE with the specified IP address and start polling frames from it.
+    #[pyo3(name = "create_ue")]
+    fn py_create_ue(&self, py: Python<'_>, ip: &str) -> Result<()> {
+        py.allow_threads(|| self.create_ue(ip))
+    }
+
+    /// Create UEs for all the given IP addresses, setting up their namespaces in parallel.
+    #[pyo3(name = "create_ues")]
+    fn py_create_ues(&self, py: Python<'_>, ips: Vec<String>) -> Result<()> {
+        py.allow_threads(|| self.create_ues(ips))
+    }
+
+    /// Delete the UE with the specified IP address.
+    #[pyo3(name = "delete_ue")]
+    fn py_delete_ue(&self, py: Python<'_>, ip: &str) -> Result<()> {
+        py.allow_threads(|| self.delete_ue(ip))
+    }
+
+    /// Change the IP address assigned to a UE.
+    #[pyo3(name = "change_ip")]
+    fn py_change_ip(&self, py: Python<'_>, old_ip: String, new_ip: String) -> Result<()> {
+        py.allow_threads(|| self.change_ip(old_ip, new_ip))
+    }
+
+    /// Start forwarding natively: frames are read, delayed, dropped and sent by threads inside
+    /// the extension using the link table pushed with set_links. It starts paused; the poll and
+    /// send methods must not be used while it runs.
+    pub fn start_dataplane(&self, seed: u64) -> Result<()> {
+        let mut dataplane = self.dataplane.lock().unwrap();
+        if dataplane.is_some() {
+            return Err(CabernetError::DataPlaneRunning);
+        }
+        *dataplane = Some(DataPlane::start(
+            self.ues.clone(),
+            self.gateway.clone(),
+            self.prefix_len,
+            seed,
+        )?);
+        Ok(())
+    }
+
+    /// Stop the native forwarding threads; frames still in flight are discarded
+    pub fn stop_dataplane(&self, py: Python<'_>) {
+        let dataplane = self.dataplane.lock().unwrap().take();
+        py.allow_threads(|| drop(dataplane));
+    }
+
+    pub fn dataplane_running(&self) -> bool {
+        self.dataplane.lock().unwrap().is_some()
+    }
+
+    pub fn set_dataplane_flags(&self, paused: bool, dropping: bool, delaying: bool) -> Result<()> {
+        self.with_dataplane(|dp| dp.set_flags(paused, dropping, delaying))
+    }
+
+    /// Replace the native link table. Each entry is (UE ip, uplink, downlink) with a direction
+    /// given as (base latency ms, latency ms per byte, bit error rate); UEs left out are treated
+    /// as not attached. Returns the number of links installed.
+    pub fn set_links(
+        &self,
+        links: Vec<(String, (f64, f64, f64), (f64, f64, f64))>,
+    ) -> Result<usize> {
+        let links = links
+            .into_iter()
+            .map(|(ip, ul, dl)| (ip, ul.into(), dl.into()))
+            .collect();
+        self.with_dataplane(|dp| dp.set_links(links, |ip| self.get_ue(ip).ok()))
+    }
+
+    pub fn dataplane_stats(&self) -> Result<HashMap<&'static str, u64>> {
+        self.with_dataplane(DataPlane::stats)
+    }
+}
+
+impl Default for Cabernet {
+    fn default() -> Self {
+        Self::new()
+    }
+}
+
+impl Cabernet {
+    pub fn with_internet(
+        gateway: &str,
+        subnet: &str,
+        gateway_queues: usize,
+        netns_prefix: &str,
+        transit: u8,
+    ) -> Result<Self> {
+        let prefix_len = parse_prefix_len(subnet)?;
+        check_netns_prefix(netns_prefix)?;
+        let gw_ue = UE::with_gateway(
+            gateway.into(),
+            subnet,
+            prefix_len,
+            gateway_queues,
+            netns_prefix,
+            transit,
+        );
+
+        Ok(Self {
+            ues: Arc::new(RwLock::new(Vec::new())),
+            gateway: Some(Arc::new(gw_ue)),
+            prefix_len,
+            netns_prefix: netns_prefix.into(),
+            dataplane: Mutex::new(None),
+        })
+    }
+
     pub fn send_frame(&self, frame: Vec<u8>) -> Result<usize> {
         let iph = etherparse::Ipv4HeaderSlice::from_slice(&frame)?;
         let dst_ip = iph.destination_addr().to_string();
@@ -46,68 +256,196 @@ impl Cabernet {
         }
     }
 
-    /// Poll an IPv4 frame received from any UE.
-    /// Returns None if no frame is available.
-    pub fn poll_frame(&mut self) -> Option<Vec<u8>> {
-        fn poll(ue: &mut UE) -> Option<Vec<u8>> {
-            match ue.recv() {
-                Ok(Some(buf)) => Some(buf),
-                Ok(None) => None,
-                Err(e) => {
-                    eprintln!("Error receiving from from UE {}: {}", ue.ip, e);
-                    None
-                }
+    pub fn poll_frame(&self, include_gateway: bool) -> Option<Vec<u8>> {
+        let ues = self.ues.read().unwrap();
+        let gateway = self.gateway.as_ref().filter(|_| include_gateway);
+        ues.iter()
+            .chain(gateway)
+            .find_map(|ue| log_recv(ue, ue.recv()))
+    }
+
+    pub fn poll_frame_timeout(&self, timeout_ms: i32, include_gateway: bool) -> Option<Vec<u8>> {
+        // wait on a snapshot, so UEs can be created or deleted while this thread is blocked
+        let ues: Vec<Arc<UE>> = {
+            let ues = self.ues.read().unwrap();
+            let gateway = self.gateway.as_ref().filter(|_| include_gateway);
+            ues.iter().chain(gateway).cloned().collect()
+        };
+        let mut fds = Vec::new();
+        let mut owners = Vec::new();
+        for ue in &ues {
+            for (queue, fd) in ue.queue_fds().into_iter().enumerate() {
+                fds.push(fd);
+                owners.push((ue, queue));
             }
         }
-        self.ues
-            .iter_mut()
-            .chain(self.gateway.iter_mut())
-            .find_map(poll)
+        match wait_readable(&fds, timeout_ms) {
+            Ok(ready) => ready.into_iter().find_map(|i| {
+                let (ue, queue) = owners[i];
+                log_recv(ue, ue.recv_queue(queue))
+            }),
+            Err(e) => {
+                eprintln!("Error waiting for frames from UEs: {e}");
+                None
+            }
+        }
+    }
+
+    /// Receive from one gateway queue; a `timeout_ms` of 0 does not block
+    pub fn poll_frame_from_gateway(
+        &self,
+        queue: usize,
+        timeout_ms: i32,
+    ) -> Result<Option<Vec<u8>>> {
+        match &self.gateway {
+            Some(gw) if queue < gw.queue_count() => gw.recv_queue_timeout(queue, timeout_ms),
+            Some(_) => Err(CabernetError::InvalidQueue(queue)),
+            None => Err(CabernetError::NoGateway),
+        }
     }
 
-    pub fn poll_frame_from_ue(&mut self, ip: &str) -> Result<Option<Vec<u8>>> {
+    pub fn poll_frame_from_ue(&self, ip: &str) -> Result<Option<Vec<u8>>> {
         self.get_ue(ip)?.recv()
     }
 
-    /// Create a new UE with the specified IP address and start polling frames from it.
-    pub fn create_ue(&mut self, ip: &str) -> Result<()> {
-        let ue = UE::new(ip.into());
-        self.ues.push(ue);
+    pub fn create_ue(&self, ip: &str) -> Result<()> {
+        // set up the namespace and TUN before taking the lock, pollers keep running meanwhile
+        let ue = UE::new(ip.into(), self.prefix_len, &self.netns_prefix);
+        self.ues.write().unwrap().push(Arc::new(ue));
         Ok(())
     }
 
-    /// Delete the UE with the specified IP address.
-    pub fn delete_ue(&mut self, ip: &str) -> Result<()> {
-        dbg!(&self.ues);
-        let index = self
-            .ues
-            .iter()
-            .position(|ue| ue.ip == ip)
-            .ok_or(CabernetError::IPNotAssigned(ip.into()))?;
-        let _ue = self.ues.remove(index);
+    /// Create the UEs of every address. If one fails, the workers stop, the UEs created so
+    /// far are still added (so the caller can delete them) and the first failure is returned.
+    pub fn create_ues(&self, ips: Vec<String>) -> Result<()> {
+        // provisioning is dominated by `ip` subprocesses, so run one worker per core
+        let workers = std::thread::available_parallelism()
+            .map_or(4, |n| n.get())
+            .min(ips.len());
+        let next = AtomicUsize::new(0);
+        let failed = AtomicBool::new(false);
+        let mut created: Vec<(usize, std::result::Result<UE, String>)> = std::thread::scope(|s| {
+            let handles: Vec<_> = (0..workers)
+                .map(|_| {
+                    s.spawn(|| {
+                        let mut out = Vec::new();
+                        while !failed.load(Ordering::Relaxed) {
+                            let i = next.fetch_add(1, Ordering::Relaxed);
+                            let Some(ip) = ips.get(i) else {
+                                break;
+                            };
+                            // a failed `ip` command panics in UE::new
+                            let ue = panic::catch_unwind(AssertUnwindSafe(|| {
+                                UE::new(ip.clone(), self.prefix_len, &self.netns_prefix)
+                            }));
+                            if ue.is_err() {
+                                failed.store(true, Ordering::Relaxed);
+                            }
+                            out.push((i, ue.map_err(|_| ip.clone())));
+                        }
+                        out
+                    })
+                })
+                .collect();
+            handles
+                .into_iter()
+                .flat_map(|h| h.join().expect("UE provisioning thread panicked"))
+                .collect()
+        });
+        // keep the order the addresses were given in
+        created.sort_by_key(|(i, _)| *i);
+        let mut first_failure = None;
+        let mut ues = self.ues.write().unwrap();
+        for (_, ue) in created {
+            match ue {
+                Ok(ue) => ues.push(Arc::new(ue)),
+                Err(ip) => {
+                    first_failure.get_or_insert(ip);
+                }
+            }
+        }
+        match first_failure {
+            Some(ip) => Err(CabernetError::ProvisioningFailed(ip)),
+            None => Ok(()),
+        }
+    }
+
+    pub fn delete_ue(&self, ip: &str) -> Result<()> {
+        let _ue = {
+            let mut ues = self.ues.write().unwrap();
+            dbg!(&*ues);
+            let index = ues
+                .iter()
+                .position(|ue| ue.has_ip(ip))
+                .ok_or(CabernetError::IPNotAssigned(ip.into()))?;
+            ues.remove(index)
+        };
+        // the UE is torn down once the last in-flight poll holding it is done
         Ok(())
     }
 
-    /// Change the IP address assigned to a UE.
-    pub fn change_ip(&mut self, old_ip: String, new_ip: String) -> Result<()> {
-        self.get_ue(&old_ip)?.change_ip(new_ip);
+    pub fn change_ip(&self, old_ip: String, new_ip: String) -> Result<()> {
+        let ue = self
+            .ues
+            .read()
+            .unwrap()
+            .iter()
+            .find(|ue| ue.has_ip(&old_ip))
+            .cloned()
+            .ok_or(CabernetError::IPNotAssigned(old_ip))?;
+        ue.change_ip(new_ip);
         Ok(())
     }
-}
 
-impl Default for Cabernet {
-    fn default() -> Self {
-        Self::new()
+    fn with_dataplane<T>(&self, f: impl FnOnce(&DataPlane) -> T) -> Result<T> {
+        self.dataplane
+            .lock()
+            .unwrap()
+            .as_ref()
+            .map(f)
+            .ok_or(CabernetError::DataPlaneStopped)
     }
-}
 
-impl Cabernet {
-    // fn get_ue(&self, ip: &str) -> Result<Arc<UE>> {
-    fn get_ue(&self, ip: &str) -> Result<&UE> {
+    fn get_ue(&self, ip: &str) -> Result<Arc<UE>> {
         self.ues
+            .read()
+            .unwrap()
             .iter()
             .chain(self.gateway.iter())
-            .find(|ue| ue.ip == ip)
+            .find(|ue| ue.has_ip(ip))
+            .cloned()
             .ok_or(CabernetError::IPNotAssigned(ip.into()))
     }
 }
+
+/// Log and swallow a receive error, so one broken UE does not stop polling the others
+fn log_recv(ue: &UE, received: Result<Option<Vec<u8>>>) -> Option<Vec<u8>> {
+    match received {
+        Ok(frame) => frame,
+        Err(e) => {
+            eprintln!("Error receiving from UE {}: {}", ue.ip(), e);
+            None
+        }
+    }
+}
+
+/// A namespace prefix must be short enough for interface names and safe in `ip` arguments
+fn check_netns_prefix(netns_prefix: &str) -> Result<()> {
+    let valid = !netns_prefix.is_empty()
+        && netns_prefix.len() <= MAX_NETNS_PREFIX_LEN
+        && netns_prefix.chars().all(|c| c.is_ascii_alphanumeric());
+    if valid {
+        Ok(())
+    } else {
+        Err(CabernetError::InvalidNetnsPrefix(netns_prefix.into()))
+    }
+}
+
+/// Parse the prefix length out of a CIDR subnet such as "10.0.0.0/16"
+fn parse_prefix_len(subnet: &str) -> Result<u8> {
+    subnet
+        .split_once('/')
+        .and_then(|(_, len)| len.parse::<u8>().ok())
+        .filter(|len| *len <= 32)
+        .ok_or(CabernetError::InvalidSubnet(subnet.into()))
+}
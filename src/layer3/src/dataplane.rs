@@ -0,0 +1,493 @@
+use crate::tun::wait_readable;
+use crate::ue::UE;
+use std::cmp::Ordering as CmpOrdering;
+use std::collections::{BinaryHeap, HashMap};
+use std::net::Ipv4Addr;
+use std::sync::atomic::{AtomicBool, AtomicU64, Ordering};
+use std::sync::mpsc::{channel, Receiver, RecvTimeoutError, Sender};
+use std::sync::{Arc, RwLock};
+use std::thread::JoinHandle;
+use std::time::{Duration, Instant};
+
+/// How long the reader blocks in poll(2) before it re-reads the UE list and the stop flag
+const POLL_TIMEOUT_MS: i32 = 50;
+/// Frames drained from one ready queue before polling again, so one busy UE does not starve the rest
+const RX_BURST: usize = 32;
+
+/// Radio parameters of one direction of a UE's link to its serving cell.
+/// A frame of n bytes occupies the link for `n * ms_per_byte` after the frames ahead of it,
+/// arrives `base_ms` later and is lost with probability `1 - (1 - ber)^(8n)`, the same model
+/// Glu applies in Python.
+#[derive(Debug, Clone, Copy)]
+pub struct Direction {
+    pub base_ms: f64,
+    pub ms_per_byte: f64,
+    pub ber: f64,
+}
+
+impl Direction {
+    fn packet_error_rate(&self, nbytes: usize) -> f64 {
+        1.0 - (1.0 - self.ber).powi(8 * nbytes as i32)
+    }
+}
+
+impl From<(f64, f64, f64)> for Direction {
+    fn from((base_ms, ms_per_byte, ber): (f64, f64, f64)) -> Self {
+        Self {
+            base_ms,
+            ms_per_byte,
+            ber,
+        }
+    }
+}
+
+/// Link of a UE that is attached to a cell; UEs without one have no entry and their frames are dropped
+struct Link {
+    ue: Arc<UE>,
+    uplink: Direction,
+    downlink: Direction,
+    /// when each direction finishes its queued transmissions, in ns since `Shared::epoch`;
+    /// only the reader updates the uplink and only the scheduler the downlink
+    uplink_busy_until: AtomicU64,
+    downlink_busy_until: AtomicU64,
+}
+
+#[derive(Default)]
+struct Stats {
+    received: AtomicU64,
+    unassociated: AtomicU64,
+    dropped_uplink: AtomicU64,
+    dropped_downlink: AtomicU64,
+    /// frames (and their bytes) that finished the uplink leg and were routed on, as Glu counts
+    /// its forwarded uplink frames
+    delivered_uplink: AtomicU64,
+    delivered_uplink_bytes: AtomicU64,
+    sent_to_ues: AtomicU64,
+    sent_to_ues_bytes: AtomicU64,
+    sent_to_internet: AtomicU64,
+    send_errors: AtomicU64,
+}
+
+impl Stats {
+    fn delivered(&self, frame: &[u8]) {
+        self.delivered_uplink.fetch_add(1, Ordering::Relaxed);
+        self.delivered_uplink_bytes
+            .fetch_add(frame.len() as u64, Ordering::Relaxed);
+    }
+}
+
+/// State shared between the handle and the forwarding threads
+struct Shared {
+    ues: Arc<RwLock<Vec<Arc<UE>>>>,
+    gateway: Option<Arc<UE>>,
+    /// (network, mask) of the simulated subnet; without a gateway every address is local
+    subnet: Option<(u32, u32)>,
+    links: RwLock<HashMap<u32, Link>>,
+    epoch: Instant,
+    running: AtomicBool,
+    paused: AtomicBool,
+    dropping: AtomicBool,
+    delaying: AtomicBool,
+    stats: Stats,
+}
+
+impl Shared {
+    fn is_local(&self, ip: u32) -> bool {
+        self.subnet
+            .map_or(true, |(network, mask)| ip & mask == network)
+    }
+
+    /// Queue a frame behind the ones already on a link direction; returns when it arrives
+    fn reserve(
+        &self,
+        busy_until: &AtomicU64,
+        direction: &Direction,
+        nbytes: usize,
+        now: Instant,
+    ) -> Instant {
+        let now_ns = now.duration_since(self.epoch).as_nanos() as u64;
+        let tx_ns = (nbytes as f64 * direction.ms_per_byte * 1e6).max(0.0) as u64;
+        let done_ns = busy_until.load(Ordering::Relaxed).max(now_ns) + tx_ns;
+        busy_until.store(done_ns, Ordering::Relaxed);
+        self.epoch
+            + Duration::from_nanos(done_ns)
+            + Duration::from_secs_f64(direction.base_ms.max(0.0) / 1e3)
+    }
+}
+
+enum Leg {
+    /// on its way from the source UE (or the internet) to the cell
+    Uplink,
+    /// on its way from the cell to the destination UE
+    Downlink(Arc<UE>),
+}
+
+/// A frame in flight, ordered by due time (earliest first) and then by arrival
+struct Pending {
+    due: Instant,
+    seq: u64,
+    frame: Vec<u8>,
+    leg: Leg,
+}
+
+impl PartialEq for Pending {
+    fn eq(&self, other: &Self) -> bool {
+        self.due == other.due && self.seq == other.seq
+    }
+}
+
+impl Eq for Pending {}
+
+impl PartialOrd for Pending {
+    fn partial_cmp(&self, other: &Self) -> Option<CmpOrdering> {
+        Some(self.cmp(other))
+    }
+}
+
+impl Ord for Pending {
+    // reversed, BinaryHeap is a max-heap
+    fn cmp(&self, other: &Self) -> CmpOrdering {
+        other
+            .due
+            .cmp(&self.due)
+            .then_with(|| other.seq.cmp(&self.seq))
+    }
+}
+
+/// SplitMix64, enough for Bernoulli drops and cheap to keep one per thread
+struct SplitMix64(u64);
+
+impl SplitMix64 {
+    fn next_f64(&mut self) -> f64 {
+        self.0 = self.0.wrapping_add(0x9e3779b97f4a7c15);
+        let mut z = self.0;
+        z = (z ^ (z >> 30)).wrapping_mul(0xbf58476d1ce4e5b9);
+        z = (z ^ (z >> 27)).wrapping_mul(0x94d049bb133111eb);
+        z ^= z >> 31;
+        (z >> 11) as f64 / (1u64 << 53) as f64
+    }
+}
+
+/// Native forwarding engine: one thread reads frames from every UE and gateway queue, applies
+/// the uplink drop and delay and hands them to a scheduler thread that keeps the in-flight
+/// frames in a heap, applies the downlink leg and writes them out. Python only pushes the
+/// per-link parameters (set_links) and the pause/drop/delay flags.
+pub struct DataPlane {
+    shared: Arc<Shared>,
+    threads: Vec<JoinHandle<()>>,
+}
+
+impl DataPlane {
+    pub fn start(
+        ues: Arc<RwLock<Vec<Arc<UE>>>>,
+        gateway: Option<Arc<UE>>,
+        prefix_len: u8,
+        seed: u64,
+    ) -> std::io::Result<Self> {
+        let subnet = gateway.as_ref().and_then(|gw| {
+            let ip: Ipv4Addr = gw.ip().parse().ok()?;
+            let mask = u32::MAX.checked_shl(32 - prefix_len as u32).unwrap_or(0);
+            Some((u32::from(ip) & mask, mask))
+        });
+        let shared = Arc::new(Shared {
+            ues,
+            gateway,
+            subnet,
+            links: RwLock::new(HashMap::new()),
+            epoch: Instant::now(),
+            running: AtomicBool::new(true),
+            paused: AtomicBool::new(true),
+            dropping: AtomicBool::new(true),
+            delaying: AtomicBool::new(true),
+            stats: Stats::default(),
+        });
+
+        let (tx, rx) = channel();
+        let reader = {
+            let shared = shared.clone();
+            std::thread::Builder::new()
+                .name("cabernet-rx".into())
+                .spawn(move || run_reader(&shared, tx, SplitMix64(seed)))?
+        };
+        let scheduler = {
+            let shared = shared.clone();
+            std::thread::Builder::new()
+                .name("cabernet-sched".into())
+                .spawn(move || run_scheduler(&shared, rx, SplitMix64(!seed)))?
+        };
+        Ok(Self {
+            shared,
+            threads: vec![reader, scheduler],
+        })
+    }
+
+    /// Replace the link table; `resolve` maps an IP to its UE, entries it cannot resolve are skipped.
+    /// Links that stay keep their queued transmissions.
+    pub fn set_links(
+        &self,
+        links: Vec<(String, Direction, Direction)>,
+        resolve: impl Fn(&str) -> Option<Arc<UE>>,
+    ) -> usize {
+        let mut current = self.shared.links.write().unwrap();
+        let table: HashMap<u32, Link> = links
+            .into_iter()
+            .filter_map(|(ip, uplink, downlink)| {
+                let addr = u32::from(ip.parse::<Ipv4Addr>().ok()?);
+                let ue = resolve(&ip)?;
+                let busy = |f: fn(&Link) -> &AtomicU64| {
+                    current
+                        .get(&addr)
+                        .map_or(0, |old| f(old).load(Ordering::Relaxed))
+                };
+                Some((
+                    addr,
+                    Link {
+                        ue,
+                        uplink,
+                        downlink,
+                        uplink_busy_until: AtomicU64::new(busy(|l| &l.uplink_busy_until)),
+                        downlink_busy_until: AtomicU64::new(busy(|l| &l.downlink_busy_until)),
+                    },
+                ))
+            })
+            .collect();
+        let n = table.len();
+        *current = table;
+        n
+    }
+
+    pub fn set_flags(&self, paused: bool, dropping: bool, delaying: bool) {
+        self.shared.paused.store(paused, Ordering::Relaxed);
+        self.shared.dropping.store(dropping, Ordering::Relaxed);
+        self.shared.delaying.store(delaying, Ordering::Relaxed);
+    }
+
+    pub fn stats(&self) -> HashMap<&'static str, u64> {
+        let s = &self.shared.stats;
+        HashMap::from([
+            ("links", self.shared.links.read().unwrap().len() as u64),
+            ("received", s.received.load(Ordering::Relaxed)),
+            ("unassociated", s.unassociated.load(Ordering::Relaxed)),
+            ("dropped_uplink", s.dropped_uplink.load(Ordering::Relaxed)),
+            (
+                "dropped_downlink",
+                s.dropped_downlink.load(Ordering::Relaxed),
+            ),
+            (
+                "delivered_uplink",
+                s.delivered_uplink.load(Ordering::Relaxed),
+            ),
+            (
+                "delivered_uplink_bytes",
+                s.delivered_uplink_bytes.load(Ordering::Relaxed),
+            ),
+            ("sent_to_ues", s.sent_to_ues.load(Ordering::Relaxed)),
+            (
+                "sent_to_ues_bytes",
+                s.sent_to_ues_bytes.load(Ordering::Relaxed),
+            ),
+            (
+                "sent_to_internet",
+                s.sent_to_internet.load(Ordering::Relaxed),
+            ),
+            ("send_errors", s.send_errors.load(Ordering::Relaxed)),
+        ])
+    }
+}
+
+impl Drop for DataPlane {
+    fn drop(&mut self) {
+        self.shared.running.store(false, Ordering::Relaxed);
+        for t in self.threads.drain(..) {
+            let _ = t.join();
+        }
+    }
+}
+
+fn addresses(frame: &[u8]) -> (u32, u32) {
+    let src = u32::from_be_bytes([frame[12], frame[13], frame[14], frame[15]]);
+    let dst = u32::from_be_bytes([frame[16], frame[17], frame[18], frame[19]]);
+    (src, dst)
+}
+
+fn run_reader(shared: &Shared, tx: Sender<Pending>, mut rng: SplitMix64) {
+    let mut seq = 0u64;
+    while shared.running.load(Ordering::Relaxed) {
+        if shared.paused.load(Ordering::Relaxed) {
+            std::thread::sleep(Duration::from_millis(POLL_TIMEOUT_MS as u64));
+            continue;
+        }
+        // snapshot, so UEs can be created or deleted while this thread is blocked
+        let ues: Vec<Arc<UE>> = {
+            let ues = shared.ues.read().unwrap();
+            ues.iter().chain(shared.gateway.iter()).cloned().collect()
+        };
+        let mut fds = Vec::new();
+        let mut owners = Vec::new();
+        for ue in &ues {
+            for (queue, fd) in ue.queue_fds().into_iter().enumerate() {
+                fds.push(fd);
+                owners.push((ue, queue));
+            }
+        }
+        let ready = match wait_readable(&fds, POLL_TIMEOUT_MS) {
+            Ok(ready) => ready,
+            Err(e) => {
+                eprintln!("Error waiting for frames from UEs: {e}");
+                continue;
+            }
+        };
+        for i in ready {
+            let (ue, queue) = owners[i];
+            for _ in 0..RX_BURST {
+                let frame = match ue.recv_queue(queue) {
+                    Ok(Some(frame)) => frame,
+                    Ok(None) => break,
+                    Err(e) => {
+                        eprintln!("Error receiving from UE {}: {}", ue.ip(), e);
+                        break;
+                    }
+                };
+                shared.stats.received.fetch_add(1, Ordering::Relaxed);
+                if let Some(pending) = uplink(shared, frame, &mut rng, seq) {
+                    seq += 1;
+                    if tx.send(pending).is_err() {
+                        return;
+                    }
+                }
+            }
+        }
+    }
+}
+
+/// Apply the uplink leg to a received frame; None if it is lost
+fn uplink(shared: &Shared, frame: Vec<u8>, rng: &mut SplitMix64, seq: u64) -> Option<Pending> {
+    let (src, _) = addresses(&frame);
+    let now = Instant::now();
+    // frames from the internet reach the cell without a radio hop
+    if !shared.is_local(src) {
+        return Some(Pending {
+            due: now,
+            seq,
+            frame,
+            leg: Leg::Uplink,
+        });
+    }
+    let links = shared.links.read().unwrap();
+    let Some(link) = links.get(&src) else {
+        shared.stats.unassociated.fetch_add(1, Ordering::Relaxed);
+        return None;
+    };
+    // a frame that is lost still occupied the link while it was sent
+    let due = if shared.delaying.load(Ordering::Relaxed) {
+        shared.reserve(&link.uplink_busy_until, &link.uplink, frame.len(), now)
+    } else {
+        now
+    };
+    if shared.dropping.load(Ordering::Relaxed)
+        && rng.next_f64() < link.uplink.packet_error_rate(frame.len())
+    {
+        shared.stats.dropped_uplink.fetch_add(1, Ordering::Relaxed);
+        return None;
+    }
+    Some(Pending {
+        due,
+        seq,
+        frame,
+        leg: Leg::Uplink,
+    })
+}
+
+fn run_scheduler(shared: &Shared, rx: Receiver<Pending>, mut rng: SplitMix64) {
+    let mut heap = BinaryHeap::new();
+    // downlink legs take sequence numbers from the upper half, apart from the reader's
+    let mut seq = 1u64 << 63;
+    let idle = Duration::from_millis(POLL_TIMEOUT_MS as u64);
+    while shared.running.load(Ordering::Relaxed) {
+        let timeout = heap.peek().map_or(idle, |p: &Pending| {
+            p.due.saturating_duration_since(Instant::now())
+        });
+        match rx.recv_timeout(timeout) {
+            Ok(pending) => heap.push(pending),
+            Err(RecvTimeoutError::Timeout) => {}
+            Err(RecvTimeoutError::Disconnected) => return,
+        }
+        heap.extend(rx.try_iter());
+
+        let now = Instant::now();
+        while heap.peek().is_some_and(|p| p.due <= now) {
+            let pending = heap.pop().unwrap();
+            match pending.leg {
+                Leg::Uplink => {
+                    if let Some(next) = downlink(shared, pending.frame, &mut rng, seq) {
+                        seq += 1;
+                        heap.push(next);
+                    }
+                }
+                Leg::Downlink(ue) => {
+                    if send(shared, &ue, &pending.frame, &shared.stats.sent_to_ues) {
+                        shared
+                            .stats
+                            .sent_to_ues_bytes
+                            .fetch_add(pending.frame.len() as u64, Ordering::Relaxed);
+                    }
+                }
+            }
+        }
+    }
+}
+
+/// Route a frame that reached the cell: out to the internet, or onto the destination's downlink.
+/// Frames routed either way count as delivered on the uplink, ones without a destination do not
+fn downlink(shared: &Shared, frame: Vec<u8>, rng: &mut SplitMix64, seq: u64) -> Option<Pending> {
+    let (_, dst) = addresses(&frame);
+    if !shared.is_local(dst) {
+        shared.stats.delivered(&frame);
+        if let Some(gw) = &shared.gateway {
+            send(shared, gw, &frame, &shared.stats.sent_to_internet);
+        }
+        return None;
+    }
+    let links = shared.links.read().unwrap();
+    let Some(link) = links.get(&dst) else {
+        shared.stats.unassociated.fetch_add(1, Ordering::Relaxed);
+        return None;
+    };
+    shared.stats.delivered(&frame);
+    let now = Instant::now();
+    let due = if shared.delaying.load(Ordering::Relaxed) {
+        shared.reserve(&link.downlink_busy_until, &link.downlink, frame.len(), now)
+    } else {
+        now
+    };
+    if shared.dropping.load(Ordering::Relaxed)
+        && rng.next_f64() < link.downlink.packet_error_rate(frame.len())
+    {
+        shared
+            .stats
+            .dropped_downlink
+            .fetch_add(1, Ordering::Relaxed);
+        return None;
+    }
+    Some(Pending {
+        due,
+        seq,
+        frame,
+        leg: Leg::Downlink(link.ue.clone()),
+    })
+}
+
+/// Send a frame and count it in sent; false if it could not be sent
+fn send(shared: &Shared, ue: &UE, frame: &[u8], sent: &AtomicU64) -> bool {
+    match ue.send(frame) {
+        Ok(_) => {
+            sent.fetch_add(1, Ordering::Relaxed);
+            true
+        }
+        Err(e) => {
+            shared.stats.send_errors.fetch_add(1, Ordering::Relaxed);
+            eprintln!("Error sending to UE {}: {}", ue.ip(), e);
+            false
+        }
+    }
+}
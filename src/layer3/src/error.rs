@@ -12,6 +12,27 @@ pub enum CabernetError {
     #[error("requested ip [{0}] is not assigned to any UE in the network")]
     IPNotAssigned(String),
 
+    #[error("could not provision the UE of ip [{0}]")]
+    ProvisioningFailed(String),
+
+    #[error("invalid subnet [{0}], expected CIDR notation such as 10.0.0.0/24")]
+    InvalidSubnet(String),
+
+    #[error("invalid namespace prefix [{0}], expected 1 to 7 letters or digits")]
+    InvalidNetnsPrefix(String),
+
+    #[error("gateway has no queue {0}")]
+    InvalidQueue(usize),
+
+    #[error("cabernet was created without a gateway")]
+    NoGateway,
+
+    #[error("native data plane is already running")]
+    DataPlaneRunning,
+
+    #[error("native data plane is not running")]
+    DataPlaneStopped,
+
     #[error("failed to parse ipv4 header: {0}")]
     Ipv4HeaderParse(#[from] HeaderSliceError),
 }
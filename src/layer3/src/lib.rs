@@ -1,5 +1,7 @@
 mod cabernet;
+mod dataplane;
 mod error;
+mod tun;
 mod ue;
 use pyo3::prelude::*;
 
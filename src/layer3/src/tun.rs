@@ -0,0 +1,173 @@
+use nix::libc;
+use std::fs::{File, OpenOptions};
+use std::io::{Read, Write};
+use std::os::fd::AsRawFd;
+use std::os::unix::fs::OpenOptionsExt;
+
+// from <linux/if_tun.h>
+const TUNSETIFF: libc::c_ulong = 0x400454ca;
+const IFF_TUN: libc::c_short = 0x0001;
+const IFF_NO_PI: libc::c_short = 0x1000;
+const IFF_MULTI_QUEUE: libc::c_short = 0x0100;
+
+/// struct ifreq with the ifr_flags member of the union
+#[repr(C)]
+struct IfReq {
+    name: [libc::c_char; libc::IFNAMSIZ],
+    flags: libc::c_short,
+    _pad: [u8; 22],
+}
+
+/// A TUN interface (IPv4 frames without packet info) backed by one or more queues.
+/// With more than one queue the interface is created with IFF_MULTI_QUEUE; the kernel then
+/// spreads the frames it hands to userspace across the queues by flow, and each queue is a
+/// separate non-blocking fd that can be drained by its own worker.
+#[derive(Debug)]
+pub struct Tun {
+    name: String,
+    queues: Vec<File>,
+}
+
+impl Tun {
+    /// Create (or attach to) the TUN interface `name` with `n_queues` queues
+    pub fn open(name: &str, n_queues: usize) -> std::io::Result<Self> {
+        let n_queues = n_queues.max(1);
+        let mut flags = IFF_TUN | IFF_NO_PI;
+        if n_queues > 1 {
+            flags |= IFF_MULTI_QUEUE;
+        }
+
+        let mut queues = Vec::with_capacity(n_queues);
+        let mut actual_name = name.to_string();
+        for _ in 0..n_queues {
+            let file = OpenOptions::new()
+                .read(true)
+                .write(true)
+                .custom_flags(libc::O_NONBLOCK)
+                .open("/dev/net/tun")?;
+
+            let mut req = IfReq {
+                name: [0; libc::IFNAMSIZ],
+                flags,
+                _pad: [0; 22],
+            };
+            for (dst, src) in req
+                .name
+                .iter_mut()
+                .zip(name.as_bytes().iter().take(libc::IFNAMSIZ - 1))
+            {
+                *dst = *src as libc::c_char;
+            }
+
+            let rc =
+                unsafe { libc::ioctl(file.as_raw_fd(), TUNSETIFF as _, &mut req as *mut IfReq) };
+            if rc < 0 {
+                return Err(std::io::Error::last_os_error());
+            }
+            actual_name = req
+                .name
+                .iter()
+                .take_while(|c| **c != 0)
+                .map(|c| *c as u8 as char)
+                .collect();
+            queues.push(file);
+        }
+
+        Ok(Self {
+            name: actual_name,
+            queues,
+        })
+    }
+
+    pub fn name(&self) -> &str {
+        &self.name
+    }
+
+    pub fn queue_count(&self) -> usize {
+        self.queues.len()
+    }
+
+    /// Raw fd of a queue, e.g. for poll(2)
+    pub fn queue_fd(&self, queue: usize) -> i32 {
+        self.queues[queue].as_raw_fd()
+    }
+
+    /// Write one frame to the queue selected by the frame's flow hash,
+    /// so every frame of a flow goes through the same queue in order
+    pub fn send(&self, data: &[u8]) -> std::io::Result<usize> {
+        self.send_on(flow_queue(data, self.queues.len()), data)
+    }
+
+    pub fn send_on(&self, queue: usize, data: &[u8]) -> std::io::Result<usize> {
+        (&self.queues[queue]).write(data)
+    }
+
+    /// Non-blocking read from one queue; WouldBlock when it is empty
+    pub fn recv_on(&self, queue: usize, buf: &mut [u8]) -> std::io::Result<usize> {
+        (&self.queues[queue]).read(buf)
+    }
+}
+
+/// Wait until one of `fds` is readable or `timeout_ms` elapses (-1 waits indefinitely).
+/// Returns the indices of the fds that are ready (readable or in error), empty on timeout.
+pub fn wait_readable(fds: &[i32], timeout_ms: i32) -> std::io::Result<Vec<usize>> {
+    let mut pfds: Vec<libc::pollfd> = fds
+        .iter()
+        .map(|fd| libc::pollfd {
+            fd: *fd,
+            events: libc::POLLIN,
+            revents: 0,
+        })
+        .collect();
+    let rc = unsafe { libc::poll(pfds.as_mut_ptr(), pfds.len() as libc::nfds_t, timeout_ms) };
+    if rc < 0 {
+        let err = std::io::Error::last_os_error();
+        if err.kind() == std::io::ErrorKind::Interrupted {
+            return Ok(Vec::new());
+        }
+        return Err(err);
+    }
+    Ok(pfds
+        .iter()
+        .enumerate()
+        .filter(|(_, p)| p.revents != 0)
+        .map(|(i, _)| i)
+        .collect())
+}
+
+/// Pick a queue for an IPv4 frame from its 5-tuple (protocol, addresses and, for TCP/UDP,
+/// ports). Non-IPv4 or truncated frames and non-first fragments fall back to the addresses.
+pub fn flow_queue(frame: &[u8], n_queues: usize) -> usize {
+    if n_queues <= 1 {
+        return 0;
+    }
+    (flow_hash(frame) as usize) % n_queues
+}
+
+/// FNV-1a over the 5-tuple of an IPv4 frame
+pub fn flow_hash(frame: &[u8]) -> u32 {
+    const FNV_OFFSET: u32 = 0x811c9dc5;
+    const FNV_PRIME: u32 = 0x01000193;
+    let mut hash = FNV_OFFSET;
+    let mut feed = |bytes: &[u8]| {
+        for b in bytes {
+            hash ^= *b as u32;
+            hash = hash.wrapping_mul(FNV_PRIME);
+        }
+    };
+
+    if frame.len() < 20 || frame[0] >> 4 != 4 {
+        feed(frame.get(..20).unwrap_or(frame));
+        return hash;
+    }
+    let ihl = ((frame[0] & 0x0f) as usize) * 4;
+    let protocol = frame[9];
+    feed(&[protocol]);
+    feed(&frame[12..20]);
+
+    let fragment_offset = u16::from_be_bytes([frame[6], frame[7]]) & 0x1fff;
+    if (protocol == 6 || protocol == 17) && fragment_offset == 0 && frame.len() >= ihl + 4 {
+        feed(&frame[ihl..ihl + 4]);
+    }
+    hash
+}
@@ -1,11 +1,14 @@
 use crate::error::Result;
+use crate::tun::{wait_readable, Tun};
 use nix::libc;
 use nix::sched::{clone, setns, CloneFlags};
 use nix::sys::wait::waitpid;
 use nix::unistd::{getpid, Pid};
 use pyo3::{pyclass, pymethods};
-use std::io::{Read, Write};
+use std::io::Write;
 use std::process::Command;
+use std::sync::atomic::{AtomicUsize, Ordering};
+use std::sync::RwLock;
 
 const STACK_SIZE: usize = 1024 * 1024; // 1 MB stack for child
 
@@ -15,98 +18,190 @@ const STACK_SIZE: usize = 1024 * 1024; // 1 MB stack for child
 #[derive(Debug)]
 #[pyclass]
 pub struct UE {
-    /// IP address assigned to the UE
-    pub ip: String,
+    /// IP address assigned to the UE; behind a lock so the UE can be shared between the
+    /// threads polling it while its address changes
+    ip: RwLock<String>,
+    /// Prefix length of the simulated subnet the IP belongs to
+    pub prefix_len: u8,
+    /// Name of the network namespace the UE lives in
+    pub netns: String,
     /// TUN interface associated with the UE
-    pub iface: tun_tap::Iface,
+    pub iface: Tun,
     /// PID of the pause process running in the UE's network namespace
     pub pause_pid: Pid,
+    /// Queue that the next recv() starts from, so no queue starves the others
+    next_queue: AtomicUsize,
 }
 
 impl UE {
-    /// Create a new UE with the specified IP address
-    pub fn new(ip: String) -> Self {
+    /// Create a new UE with the specified IP address inside a subnet of the given prefix length;
+    /// its namespace is named after `netns_prefix` and the address
+    pub fn new(ip: String, prefix_len: u8, netns_prefix: &str) -> Self {
+        let netns = netns_for_ip(netns_prefix, &ip);
+
         // create pause process in new netns
         let pause_pid = create_pause();
 
         // attach netns to the ip netns list (for better visibility)
-        attach_netns(pause_pid, &ip);
+        attach_netns(pause_pid, &netns);
 
         // create and setup tun in that netns
-        let iface = create_tun(pause_pid, &ip);
+        let iface = create_tun(pause_pid, &ip, prefix_len, 1);
 
         // setup default route via the given ip
-        setup_default_route(&iface, &ip);
+        setup_default_route(&iface, &ip, &netns);
 
         Self {
-            ip,
+            ip: RwLock::new(ip),
+            prefix_len,
+            netns,
             iface,
             pause_pid,
+            next_queue: AtomicUsize::new(0),
         }
     }
-    pub fn with_gateway(ip: String, subnet: &str) -> Self {
+
+    /// Create the gateway UE; its TUN gets `queues` queues so that several workers can
+    /// drain internet-bound traffic in parallel. The veth pair to the host is named after
+    /// `netns_prefix` and addressed in 10.200.`transit`.0/24, both unique per Cabernet.
+    pub fn with_gateway(
+        ip: String,
+        subnet: &str,
+        prefix_len: u8,
+        queues: usize,
+        netns_prefix: &str,
+        transit: u8,
+    ) -> Self {
+        let netns = netns_for_ip(netns_prefix, &ip);
+
         // create pause process in new netns
         let pause_pid = create_pause();
 
         // attach netns to the ip netns list (for better visibility)
-        attach_netns(pause_pid, &ip);
+        attach_netns(pause_pid, &netns);
 
         // create and setup tun in that netns
-        let iface = create_tun(pause_pid, &ip);
+        let iface = create_tun(pause_pid, &ip, prefix_len, queues);
 
         // setup internet access via the given gateway
-        setup_internet_access(&ip, subnet);
+        setup_internet_access(&netns, subnet, netns_prefix, transit);
 
         Self {
-            ip,
+            ip: RwLock::new(ip),
+            prefix_len,
+            netns,
             iface,
             pause_pid,
+            next_queue: AtomicUsize::new(0),
+        }
+    }
+
+    pub fn ip(&self) -> String {
+        self.ip.read().unwrap().clone()
+    }
+
+    pub fn has_ip(&self, ip: &str) -> bool {
+        *self.ip.read().unwrap() == ip
+    }
+
+    pub fn queue_count(&self) -> usize {
+        self.iface.queue_count()
+    }
+
+    /// Raw fds of all queues, in queue order
+    pub fn queue_fds(&self) -> Vec<i32> {
+        (0..self.iface.queue_count())
+            .map(|q| self.iface.queue_fd(q))
+            .collect()
+    }
+
+    /// Receive one IPv4 frame from a single queue of the UE's TUN
+    pub fn recv_queue(&self, queue: usize) -> Result<Option<Vec<u8>>> {
+        let mut buf = [0u8; 1500];
+        match self.iface.recv_on(queue, &mut buf) {
+            Ok(nbytes) => match etherparse::Ipv4HeaderSlice::from_slice(&buf[..nbytes]) {
+                Ok(_) => Ok(Some(buf[..nbytes].to_vec())),
+                Err(_) => Ok(None),
+            },
+            Err(e) => match e.kind() {
+                std::io::ErrorKind::WouldBlock => Ok(None),
+                _ => Err(e),
+            },
+        }
+        .map_err(Into::into)
+    }
+
+    /// Receive one IPv4 frame from a single queue, waiting up to `timeout_ms` for it
+    /// (0 does not wait)
+    pub fn recv_queue_timeout(&self, queue: usize, timeout_ms: i32) -> Result<Option<Vec<u8>>> {
+        if timeout_ms != 0 && wait_readable(&[self.iface.queue_fd(queue)], timeout_ms)?.is_empty() {
+            return Ok(None);
         }
+        self.recv_queue(queue)
+    }
+
+    /// Receive one IPv4 frame from any queue, waiting up to `timeout_ms` for one to arrive
+    pub fn recv_timeout(&self, timeout_ms: i32) -> Result<Option<Vec<u8>>> {
+        for queue in wait_readable(&self.queue_fds(), timeout_ms)? {
+            if let Some(frame) = self.recv_queue(queue)? {
+                return Ok(Some(frame));
+            }
+        }
+        Ok(None)
     }
 }
 
 #[pymethods]
 impl UE {
     /// Change the IP address assigned to the UE
+    /// The namespace keeps the name it was created with.
     pub fn change_ip(&self, new_ip: String) {
-        assign_ip_to_tun(&self.iface, &new_ip);
-        setup_default_route(&self.iface, &new_ip);
+        let mut ip = self.ip.write().unwrap();
+        run_ip(&format!(
+            "-n {} addr del {}/{} dev {}",
+            self.netns,
+            ip,
+            self.prefix_len,
+            self.iface.name()
+        ));
+        run_ip(&format!(
+            "-n {} addr add {new_ip}/{} dev {}",
+            self.netns,
+            self.prefix_len,
+            self.iface.name()
+        ));
+        setup_default_route(&self.iface, &new_ip, &self.netns);
+        *ip = new_ip;
     }
 
     /// Send IPv4 frames to the UE
     /// data is assumed to be the raw IPv4 packet (without Ethernet header)
     /// MTU is assumed to be 1500 bytes
+    /// With several queues, the queue is picked by the frame's 5-tuple hash.
     pub fn send(&self, data: &[u8]) -> Result<usize> {
         self.iface.send(data).map_err(Into::into)
     }
 
-    /// Receive IPv4 frames from the UE
+    /// Receive IPv4 frames from the UE, trying every queue once
     /// data is assumed to be the raw IPv4 packet (without Ethernet header)
     /// MTU is assumed to be 1500 bytes
     pub fn recv(&self) -> Result<Option<Vec<u8>>> {
-        let mut buf = [0u8; 1500];
-        match self.iface.recv(&mut buf) {
-            Ok(nbytes) => match etherparse::Ipv4HeaderSlice::from_slice(&buf[..nbytes]) {
-                Ok(_) => Ok(Some(buf[..nbytes].to_vec())),
-                Err(e) => {
-                    // eprintln!("Failed to parse IPv4 header: {e}");
-                    Ok(None)
-                }
-            },
-            Err(e) => match e.kind() {
-                std::io::ErrorKind::WouldBlock => Ok(None),
-                _ => Err(e),
-            },
+        let n = self.iface.queue_count();
+        let start = self.next_queue.fetch_add(1, Ordering::Relaxed);
+        for i in 0..n {
+            if let Some(frame) = self.recv_queue((start + i) % n)? {
+                return Ok(Some(frame));
+            }
         }
-        .map_err(Into::into)
+        Ok(None)
     }
 }
 
 /// Attach the network namespace of the pause process to the ip netns list
-fn attach_netns(pause_pid: Pid, ip: &str) {
+fn attach_netns(pause_pid: Pid, netns: &str) {
     // ip netns attach childns {pause_pid}
     let output = Command::new("ip")
-        .args(format!("netns attach {} {pause_pid}", netns_for_ip(ip)).split(' '))
+        .args(format!("netns attach {netns} {pause_pid}").split(' '))
         .output()
         .expect("failed to execute process");
     if !output.status.success() {
@@ -118,10 +213,10 @@ fn attach_netns(pause_pid: Pid, ip: &str) {
 }
 
 /// Detach the network namespace of the pause process from the ip netns list
-fn detach_netns(ip: &str) {
+fn detach_netns(netns: &str) {
     // ip netns delete childns
     let output = Command::new("ip")
-        .args(format!("netns delete {}", netns_for_ip(ip)).split(' '))
+        .args(format!("netns delete {netns}").split(' '))
         .output()
         .expect("failed to execute process");
     if !output.status.success() {
@@ -156,7 +251,7 @@ pub fn create_pause() -> Pid {
 }
 
 /// Create and setup a TUN interface in the network namespace of the given PID
-fn create_tun(cid: Pid, ip: &str) -> tun_tap::Iface {
+fn create_tun(cid: Pid, ip: &str, prefix_len: u8, queues: usize) -> Tun {
     // set ns into cid's nn
     let new_ns_fd = nix::fcntl::open(
         &std::path::PathBuf::from(format!("/proc/{cid}/ns/net")),
@@ -176,10 +271,8 @@ fn create_tun(cid: Pid, ip: &str) -> tun_tap::Iface {
     setns(new_ns_fd, nix::sched::CloneFlags::CLONE_NEWNET).unwrap();
 
     // create tun
-    let tun =
-        tun_tap::Iface::without_packet_info(&format!("cab-{cid}"), tun_tap::Mode::Tun).unwrap();
-    tun.set_non_blocking().unwrap();
-    setup_tun(&tun, ip);
+    let tun = Tun::open(&format!("cab-{cid}"), queues).unwrap();
+    setup_tun(&tun, ip, prefix_len);
 
     // go back to original ns
     setns(org_ns_fd, nix::sched::CloneFlags::CLONE_NEWNET).unwrap();
@@ -188,9 +281,10 @@ fn create_tun(cid: Pid, ip: &str) -> tun_tap::Iface {
 }
 
 /// Assign an IP address to the TUN interface
-fn assign_ip_to_tun(tun: &tun_tap::Iface, ip: &str) {
+/// Must run while the calling thread is inside the TUN's network namespace.
+fn assign_ip_to_tun(tun: &Tun, ip: &str, prefix_len: u8) {
     let output = Command::new("ip")
-        .args(format!("addr add {ip}/24 dev {}", &tun.name()).split(' '))
+        .args(format!("addr add {ip}/{prefix_len} dev {}", &tun.name()).split(' '))
         .output()
         .expect("failed to execute process");
     if !output.status.success() {
@@ -201,8 +295,22 @@ fn assign_ip_to_tun(tun: &tun_tap::Iface, ip: &str) {
     }
 }
 
+/// Run an `ip` command, logging failures
+fn run_ip(args: &str) {
+    let output = Command::new("ip")
+        .args(args.split(' '))
+        .output()
+        .expect("failed to execute process");
+    if !output.status.success() {
+        eprintln!(
+            "Error running `ip {args}`: {}",
+            String::from_utf8_lossy(&output.stderr)
+        );
+    }
+}
+
 /// Bring the TUN interface up
-fn bring_interface_up(tun: &tun_tap::Iface) {
+fn bring_interface_up(tun: &Tun) {
     let output = Command::new("ip")
         .args(format!("link set dev {} up", &tun.name()).split(' '))
         .output()
@@ -216,16 +324,9 @@ fn bring_interface_up(tun: &tun_tap::Iface) {
 }
 
 /// Setup the default route via the TUN interface
-fn setup_default_route(tun: &tun_tap::Iface, ip: &str) {
+fn setup_default_route(tun: &Tun, ip: &str, netns: &str) {
     let output = Command::new("ip")
-        .args(
-            format!(
-                "-n {} r add default via {ip} dev {}",
-                netns_for_ip(ip),
-                &tun.name()
-            )
-            .split(' '),
-        )
+        .args(format!("-n {netns} r replace default via {ip} dev {}", &tun.name()).split(' '))
         .output()
         .expect("failed to execute process");
 
@@ -238,17 +339,24 @@ fn setup_default_route(tun: &tun_tap::Iface, ip: &str) {
 }
 
 /// Setup the TUN interface with the given IP address
-fn setup_tun(tun: &tun_tap::Iface, ip: &str) {
-    assign_ip_to_tun(tun, ip);
+fn setup_tun(tun: &Tun, ip: &str, prefix_len: u8) {
+    assign_ip_to_tun(tun, ip, prefix_len);
     bring_interface_up(tun);
 }
 
 /// Setup internet access on the UE for the given subnet
-fn setup_internet_access(ip: &str, subnet: &str) {
+fn setup_internet_access(netns: &str, subnet: &str, netns_prefix: &str, transit: u8) {
     const SCRIPT: &str = include_str!("../scripts/setup_internet.sh");
 
     let mut child = Command::new("bash")
-        .args(["-s", "--", &netns_for_ip(ip), subnet])
+        .args([
+            "-s",
+            "--",
+            netns,
+            subnet,
+            netns_prefix,
+            &transit.to_string(),
+        ])
         .stdin(std::process::Stdio::piped())
         .stderr(std::process::Stdio::piped())
         .spawn()
@@ -271,15 +379,15 @@ fn setup_internet_access(ip: &str, subnet: &str) {
     }
 }
 
-fn netns_for_ip(ip: &str) -> String {
-    format!("cab-{}", ip)
+fn netns_for_ip(netns_prefix: &str, ip: &str) -> String {
+    format!("{netns_prefix}-{ip}")
 }
 
 impl Drop for UE {
     fn drop(&mut self) {
-        eprintln!("Dropping UE with IP {}", self.ip);
+        eprintln!("Dropping UE with IP {}", self.ip());
         // remove netns from ip netns list
-        detach_netns(&self.ip);
+        detach_netns(&self.netns);
         // kill pause process
         let _ = nix::sys::signal::kill(self.pause_pid, nix::sys::signal::Signal::SIGKILL);
         // wait for pause process to exit
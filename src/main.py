@@ -1,16 +1,22 @@
 import asyncio
 import logging
+import os
 from queue import Queue
 from fastapi import FastAPI, Query, WebSocket, Request
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, PlainTextResponse, Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi import WebSocketDisconnect
-from pydantic import BaseModel, confloat
+from pydantic import BaseModel, confloat, conint
 from pathlib import Path
 from typing import Literal
 import uvicorn
 from glu import Glu, extract_ips_from_frame
+from glu.glu import now_in_ms
+from glu.scheduler import DL, UL
+from glu.coverage import TILE_PX
+from glu import checkpoint
+from glu import cluster
 import layer1 as phy
 
 LOG_FORMAT = "%(levelname)s:\t[%(filename)s:%(lineno)d]:\t%(message)s"
@@ -25,7 +31,36 @@ logging.basicConfig(
 logger = logging.getLogger("myapp")
 logger.setLevel(logging.INFO)
 
-g = Glu()
+# e.g. GLU_SUBNET=10.0.0.0/16 for simulations beyond 253 UEs,
+# GLU_GATEWAY_QUEUES=4 to drain internet traffic with four gateway workers,
+# GLU_HISTORY_MAX_UES=1000 to cap link history memory (about 6.5 kB per UE),
+# GLU_TIMER_ACCURACY_US=50 to deliver packets within 50 µs of their emulated arrival,
+# GLU_CLUSTER=cluster.json GLU_NODE=west to simulate the region of node west of a cluster
+# (see glu.cluster.load_config); the subnet then comes from the cluster file,
+# GLU_NETNS_PREFIX=exp1 GLU_TRANSIT=1 to share the host with other servers (see instances.py),
+# GLU_THREADED=1 to forward with one thread per stage (Glu.run) instead of a single loop
+cluster_nodes = cluster.load_config(os.environ["GLU_CLUSTER"]) if os.environ.get("GLU_CLUSTER") else None
+g = Glu(
+    subnet=(
+        str(cluster_nodes[os.environ["GLU_NODE"]].subnet)
+        if cluster_nodes
+        else os.environ.get("GLU_SUBNET", "10.0.0.0/24")
+    ),
+    gateway_queues=int(os.environ.get("GLU_GATEWAY_QUEUES", "1")),
+    history_max_ues=int(os.environ.get("GLU_HISTORY_MAX_UES", "10000")),
+    timer_accuracy_us=float(os.environ.get("GLU_TIMER_ACCURACY_US", "100")),
+    netns_prefix=os.environ.get("GLU_NETNS_PREFIX", "cab"),
+    transit=int(os.environ.get("GLU_TRANSIT", "0")),
+)
+THREADED = os.environ.get("GLU_THREADED", "0") == "1"
+if cluster_nodes:
+    g.join_cluster(os.environ["GLU_NODE"], cluster_nodes)
+# GLU_CHECKPOINT=scenario.ckpt restores a scenario saved with /checkpoint/save
+if os.environ.get("GLU_CHECKPOINT"):
+    logger.info("Restored checkpoint: %s", checkpoint.restore(g, os.environ["GLU_CHECKPOINT"]))
+# GLU_STATE_EXPORT=/dev/shm/glu-state publishes the state there for glu_state.StateReader
+if os.environ.get("GLU_STATE_EXPORT"):
+    g.export_state(os.environ["GLU_STATE_EXPORT"])
 app = FastAPI()
 
 
@@ -65,6 +100,55 @@ class UserEquipmentUpdate(BaseModel):
     change_ip: bool
 
 
+class MobilityConfig(BaseModel):
+    model: Literal["static", "random_waypoint", "linear", "trace"]
+    ue_ids: list[int] | None = None  # None applies the model to every UE
+    min_speed: confloat(ge=0) = 1.0  # m/s
+    max_speed: confloat(ge=0) = 2.0  # m/s
+    pause_s: confloat(ge=0) = 0.0
+    heading_deg: float | None = None
+
+
+class MobilityTrace(BaseModel):
+    path: str
+
+
+class CheckpointPath(BaseModel):
+    path: str
+
+
+class ProfileConfig(BaseModel):
+    sample_every: conint(ge=1) = 100
+    trace_memory: bool = False
+
+
+class OverloadConfig(BaseModel):
+    # entering sample_log, tick_physics and shed
+    lag_thresholds_ms: list[confloat(gt=0)] = [10.0, 50.0, 200.0]
+    iteration_thresholds_ms: list[confloat(gt=0)] = [5.0, 20.0, 100.0]
+    cooldown_s: confloat(ge=0) = 2.0
+    tick_ms: confloat(gt=0) = 10.0
+
+
+class ExportConfig(BaseModel):
+    path: str = "/dev/shm/glu-state"
+    period_s: confloat(gt=0) = 0.1
+    link_period_s: confloat(gt=0) = 1.0
+    enabled: bool = True
+
+
+class SchedulerConfig(BaseModel):
+    # full: every UE has the whole band; rr: equal shares; pf: proportional fair
+    mode: Literal["full", "rr", "pf"] = "rr"
+
+
+class InterferenceConfig(BaseModel):
+    # interferers whose mean power is this far below the noise floor are left out
+    threshold_db: float = 20.0
+    cutoff_m: confloat(gt=0) | None = None
+    enabled: bool = True
+
+
 @app.on_event("shutdown")
 async def shutdown_event():
     logger.info("ArshiA Shutting down...")
@@ -99,12 +183,335 @@ async def control_delay():
     return {"delay": g.delaying_packets}
 
 
+# queue back-to-back frames of a flow as one burst sharing its link figures
+@app.post("/control/coalesce")
+async def control_coalesce():
+    g.toggle_coalescing()
+    return {"coalesce": g.coalescing}
+
+
+# forward frames natively inside layer3 instead of through the Python threads
+@app.post("/control/native")
+async def control_native():
+    g.toggle_native_dataplane()
+    return {"native": g.native_dataplane}
+
+
+@app.get("/control/native")
+async def get_native():
+    if not g.native_dataplane:
+        return {"native": False}
+    return {"native": True, "stats": g.cabernet.dataplane_stats()}
+
+
+@app.post("/control/mobility")
+async def control_mobility():
+    g.toggle_mobility()
+    return {"mobility": g.mobility.running}
+
+
+# Sample call:
+"""
+curl -X POST http://localhost:8000/mobility/model \
+-H "Content-Type: application/json" \
+-d '{"model": "random_waypoint", "min_speed": 1, "max_speed": 2}'
+"""
+
+
+@app.post("/mobility/model")
+async def mobility_model(payload: MobilityConfig):
+    ue_ids = payload.ue_ids if payload.ue_ids is not None else [ue.id for ue in g.ues]
+    try:
+        g.mobility.set_model(
+            ue_ids,
+            payload.model,
+            payload.min_speed,
+            payload.max_speed,
+            payload.pause_s,
+            payload.heading_deg,
+        )
+    except (KeyError, ValueError) as e:
+        return {"error": f"failed to set mobility model: {e}"}
+    return {"ok": True, "mobility": g.mobility.summary()}
+
+
+# trace file rows are "t,ue_id,x,y" in seconds and meters
+@app.post("/mobility/trace")
+async def mobility_trace(payload: MobilityTrace):
+    try:
+        ue_ids = g.mobility.load_trace(payload.path)
+    except (OSError, ValueError) as e:
+        return {"error": f"failed to load trace: {e}"}
+    return {"ok": True, "ue_ids": ue_ids}
+
+
+@app.get("/mobility")
+async def mobility_status():
+    return g.mobility.summary()
+
+
+# Sample call:
+"""
+curl -X POST http://localhost:8000/control/profile \
+-H "Content-Type: application/json" \
+-d '{"sample_every": 50, "trace_memory": true}'
+"""
+
+
+@app.post("/control/profile")
+async def control_profile(payload: ProfileConfig | None = None):
+    payload = payload or ProfileConfig()
+    g.toggle_profile(payload.sample_every, payload.trace_memory)
+    return {
+        "profile": g.profiler.enabled,
+        "sample_every": g.profiler.sample_every,
+        "trace_memory": g.profiler.trace_memory,
+    }
+
+
+@app.get("/control/profile")
+async def get_profile(memory_limit: int = Query(10, ge=1)):
+    return {
+        "profile": g.profiler.enabled,
+        "sample_every": g.profiler.sample_every,
+        "frames_per_second": g.profiler.throughput(),
+        "stages": g.profiler.stats(),
+        "memory_growth": g.profiler.memory_growth(memory_limit),
+    }
+
+
+# collapsed stacks, e.g. `curl .../control/profile/collapsed | flamegraph.pl > glu.svg`
+@app.get("/control/profile/collapsed", response_class=PlainTextResponse)
+async def get_profile_collapsed():
+    return g.profiler.collapsed()
+
+
+# this node's region, its peers and the traffic exchanged with them
+@app.get("/cluster")
+async def get_cluster():
+    if g.cluster is None:
+        return {"error": "not part of a cluster, start with GLU_CLUSTER and GLU_NODE"}
+    return g.cluster.stats()
+
+
+# delivery lateness (actual minus emulated arrival) of each direction
+@app.get("/control/timing")
+async def get_timing():
+    return {"upload": g.upload_timer.stats(), "download": g.download_timer.stats()}
+
+
+@app.post("/control/timing/reset")
+async def reset_timing():
+    g.upload_timer.reset()
+    g.download_timer.reset()
+    return {"ok": True}
+
+
+# degradation level and the lag behind it, with the delay queue sizes
+@app.get("/control/overload")
+async def get_overload():
+    return {
+        **g.overload.stats(),
+        "queued": {"upload": len(g.upload_queue), "download": len(g.download_queue)},
+    }
+
+
+# Sample call:
+"""
+curl -X POST http://localhost:8000/control/overload \
+-H "Content-Type: application/json" \
+-d '{"lag_thresholds_ms": [5, 20, 100], "iteration_thresholds_ms": [5, 20, 100]}'
+"""
+
+
+@app.post("/control/overload")
+async def configure_overload(payload: OverloadConfig):
+    try:
+        g.overload.configure(
+            payload.lag_thresholds_ms,
+            payload.iteration_thresholds_ms,
+            payload.cooldown_s,
+            payload.tick_ms,
+        )
+    except ValueError as e:
+        return {"error": str(e)}
+    return g.overload.stats()
+
+
+# pruning radius per carrier and the error bound of the lookups so far
+@app.get("/control/interference")
+async def get_interference():
+    return {"enabled": g.pruning_interference, **g.interference.stats()}
+
+
+# Sample call:
+"""
+curl -X POST http://localhost:8000/control/interference \
+-H "Content-Type: application/json" \
+-d '{"threshold_db": 10, "cutoff_m": 2000}'
+"""
+
+
+@app.post("/control/interference")
+async def configure_interference(payload: InterferenceConfig):
+    g.configure_interference(payload.threshold_db, payload.cutoff_m, payload.enabled)
+    return {"enabled": g.pruning_interference, **g.interference.stats()}
+
+
+# share of the band each cell gives its backlogged UEs
+@app.get("/control/scheduler")
+async def get_scheduler():
+    return g.scheduler.stats()
+
+
+# Sample call:
+"""
+curl -X POST http://localhost:8000/control/scheduler \
+-H "Content-Type: application/json" \
+-d '{"mode": "pf"}'
+"""
+
+
+@app.post("/control/scheduler")
+async def configure_scheduler(payload: SchedulerConfig):
+    g.scheduler.configure(payload.mode)
+    return g.scheduler.stats()
+
+
+@app.get("/control/export")
+async def get_export():
+    return g.export.stats() if g.export else {"enabled": False}
+
+
+# Sample call:
+"""
+curl -X POST http://localhost:8000/control/export \
+-H "Content-Type: application/json" \
+-d '{"path": "/dev/shm/glu-state", "period_s": 0.05}'
+"""
+
+
+@app.post("/control/export")
+async def configure_export(payload: ExportConfig):
+    if not payload.enabled:
+        g.stop_export()
+        return {"enabled": False}
+    try:
+        export = g.export_state(payload.path, payload.period_s, payload.link_period_s)
+    except OSError as e:
+        return {"error": str(e)}
+    return export.stats()
+
+
+@app.post("/control/flows")
+async def control_flows():
+    g.toggle_flows()
+    return {"flows": g.flows.enabled}
+
+
+# Sample call:
+"""
+curl "http://localhost:8000/flows?k=5&by=drops"
+"""
+
+
+@app.get("/flows")
+async def get_flows(
+    k: int = Query(10, ge=1, le=1000),
+    by: Literal["bytes", "packets", "drops"] = "bytes",
+):
+    return {**g.flows.summary(), "top": g.flows.top(k, by, now_in_ms())}
+
+
+# per-UE totals over all flows seen, including expired ones
+@app.get("/flows/userequipment")
+async def get_flows_per_ue():
+    return {"ues": g.flows.ue_totals()}
+
+
+@app.get("/flows/userequipment/{ue_id}")
+async def get_ue_flows(ue_id: int):
+    if g.get_ue(ue_id) is None:
+        return {"error": f"UserEquipment with id {ue_id} not found"}
+    return {"ue": ue_id, "flows": g.flows.ue_flows(ue_id, now_in_ms())}
+
+
+@app.get("/history")
+async def history_status():
+    return g.history.summary()
+
+
+# Sample call:
+"""
+curl "http://localhost:8000/history/userequipment/0?start=1760000000&resolution=10"
+"""
+
+
+# start and end are unix seconds; without a resolution the finest one covering start is used
+@app.get("/history/userequipment/{ue_id}")
+async def history_userequipment(
+    ue_id: int,
+    start: float | None = None,
+    end: float | None = None,
+    resolution: float | None = Query(None, gt=0),
+):
+    history = g.history.ues.query(ue_id, start, end, resolution)
+    if history is None:
+        return {"error": f"No history for UserEquipment with id {ue_id}"}
+    return {"id": ue_id, **history}
+
+
+@app.get("/history/basestation/{bs_id}")
+async def history_basestation(
+    bs_id: int,
+    start: float | None = None,
+    end: float | None = None,
+    resolution: float | None = Query(None, gt=0),
+):
+    history = g.history.towers.query(bs_id, start, end, resolution)
+    if history is None:
+        return {"error": f"No history for BaseStation with id {bs_id}"}
+    return {"id": bs_id, **history}
+
+
+# Sample call:
+"""
+curl -X POST http://localhost:8000/checkpoint/save \
+-H "Content-Type: application/json" \
+-d '{"path": "scenario.ckpt"}'
+"""
+
+
+@app.post("/checkpoint/save")
+async def checkpoint_save(payload: CheckpointPath):
+    try:
+        return checkpoint.save(g, payload.path)
+    except OSError as e:
+        return {"error": str(e)}
+
+
+# restores into a simulation without towers or UEs; the response has the startup timings
+@app.post("/checkpoint/restore")
+async def checkpoint_restore(payload: CheckpointPath):
+    try:
+        return checkpoint.restore(g, payload.path)
+    except (OSError, ValueError, KeyError) as e:
+        return {"error": str(e)}
+
+
 @app.post("/init/simulation")
 async def init_simulation():
-    # g.run(log_to_sdout=False)
-    g.run_single_threaded()
+    if THREADED:
+        g.run(log_to_sdout=False)
+    else:
+        g.run_single_threaded()
     g.toggle_pause()  # unpause
-    return {"ok": True, "message": "Simulation initialized", "paused": g.paused}
+    return {
+        "ok": True,
+        "message": "Simulation initialized",
+        "paused": g.paused,
+        "threaded": THREADED,
+    }
 
 
 @app.post("/configure")
@@ -114,8 +521,10 @@ async def configure(payload: SimulationConfig):
         tech = phy.LTE_20
     else:
         tech = phy.NR_100
-    for bs in g.base_stations:
-        bs.tower.t = tech
+    g.set_tech(tech)
+    g.set_map_size(
+        payload.width / g.pixels_per_meter, payload.height / g.pixels_per_meter
+    )
 
     return {
         "ok": True,
@@ -135,6 +544,8 @@ curl -X POST http://localhost:8000/init/basestation \
 async def init_basestation(payload: BaseStationInit):
     x = payload.x / g.pixels_per_meter
     y = payload.y / g.pixels_per_meter
+    if g.cluster and not g.cluster.owns(x, y):
+        return {"error": f"({x}, {y}) is outside the region of node {g.cluster.name}"}
     bs = g.add_tower(x=x, y=y, on=True)
     g.syncronize_map()
 
@@ -161,6 +572,8 @@ curl -X POST http://localhost:8000/init/userequipment \
 async def init_userequipment(payload: UserEquipmentInit):
     x = payload.x / g.pixels_per_meter
     y = payload.y / g.pixels_per_meter
+    if g.cluster and not g.cluster.owns(x, y):
+        return {"error": f"({x}, {y}) is outside the region of node {g.cluster.name}"}
 
     ue = g.add_ue(x=x, y=y)
     g.syncronize_map()
@@ -216,6 +629,21 @@ async def get_userequipment(ue_id: int):
     }
 
 
+# packet activity of every UE, polled by the canvas in one request per tick
+@app.get("/check/userequipment")
+async def check_every_userequipment():
+    return {
+        "ues": [
+            {
+                "id": ue.id,
+                "up_packets": ue.last_upload_epoch,
+                "down_packets": ue.last_download_epoch,
+            }
+            for ue in g.ues
+        ]
+    }
+
+
 @app.get("/check/userequipment/{ue_id}")
 async def check_userequipment(ue_id: int):
     ue = g.get_ue(ue_id)
@@ -236,12 +664,24 @@ async def check_link(ue_id: int):
     # function should not call if UE is not connected to a base station
     bs = ue.connected_to
 
-    up_latency = bs.tower.upload_latency(l1ue, nbytes, g.active_ues())
-    dn_latency = bs.tower.download_latency(l1ue, nbytes, g.active_towers())
-    up_bandwidth = bs.tower.upload_bandwidth_mbps(l1ue, g.active_ues())
-    dn_bandwidth = bs.tower.download_bandwidth_mbps(l1ue, g.active_towers())
-    up_packeterr = bs.tower.upload_packet_error_rate(l1ue, nbytes, g.active_ues())
-    dn_packeterr = bs.tower.download_packet_error_rate(l1ue, nbytes, g.active_towers())
+    # the band is shared with the other UEs of the cell: the transmission takes
+    # 1/share as long and gets share of the full-band rate
+    now = now_in_ms()
+    up_share = g.scheduler.expected_share(UL, bs, ue, now)
+    dn_share = g.scheduler.expected_share(DL, bs, ue, now)
+    prop_ms = phy.ue_tower_dist(l1ue, bs.tower) / 3e8 * 1e3
+    # the co-channel interferers the data path uses for this link
+    topology = g.topology
+    ues = g.uplink_interferers(topology, bs)
+    towers = g.downlink_interferers(topology, bs, ue)
+    up_latency = bs.tower.upload_latency(l1ue, nbytes, ues)
+    up_latency = prop_ms + (up_latency - prop_ms) / up_share
+    dn_latency = bs.tower.download_latency(l1ue, nbytes, towers)
+    dn_latency = prop_ms + (dn_latency - prop_ms) / dn_share
+    up_bandwidth = bs.tower.upload_bandwidth_mbps(l1ue, ues) * up_share
+    dn_bandwidth = bs.tower.download_bandwidth_mbps(l1ue, towers) * dn_share
+    up_packeterr = bs.tower.upload_packet_error_rate(l1ue, nbytes, ues)
+    dn_packeterr = bs.tower.download_packet_error_rate(l1ue, nbytes, towers)
 
     return {
         "upload_latency": up_latency,
@@ -250,6 +690,13 @@ async def check_link(ue_id: int):
         "download_bandwidth": dn_bandwidth,
         "upload_per": up_packeterr,
         "download_per": dn_packeterr,
+        "upload_modulation": bs.tower.upload_modulation(l1ue, ues),
+        "download_modulation": bs.tower.download_modulation(l1ue, towers),
+        "upload_share": up_share,
+        "download_share": dn_share,
+        # ms of queued transmissions still ahead of a new frame on each link direction
+        "upload_backlog_ms": g.scheduler.backlog_ms(UL, bs, ue, now),
+        "download_backlog_ms": g.scheduler.backlog_ms(DL, bs, ue, now),
     }
 
 
@@ -267,16 +714,7 @@ async def update_basestation(bs_id: int, payload: BaseStationUpdate):
     y = payload.y / g.pixels_per_meter
     on = payload.on
 
-    updated_bs = None
-
-    for bs in g.base_stations:
-        if bs.id == bs_id:
-            bs.tower.x = x
-            bs.tower.y = y
-            bs.tower.on = on
-            g.syncronize_map()
-            updated_bs = bs
-            break
+    updated_bs = g.update_tower(bs_id, x, y, on)
 
     if not updated_bs:
         return {"error": f"BaseStation with id {bs_id} not found"}
@@ -292,6 +730,33 @@ async def update_basestation(bs_id: int, payload: BaseStationUpdate):
     }
 
 
+# Sample call:
+"""
+curl -o tile.png "http://localhost:8000/coverage/0/0/0?metric=sinr&format=png"
+"""
+
+
+@app.get("/coverage/{z}/{tx}/{ty}")
+async def coverage_tile(
+    z: int,
+    tx: int,
+    ty: int,
+    metric: Literal["sinr", "rate"] = "sinr",
+    format: Literal["png", "raw"] = "png",
+):
+    try:
+        tile = await asyncio.to_thread(g.coverage_tile, z, tx, ty, metric, format)
+    except ValueError as e:
+        return {"error": str(e)}
+    if format == "png":
+        return Response(content=tile, media_type="image/png")
+    return Response(
+        content=tile,
+        media_type="application/octet-stream",
+        headers={"X-Tile-Encoding": "float16-le", "X-Tile-Size": str(TILE_PX)},
+    )
+
+
 # Sample call:
 """
 curl -X POST http://localhost:8000/update/userequipment/0 \
@@ -306,17 +771,9 @@ async def update_userequipment(ue_id: int, payload: UserEquipmentUpdate):
     y = payload.y / g.pixels_per_meter
     change_ip = payload.change_ip
 
-    updated_ue = None
-
-    for ue in g.ues:
-        if ue.id == ue_id:
-            ue.l1ue.x = x
-            ue.l1ue.y = y
-            if change_ip:
-                g.update_ue_ip(ue.id)
-            g.syncronize_map()
-            updated_ue = ue
-            break
+    updated_ue = g.move_ue(ue_id, x, y)
+    if updated_ue and change_ip:
+        g.update_ue_ip(ue_id)
 
     if not updated_ue:
         return {"error": f"UserEquipment with id {ue_id} not found"}
@@ -337,6 +794,20 @@ async def update_userequipment(ue_id: int, payload: UserEquipmentUpdate):
     }
 
 
+# Sample call:
+"""
+curl -X POST http://localhost:8000/delete/userequipment/0
+"""
+
+
+@app.post("/delete/userequipment/{ue_id}")
+async def delete_userequipment(ue_id: int):
+    removed_ue = g.remove_ue(ue_id)
+    if not removed_ue:
+        return {"error": f"UserEquipment with id {ue_id} not found"}
+    return {"message": f"UserEquipment {ue_id} deleted successfully", "ip": removed_ue.ip}
+
+
 @app.websocket("/packet_transfer")
 async def transfer_endpoint(websocket: WebSocket):
     await websocket.accept()
@@ -378,4 +849,4 @@ async def log_packets(websocket: WebSocket):
 
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    uvicorn.run(app, host="0.0.0.0", port=int(os.environ.get("GLU_PORT", "8000")))
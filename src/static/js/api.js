@@ -66,20 +66,25 @@ async function checkUEActivePackets(id){
     return res.json();
 }
 
+//packet activity of every UE in one request
+async function checkEveryUEActivePackets(){
+    const res = await fetch('/check/userequipment', {});
+    return res.json();
+}
+
 async function getUEBaseStationStatus(id){
     const res = await fetch(`/check/link/${id}`, {});
     return res.json();
 }
 
 function simulationStatus(){
-    UEList.forEach(function(ue, index){
-        checkUEActivePackets(ue.id).then(result => {
-            //console.log(result);
-            UEList[result.id].up_packets = result.up_packets;
-            UEList[result.id].down_packets = result.down_packets;
-        }).then(result => {
-            updateCanvas();
+    checkEveryUEActivePackets().then(result => {
+        result.ues.forEach(function(ue){
+            if(!UEList[ue.id]){return;}
+            UEList[ue.id].up_packets = ue.up_packets;
+            UEList[ue.id].down_packets = ue.down_packets;
         });
+        updateCanvas();
     });
     
     //exit early if no icon is selected
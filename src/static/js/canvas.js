@@ -35,7 +35,7 @@ function drawCircle(ctx, x, y, r){
     return [x, y];
 }
 
-//global variable for animating dashed line offset of UE links
+//dashed line offset of UE links, advanced with time while links carry traffic
 let linkOffset = 0;
 let dash = 5;
 
@@ -75,55 +75,187 @@ function drawDoubleLines(ctx, startX, startY, endX, endY, up_packets_time, down_
     ctx.stroke();
 }
 
-//function for animating dashed line offset of UE links
-function march() {
-  linkOffset++;
-  if (linkOffset > dash+1) {linkOffset = 0;}
-  updateCanvas();
-  setTimeout(march, 20);
-}
-//initiate animation
+//initial paint once the icons are in place
 window.onload = function(){
-    march();
+    updateCanvas();
 }
 
-function updateCanvas(){
-    const { canvas, xOffset, yOffset } = getCanvasDetails();
-    const ctx = canvas.getContext("2d");
-    ctx.clearRect(0, 0, canvas.width, canvas.height);
+//coverage heatmap tiles drawn underneath everything else, refreshed when base stations change
+const coverageTilePx = 128;
+let coverageTiles = [];
+//bumped whenever the tiles change so the cached static layer is redrawn
+let coverageVersion = 0;
 
-    //select only base stations
-    baseStationsOnCanvas = $('.font-awesome-icon.fa-tower-cell').filter(function(){
-        return $(this).css('position') === 'absolute';
-    });
-    //select only active end users
-    endUsersOnCanvas = $('.font-awesome-icon.fa-mobile.active').filter(function(){
-        return $(this).css('position') === 'absolute';
+function refreshCoverage(){
+    const setting = document.getElementById('show-coverage');
+    if(!setting.checked){
+        coverageTiles = [];
+        coverageVersion++;
+        updateCanvas();
+        return;
+    }
+    const { canvas } = getCanvasDetails();
+    //pick the zoom level whose tiles roughly match canvas pixels
+    const zoom = Math.min(4, Math.max(0, Math.ceil(Math.log2(Math.max(canvas.width, canvas.height) / coverageTilePx))));
+    const n = 2 ** zoom;
+    const version = Date.now(); //bypass the browser cache, the server keeps its own
+    const tiles = [];
+    for(let ty = 0; ty < n; ty++){
+        for(let tx = 0; tx < n; tx++){
+            const image = new Image();
+            image.onload = function(){ coverageVersion++; updateCanvas(); };
+            image.src = `/coverage/${zoom}/${tx}/${ty}?metric=sinr&format=png&v=${version}`;
+            tiles.push({ image, tx, ty, n });
+        }
+    }
+    coverageTiles = tiles;
+    coverageVersion++;
+}
+
+function drawCoverage(ctx, canvas){
+    coverageTiles.forEach(function(tile){
+        if(!tile.image.complete || tile.image.naturalWidth === 0){return;}
+        const w = canvas.width / tile.n;
+        const h = canvas.height / tile.n;
+        ctx.drawImage(tile.image, tile.tx * w, tile.ty * h, w, h);
     });
+}
 
-    //draw ranges for all base stations
-    baseStationsOnCanvas.each(function(index, element){
-        if(element.classList.contains('off')){return true;} //skip base station if it has been toggled off
+//rendering is coalesced: updateCanvas only schedules a single requestAnimationFrame pass,
+//however many times it is called before the next frame
+let renderPending = false;
 
-        const { x, y } = getElementCoordinates(element);
-        drawCircle(ctx, x, y, 160);
-    });
+function updateCanvas(){
+    if(renderPending){return;}
+    renderPending = true;
+    requestAnimationFrame(renderCanvas);
+}
+
+//coverage and base station ranges change rarely and are cached on an offscreen canvas
+const staticLayer = document.createElement('canvas');
+let staticKey = "";
+//links without traffic do not animate and are cached too, redrawn only when one of them changes
+const idleLinkLayer = document.createElement('canvas');
+let drawnLinks = new Map();
+
+//icon centres, recomputed only when an icon is moved (reading inline styles does not force a layout)
+let iconCoordinates = new Map();
+
+function forgetIconCoordinates(){
+    iconCoordinates = new Map();
+    staticKey = "";
+    drawnLinks = new Map();
+}
+
+//a resized window can move the canvas relative to the icons
+window.addEventListener('resize', function(){
+    forgetIconCoordinates();
+    updateCanvas();
+});
+
+function getCachedCoordinates(element){
+    const key = element.style.left + "," + element.style.top;
+    let cached = iconCoordinates.get(element.id);
+    if(!cached || cached.key !== key){
+        cached = { key, ...getElementCoordinates(element) };
+        iconCoordinates.set(element.id, cached);
+    }
+    return cached;
+}
 
-    //draw lines connectiong end users connecting to every associated base station
-    endUsersOnCanvas.each(function(i, element){
-        const user = getElementCoordinates(element);
+//icons placed on the canvas, i.e. not in the tray
+function placedIcons(selector){
+    return Array.from(document.querySelectorAll('.font-awesome-icon' + selector))
+        .filter(element => element.style.position === 'absolute');
+}
+
+function drawStaticLayer(canvas, baseStations){
+    const ranges = baseStations
+        .filter(element => !element.classList.contains('off')) //skip base stations toggled off
+        .map(element => getCachedCoordinates(element));
+    const key = [canvas.width, canvas.height, coverageVersion]
+        .concat(ranges.map(({ x, y }) => x + ":" + y)).join(",");
+    if(key === staticKey){return;}
+    staticKey = key;
+
+    staticLayer.width = canvas.width;
+    staticLayer.height = canvas.height;
+    const ctx = staticLayer.getContext("2d");
+    drawCoverage(ctx, canvas);
+    //draw ranges for all base stations
+    ranges.forEach(({ x, y }) => drawCircle(ctx, x, y, 160));
+}
+
+//current link of every connected end user
+function collectLinks(endUsers){
+    const timeThreshold = 1500;
+    const now = Date.now();
+    const links = new Map();
+    endUsers.forEach(function(element){
         const userId = extractIDNumber(element.id).id;
         const stationId = UEList[userId].bs;
-        if(stationId < 0){return true;}//no connection is no valid base station id
-        const station = getElementCoordinates(document.getElementById("BaseStation_" + stationId));
-        //console.log("UserEquipment_" + userId, "BaseStation_" + stationId);
-        
-        const timeThreshold = 1500;
-        const lastActiveUpPacketDifference = Date.now() - UEList[userId].up_packets;
-        const lastActiveDownPacketDifference = Date.now() - UEList[userId].down_packets;
-        drawDoubleLines(ctx, user.x, user.y, station.x, station.y, 
-            (lastActiveUpPacketDifference < timeThreshold), 
-            (lastActiveDownPacketDifference < timeThreshold));
+        if(stationId < 0){return;} //no connection is no valid base station id
+        const stationElement = document.getElementById("BaseStation_" + stationId);
+        if(!stationElement){return;}
+        const user = getCachedCoordinates(element);
+        const station = getCachedCoordinates(stationElement);
+        links.set(userId, {
+            x: user.x, y: user.y, sx: station.x, sy: station.y,
+            up: (now - UEList[userId].up_packets) < timeThreshold,
+            down: (now - UEList[userId].down_packets) < timeThreshold,
+        });
+    });
+    return links;
+}
+
+function sameLink(a, b){
+    return a && b && a.x === b.x && a.y === b.y && a.sx === b.sx && a.sy === b.sy
+        && a.up === b.up && a.down === b.down;
+}
+
+function drawIdleLinks(canvas, links){
+    let dirty = links.size !== drawnLinks.size
+        || idleLinkLayer.width !== canvas.width || idleLinkLayer.height !== canvas.height;
+    if(!dirty){
+        for(const [id, link] of links){
+            if(!sameLink(link, drawnLinks.get(id))){ dirty = true; break; }
+        }
+    }
+    if(!dirty){return;}
+    drawnLinks = links;
+
+    idleLinkLayer.width = canvas.width;
+    idleLinkLayer.height = canvas.height;
+    const ctx = idleLinkLayer.getContext("2d");
+    linkOffset = 0;
+    links.forEach(function(link){
+        if(link.up || link.down){return;}
+        drawDoubleLines(ctx, link.x, link.y, link.sx, link.sy, false, false);
     });
 }
 
+function renderCanvas(timestamp){
+    renderPending = false;
+    const { canvas } = getCanvasDetails();
+    const ctx = canvas.getContext("2d");
+
+    drawStaticLayer(canvas, placedIcons('.fa-tower-cell'));
+    //select only active end users
+    const links = collectLinks(placedIcons('.fa-mobile.active'));
+    drawIdleLinks(canvas, links);
+
+    ctx.clearRect(0, 0, canvas.width, canvas.height);
+    ctx.drawImage(staticLayer, 0, 0);
+    ctx.drawImage(idleLinkLayer, 0, 0);
+
+    //draw lines carrying traffic on top, marching one step every 20 ms
+    linkOffset = Math.floor(timestamp / 20) % (dash + 2);
+    let animating = false;
+    links.forEach(function(link){
+        if(!link.up && !link.down){return;}
+        drawDoubleLines(ctx, link.x, link.y, link.sx, link.sy, link.up, link.down);
+        animating = true;
+    });
+    //keep animating, and notice links going idle, while any link carries traffic
+    if(animating){updateCanvas();}
+}
@@ -44,6 +44,7 @@ function releaseDrag(event){
                     BSList[result.base_station.id] = result.base_station;
                     logMessage(result.message);
                 }).then(result => {
+                    refreshCoverage();
                     updateEveryUserEquipment().then(result => {
                         updateCanvas();
                         updateDeviceDetails();
@@ -80,6 +81,7 @@ function releaseDrag(event){
                         lastIcon.classList.add('active'); 
                         logMessage(result.message);
                     }).then(result => {
+                        refreshCoverage();
                         updateEveryUserEquipment().then(result => {
                             updateCanvas();
                             updateDeviceDetails();
@@ -148,6 +150,7 @@ function toggleBaseStation(id){
         console.log(result);
         BSList[result.base_station.id] = result.base_station;
         writeBaseStationDetails(result.base_station);
+        refreshCoverage();
         updateEveryUserEquipment().then(result => {updateCanvas();});
     });
     return onStatus;
@@ -170,6 +170,7 @@ document.getElementById("configuration").addEventListener("submit", async functi
     }
 
     resizeCanvas(height, width);
+    refreshCoverage();
 });
 
 // Resize canvas based on configuration form
@@ -181,6 +182,7 @@ function resizeCanvas(height, width) {
     canvas.style.width = width + "px";
     canvas.style.height = height + "px";
 
+    forgetIconCoordinates();
     updateCanvas();
 }
 
@@ -0,0 +1,133 @@
+"""
+Offline parameter sweep over layer1 only, no TUNs or namespaces.
+The grid is a JSON object mapping each parameter to a list of values, e.g.
+
+    {"towers": [4, 9, 16], "pathloss_n": [3.5, 4.0, 5.0],
+     "tech": ["LTE_20", "NR_100"], "ues": [100, 1000], "seed": [1, 2, 3]}
+
+Every combination is one scenario, evaluated in a process pool and
+appended to the CSV as soon as it finishes. Rerunning with the same output
+skips scenarios already in it, so an interrupted sweep resumes.
+
+    python sweep.py grid.json -o sweep.csv -j 8
+"""
+
+import argparse
+import csv
+import itertools
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+import numpy as np
+
+import layer1 as phy
+from layer1.capacity import evaluate_layout, grid_towers
+
+TECHS = {"LTE_20": phy.LTE_20, "NR_100": phy.NR_100}
+
+# parameter -> default when the grid leaves it out
+DEFAULTS = {
+    "towers": 9,
+    "pathloss_n": phy.core.PATHLOSS_N,
+    "tech": "LTE_20",
+    "ues": 100,
+    "seed": 1,
+    "width_m": 1000.0,
+    "height_m": 1000.0,
+    "min_sinr_db": -6.0,
+}
+PARAMS = list(DEFAULTS)
+
+
+def scenario_key(params: dict) -> str:
+    return ";".join(f"{name}={params[name]}" for name in PARAMS)
+
+
+def expand_grid(grid: dict) -> list[dict]:
+    unknown = set(grid) - set(DEFAULTS)
+    if unknown:
+        raise ValueError(f"unknown sweep parameters: {', '.join(sorted(unknown))}")
+    # a single value is a one-point axis
+    axes = [
+        list(grid[name]) if isinstance(grid.get(name), list) else [grid.get(name, DEFAULTS[name])]
+        for name in PARAMS
+    ]
+    scenarios = [dict(zip(PARAMS, values)) for values in itertools.product(*axes)]
+    for params in scenarios:
+        if params["tech"] not in TECHS:
+            raise ValueError(f"unknown tech {params['tech']}, expected one of {', '.join(TECHS)}")
+    return scenarios
+
+
+def run_scenario(params: dict) -> dict:
+    rng = np.random.default_rng(params["seed"])
+    w, h = params["width_m"], params["height_m"]
+    # the same seed draws the same first UEs whatever the count, so scenarios compare like for like
+    ue_xy = rng.uniform((0.0, 0.0), (w, h), size=(params["ues"], 2))
+    tower_xy = grid_towers(params["towers"], w, h)
+    metrics = evaluate_layout(
+        ue_xy, tower_xy, TECHS[params["tech"]], params["pathloss_n"], params["min_sinr_db"]
+    )
+    return {"scenario": scenario_key(params), **params, **metrics}
+
+
+# keys of scenarios already in out; drops a partial last row left by an interrupted run
+def completed(out: str) -> tuple[set[str], list[str] | None]:
+    if not os.path.exists(out):
+        return set(), None
+    with open(out, "r+", newline="") as f:
+        data = f.read()
+        if data and not data.endswith("\n"):
+            f.truncate(data.rfind("\n") + 1)
+    with open(out, newline="") as f:
+        reader = csv.DictReader(f)
+        return {row["scenario"] for row in reader}, reader.fieldnames
+
+
+def sweep(grid: dict, out: str, processes: int | None = None, log=sys.stderr) -> int:
+    """Evaluate every scenario of grid not yet in out; returns how many were run."""
+    scenarios = expand_grid(grid)
+    done, fieldnames = completed(out)
+    pending = [params for params in scenarios if scenario_key(params) not in done]
+    print(f"{len(scenarios)} scenarios, {len(scenarios) - len(pending)} already done", file=log)
+    if not pending:
+        return 0
+
+    processes = processes or os.cpu_count() or 1
+    # large enough chunks to amortize the IPC, small enough to keep every worker busy to the end
+    chunksize = max(1, min(64, len(pending) // (processes * 8)))
+    start = last_report = time.monotonic()
+    with open(out, "a", newline="") as f, multiprocessing.Pool(processes) as pool:
+        writer = None
+        for n, row in enumerate(pool.imap_unordered(run_scenario, pending, chunksize), 1):
+            if writer is None:
+                writer = csv.DictWriter(f, fieldnames or list(row))
+                if fieldnames is None:
+                    writer.writeheader()
+            writer.writerow(row)
+            now = time.monotonic()
+            if now - last_report >= 5.0 or n == len(pending):
+                f.flush()
+                last_report = now
+                print(f"{n}/{len(pending)} scenarios, {n / (now - start):.0f}/s", file=log)
+    return len(pending)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep layer1 capacity over a grid of layouts")
+    parser.add_argument("grid", help="JSON file mapping parameters to lists of values")
+    parser.add_argument("-o", "--out", default="sweep.csv", help="CSV to append results to")
+    parser.add_argument(
+        "-j", "--processes", type=int, default=None, help="worker processes (default: all cores)"
+    )
+    args = parser.parse_args()
+    with open(args.grid) as f:
+        grid = json.load(f)
+    sweep(grid, args.out, args.processes)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+import sys
+import types
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+
+class StubCabernet:
+    """Stands in for the layer3 extension: records UEs and frames, no namespaces."""
+
+    def __init__(self, gateway: str = "", subnet: str = "", *args):
+        self.gateway = gateway
+        self.subnet = subnet
+        self.ips: list[str] = []
+        self.sent: list[bytes] = []
+        self.links: list = []
+        self.poll_timeouts: list[int] = []
+        self.dataplane = False
+        self.fail_after: int | None = None  # create_ues raises after this many UEs
+
+    @staticmethod
+    def with_internet(gateway: str, subnet: str, *args) -> "StubCabernet":
+        return StubCabernet(gateway, subnet)
+
+    def create_ue(self, ip: str) -> None:
+        self.ips.append(ip)
+
+    # like layer3, UEs created before a failure are kept
+    def create_ues(self, ips: list[str]) -> None:
+        for n, ip in enumerate(ips):
+            if self.fail_after is not None and n >= self.fail_after:
+                raise ValueError(f"could not provision the UE of ip [{ip}]")
+            self.ips.append(ip)
+
+    def delete_ue(self, ip: str) -> None:
+        if ip not in self.ips:
+            raise ValueError(f"requested ip [{ip}] is not assigned to any UE in the network")
+        self.ips.remove(ip)
+
+    def change_ip(self, old_ip: str, new_ip: str) -> None:
+        self.ips[self.ips.index(old_ip)] = new_ip
+
+    def send_frame(self, frame: bytes) -> int:
+        self.sent.append(frame)
+        return len(frame)
+
+    def poll_frame_timeout(self, timeout_ms: int, include_gateway: bool = True):
+        self.poll_timeouts.append(timeout_ms)
+        return None
+
+    def poll_frame(self, include_gateway: bool = True):
+        return None
+
+    def start_dataplane(self, seed: int) -> None:
+        self.dataplane = True
+
+    def stop_dataplane(self) -> None:
+        self.dataplane = False
+
+    def set_dataplane_flags(self, paused: bool, dropping: bool, delaying: bool) -> None:
+        pass
+
+    def set_links(self, links: list) -> int:
+        self.links = links
+        return len(links)
+
+    def dataplane_stats(self) -> dict:
+        return {"received": 0, "sent_to_ues": 0, "sent_to_internet": 0}
+
+
+# always the stub, even where the extension is built: tests must not create namespaces
+layer3 = types.ModuleType("layer3")
+layer3.Cabernet = StubCabernet
+sys.modules["layer3"] = layer3
@@ -0,0 +1,27 @@
+"""Frames built by hand for the forwarding tests."""
+
+import socket
+import struct
+
+
+def udp_frame(src: str, dst: str, payload: bytes = b"x" * 64, sport: int = 5000) -> bytes:
+    # version 4, 20-byte header, TTL 64, protocol UDP
+    header = struct.pack("!BBHHHBBH", 0x45, 0, 28 + len(payload), 0, 0, 64, 17, 0)
+    udp = struct.pack("!HHHH", sport, 5001, 8 + len(payload), 0)
+    return header + socket.inet_aton(src) + socket.inet_aton(dst) + udp + payload
+
+
+def tcp_frame(
+    src: str,
+    dst: str,
+    sport: int,
+    dport: int,
+    seq: int,
+    ack: int,
+    flags: int,
+    payload: bytes = b"",
+) -> bytes:
+    # 20-byte IPv4 and TCP headers, protocol TCP
+    header = struct.pack("!BBHHHBBH", 0x45, 0, 40 + len(payload), 0, 0, 64, 6, 0)
+    tcp = struct.pack("!HHIIBBHHH", sport, dport, seq, ack, 5 << 4, flags, 65535, 0, 0)
+    return header + socket.inet_aton(src) + socket.inet_aton(dst) + tcp + payload
@@ -0,0 +1,55 @@
+import pytest
+
+import layer1 as phy
+from glu import Glu, checkpoint
+
+
+@pytest.fixture
+def saved(tmp_path):
+    g = Glu(seed=7)
+    g.set_map_size(300.0, 200.0)
+    g.add_tower(50.0, 100.0)
+    g.add_tower(250.0, 100.0, on=False)
+    g.set_tech(phy.NR_100)
+    for x in (40.0, 60.0, 240.0):
+        g.add_ue(x, 100.0)
+    g.update_ue_ip(1)
+    g.mobility.set_model([0, 2], "random_waypoint", 2.0, 3.0, 1.5)
+    g.dropping_packets = False
+    path = tmp_path / "scenario.ckpt"
+    checkpoint.save(g, str(path))
+    return g, str(path)
+
+
+def test_restore_rebuilds_the_saved_scenario(saved):
+    g, path = saved
+    r = Glu(seed=7)
+    result = checkpoint.restore(r, path)
+    assert (result["towers"], result["ues"], result["associated"]) == (2, 3, 3)
+    assert [(bs.id, bs.tower.x, bs.tower.on, bs.tower.t) for bs in r.base_stations] == [
+        (bs.id, bs.tower.x, bs.tower.on, bs.tower.t) for bs in g.base_stations
+    ]
+    assert [(ue.id, ue.ip, ue.l1ue.x, ue.l1ue.y) for ue in r.ues] == [
+        (ue.id, ue.ip, ue.l1ue.x, ue.l1ue.y) for ue in g.ues
+    ]
+    assert (r.map_width_m, r.map_height_m, r.dropping_packets) == (300.0, 200.0, False)
+    assert r.mobility.summary()["models"]["random_waypoint"] == 2
+    rows = [r.mobility.index[0], r.mobility.index[2]]
+    assert r.mobility.pause_s[rows].tolist() == [1.5, 1.5]
+    # restored addresses are taken, new UEs and towers get fresh ones
+    assert r.add_ue(100.0, 100.0).ip not in {ue.ip for ue in g.ues}
+    assert r.add_tower(150.0, 50.0).id == 2
+
+
+def test_failed_restore_rolls_back(saved):
+    _, path = saved
+    r = Glu(seed=7)
+    r.cabernet.fail_after = 2
+    with pytest.raises(ValueError):
+        checkpoint.restore(r, path)
+    assert not r.ues and not r.base_stations
+    assert r.cabernet.ips == []
+    assert r.ip_pool.allocated == 0
+    # nothing is left behind to block a second attempt
+    r.cabernet.fail_after = None
+    assert checkpoint.restore(r, path)["ues"] == 3
@@ -0,0 +1,32 @@
+import layer1 as phy
+from glu.cluster import ClusterNode, NodeSpec, summarize
+
+NODES = {
+    "west": NodeSpec("west", "127.0.0.1:7400", "10.0.0.0/24", [0, 0, 100, 100]),
+    "east": NodeSpec("east", "127.0.0.1:7401", "10.0.1.0/24", [100, 0, 200, 100]),
+}
+
+
+def test_summary_bins_keep_the_tech_apart():
+    lte, nr = phy.LTE_20.name, phy.NR_100.name
+    points = [(10.0, 10.0, lte), (12.0, 10.0, lte), (11.0, 10.0, nr)]
+    bins = sorted(summarize(points, 25.0), key=lambda b: b[3])
+    assert bins == [[11.0, 10.0, 2, lte], [11.0, 10.0, 1, nr]]
+
+
+def test_phantoms_transmit_on_the_summarized_carrier():
+    node = ClusterNode("west", NODES, lambda frames: None, lambda: {"towers": [], "ues": []})
+    node._apply_summary(
+        {
+            "node": "east",
+            "towers": [[150.0, 50.0, 1, phy.NR_100.name]],
+            "ues": [[140.0, 50.0, 3, phy.NR_100.name], [160.0, 50.0, 1, phy.LTE_20.name]],
+        }
+    )
+    assert [tower.t for tower in node.remote_towers] == [phy.NR_100]
+    assert len(node.remote_ues[phy.NR_100.carrier_freq]) == 3
+    assert len(node.remote_ues[phy.LTE_20.carrier_freq]) == 1
+    # a remote NR tower interferes with an NR downlink and not with an LTE one
+    ue = phy.UE(90.0, 50.0)
+    assert phy.Tower(80.0, 50.0, True, phy.NR_100).interferer_distances(ue, node.remote_towers)
+    assert not phy.Tower(80.0, 50.0, True, phy.LTE_20).interferer_distances(ue, node.remote_towers)
@@ -0,0 +1,47 @@
+import layer1 as phy
+from glu import Glu
+from glu.coverage import CoverageTiles
+
+
+def test_tile_is_cached():
+    tiles = CoverageTiles(200.0, 200.0)
+    towers = [phy.Tower(100.0, 100.0, True, phy.LTE_20)]
+    tile = tiles.get_tile(0, 0, 0, lambda: towers, "sinr", "raw")
+    assert tiles.get_tile(0, 0, 0, lambda: [], "sinr", "raw") is tile
+
+
+def test_tile_rendered_across_an_invalidation_is_not_cached():
+    tiles = CoverageTiles(200.0, 200.0)
+    old = [phy.Tower(100.0, 100.0, True, phy.LTE_20)]
+    new = [phy.Tower(20.0, 20.0, True, phy.LTE_20)]
+
+    # the tower moves right after the render has read the old positions
+    def old_then_move():
+        tiles.invalidate_around(20.0, 20.0, phy.LTE_20)
+        return old
+
+    stale = tiles.get_tile(0, 0, 0, old_then_move, "sinr", "raw")
+    fresh = tiles.get_tile(0, 0, 0, lambda: new, "sinr", "raw")
+    assert fresh != stale
+    assert tiles.get_tile(0, 0, 0, lambda: new, "sinr", "raw") is fresh
+
+
+def test_tower_moved_during_a_render_is_in_the_next_tile():
+    g = Glu()
+    bs = g.add_tower(100.0, 100.0)
+    render = g.coverage.render
+
+    def render_while_moving(*args):
+        values = render(*args)
+        g.update_tower(bs.id, 20.0, 20.0, True)
+        return values
+
+    g.coverage.render = render_while_moving
+    stale = g.coverage_tile(0, 0, 0, "sinr", "raw")
+    g.coverage.render = render
+    moved = g.coverage_tile(0, 0, 0, "sinr", "raw")
+    assert moved != stale
+    assert moved == CoverageTiles(g.map_width_m, g.map_height_m).get_tile(
+        0, 0, 0, lambda: [bs.tower], "sinr", "raw"
+    )
+    assert g.coverage_tile(0, 0, 0, "sinr", "raw") is moved
@@ -0,0 +1,98 @@
+from glu import Glu
+from glu.flows import ACK, RTT_ALPHA, SYN, FlowTable
+
+from frames import tcp_frame, udp_frame
+
+UE_IP = "10.0.0.2"
+HOST_IP = "93.184.216.34"
+
+
+def test_flows_are_off_until_toggled():
+    g = Glu()
+    g.add_tower(50.0, 50.0)
+    ue = g.add_ue(60.0, 50.0)
+    frame = udp_frame(ue.ip, "10.200.0.1")
+
+    assert g.handle_uplink_frame(frame)
+    assert g.flows.summary()["flows"] == 0
+    assert g.flows.ue_totals() == []
+
+    g.toggle_flows()
+    assert g.handle_uplink_frame(frame)
+    assert g.flows.summary()["flows"] == 1
+    assert g.flows.ue_totals()[0]["ue"] == ue.id
+
+
+def test_idle_flows_expire_on_the_timing_wheel():
+    table = FlowTable(idle_timeout_s=2.0, tick_ms=500)
+    table.enabled = True
+    table.observe(udp_frame(UE_IP, HOST_IP, sport=1), 0.0, 1)
+    table.observe(udp_frame(UE_IP, HOST_IP, sport=2), 0.0, 1)
+    # the second flow stays active
+    table.observe(udp_frame(UE_IP, HOST_IP, sport=2), 1500.0, 1)
+    table.observe(udp_frame(UE_IP, HOST_IP, sport=3), 2500.0, 1)
+    assert table.summary()["flows"] == 2
+    assert table.summary()["expired"] == 1
+    assert [f["src"] for f in table.ue_flows(1)] == [f"{UE_IP}:2", f"{UE_IP}:3"]
+
+    # a long gap expires everything still on the wheel
+    table.observe(udp_frame(UE_IP, HOST_IP, sport=4), 60000.0, 1)
+    assert table.summary()["flows"] == 1
+    assert table.summary()["expired"] == 3
+
+
+def test_full_table_evicts_the_flow_closest_to_expiring():
+    table = FlowTable(max_flows=3, idle_timeout_s=10.0, tick_ms=1000)
+    table.enabled = True
+    for sport, now in ((1, 0.0), (2, 1000.0), (3, 2000.0)):
+        table.observe(udp_frame(UE_IP, HOST_IP, sport=sport), now, 1)
+    table.observe(udp_frame(UE_IP, HOST_IP, sport=4), 3000.0, 1)
+
+    assert table.summary()["flows"] == 3
+    assert table.summary()["evicted"] == 1
+    assert sorted(f["src"] for f in table.ue_flows(1)) == [
+        f"{UE_IP}:2",
+        f"{UE_IP}:3",
+        f"{UE_IP}:4",
+    ]
+    assert table.ue_totals()[0]["flows"] == 3
+
+
+def test_tcp_rtt_is_timed_from_segment_to_covering_ack():
+    table = FlowTable()
+    table.enabled = True
+    up = (UE_IP, HOST_IP, 40000, 80)
+    down = (HOST_IP, UE_IP, 80, 40000)
+    table.observe(tcp_frame(*up, 100, 0, SYN), 0.0, 1)
+    table.observe(tcp_frame(*down, 900, 101, SYN | ACK), 40.0, 1)
+    # a pure ack is not timed, the next data segment is
+    table.observe(tcp_frame(*up, 101, 901, ACK), 41.0, 1)
+    table.observe(tcp_frame(*up, 101, 901, ACK, b"x" * 100), 50.0, 1)
+    # an ack short of the segment's end is not a sample
+    table.observe(tcp_frame(*down, 901, 150, ACK), 60.0, 1)
+    table.observe(tcp_frame(*down, 901, 201, ACK), 70.0, 1)
+
+    flows = {f["src"]: f for f in table.ue_flows(1)}
+    sender = flows[f"{UE_IP}:40000"]
+    assert sender["rtt_samples"] == 2
+    assert sender["min_rtt_ms"] == 20.0
+    assert sender["rtt_ms"] == 40.0 + RTT_ALPHA * (20.0 - 40.0)
+    # the server's SYN-ACK was covered by the client's ack after 1 ms
+    assert flows[f"{HOST_IP}:80"]["rtt_ms"] == 1.0
+
+
+def test_top_flows_and_per_ue_totals():
+    table = FlowTable()
+    table.enabled = True
+    for sport, size, ue in ((1, 10, 1), (2, 300, 1), (3, 100, 2)):
+        flow = table.observe(udp_frame(UE_IP, HOST_IP, b"x" * size, sport=sport), 0.0, ue)
+    table.observe(udp_frame(UE_IP, HOST_IP, b"x" * 10, sport=1), 1.0, 1)
+    table.drop(flow)
+
+    top = table.top(2)
+    assert [f["src"] for f in top] == [f"{UE_IP}:2", f"{UE_IP}:3"]
+    assert [f["src"] for f in table.top(1, by="packets")] == [f"{UE_IP}:1"]
+    assert table.ue_totals() == [
+        {"ue": 1, "packets": 3, "bytes": 3 * 28 + 320, "drops": 0, "flows": 2},
+        {"ue": 2, "packets": 1, "bytes": 28 + 100, "drops": 1, "flows": 1},
+    ]
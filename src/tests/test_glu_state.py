@@ -0,0 +1,108 @@
+import os
+import threading
+
+import numpy as np
+import pytest
+
+from glu_state import StateReader, StateWriter
+
+
+def ues(n: int, value: int) -> dict:
+    return {"id": np.arange(n), "x": np.full(n, float(value)), "y": np.full(n, float(value))}
+
+
+def towers(n: int, value: int) -> dict:
+    return {"id": np.arange(n), "x": np.full(n, float(value))}
+
+
+def test_read_returns_the_last_update(tmp_path):
+    path = str(tmp_path / "state")
+    writer = StateWriter(path, ue_capacity=8, tower_capacity=2)
+    reader = StateReader(path)
+    writer.update(ues(3, 5), towers(1, 7), 3, 1, topology_version=4)
+
+    state = reader.read()
+    assert state["seq"] == 2
+    assert state["topology_version"] == 4
+    assert list(state["ue"]["x"]) == [5.0, 5.0, 5.0]
+    assert list(state["tower"]["x"]) == [7.0]
+    reader.close()
+    writer.close()
+
+
+def test_reader_waits_out_an_update_in_progress(tmp_path):
+    path = str(tmp_path / "state")
+    writer = StateWriter(path, ue_capacity=8, tower_capacity=2)
+    reader = StateReader(path)
+    writer.update(ues(2, 1), towers(1, 1), 2, 1)
+
+    state = reader.views()
+    assert reader.unchanged(state["seq"])
+    # the writer is between making the sequence number odd and even again
+    writer.region.seq[0] += 1
+    assert not reader.unchanged(state["seq"])
+    with pytest.raises(TimeoutError):
+        reader.read(timeout_s=0.01)
+    writer.region.seq[0] += 1
+    assert reader.read()["seq"] == state["seq"] + 2
+    reader.close()
+    writer.close()
+
+
+def test_snapshots_are_consistent_under_concurrent_updates(tmp_path):
+    path = str(tmp_path / "state")
+    writer = StateWriter(path, ue_capacity=256, tower_capacity=2)
+    reader = StateReader(path)
+    writer.update(ues(256, 0), towers(1, 0), 256, 1)
+    stop = threading.Event()
+
+    def write():
+        value = 0
+        while not stop.is_set():
+            value += 1
+            writer.update(ues(256, value), towers(1, value), 256, 1)
+
+    thread = threading.Thread(target=write)
+    thread.start()
+    try:
+        for _ in range(200):
+            state = reader.read()
+            # every field of one snapshot comes from the same update
+            value = state["tower"]["x"][0]
+            assert (state["ue"]["x"] == value).all()
+            assert (state["ue"]["y"] == value).all()
+    finally:
+        stop.set()
+        thread.join()
+    reader.close()
+    writer.close()
+
+
+def test_reader_reopens_a_region_that_was_outgrown(tmp_path):
+    path = str(tmp_path / "state")
+    writer = StateWriter(path, ue_capacity=4, tower_capacity=2)
+    reader = StateReader(path)
+    writer.update(ues(4, 1), towers(1, 1), 4, 1)
+    assert reader.read()["seq"] == 2
+
+    writer.update(ues(10, 2), towers(3, 2), 10, 3)
+    assert writer.region.ue_capacity >= 10
+    state = reader.read()
+    assert reader.region.ue_capacity == writer.region.ue_capacity
+    # sequence numbers carry on into the new region
+    assert state["seq"] == 4
+    assert list(state["ue"]["id"]) == list(range(10))
+    assert list(state["tower"]["x"]) == [2.0, 2.0, 2.0]
+    reader.close()
+    writer.close()
+
+
+def test_close_leaves_a_newer_writers_region(tmp_path):
+    path = str(tmp_path / "state")
+    old = StateWriter(path)
+    new = StateWriter(path)
+    old.close()
+    assert os.path.exists(path)
+    StateReader(path).close()
+    new.close()
+    assert not os.path.exists(path)
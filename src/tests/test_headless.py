@@ -0,0 +1,125 @@
+import argparse
+import json
+
+import pytest
+
+import headless
+from glu import glu as glu_module
+
+from frames import udp_frame
+
+SCENARIO = {
+    "version": 1,
+    "subnet": "10.0.0.0/24",
+    "seed": 1,
+    "starting_ip": "10.0.0.1",
+    "pixels_per_meter": 3.0,
+    "map_size_m": [200.0, 200.0],
+    "dropping_packets": True,
+    "delaying_packets": True,
+    "mobility_running": False,
+    "towers": {
+        "id": [0, 1],
+        "x": [50.0, 150.0],
+        "y": [100.0, 100.0],
+        "on": [True, False],
+        "tech": ["LTE-20MHz", "LTE-20MHz"],
+    },
+    "ues": {
+        "id": [0, 1, 2],
+        "x": [40.0, 60.0, 140.0],
+        "y": [100.0, 100.0, 100.0],
+        "ip": ["10.0.0.1", "10.0.0.2", "10.0.0.3"],
+        "model": ["static", "static", "static"],
+        "min_speed": [1.0, 1.0, 1.0],
+        "max_speed": [2.0, 2.0, 2.0],
+        "pause_s": [0.0, 0.0, 0.0],
+    },
+}
+
+
+@pytest.fixture
+def args(tmp_path):
+    path = tmp_path / "scenario.json"
+    path.write_text(json.dumps(SCENARIO))
+    return argparse.Namespace(
+        scenario=str(path),
+        native=True,
+        single_threaded=False,
+        gateway_queues=1,
+        timer_accuracy_us=100.0,
+        flows=False,
+        no_coalesce=False,
+    )
+
+
+def test_native_summary_reads_the_engine_counters(args, capsys):
+    g, restored = headless.build(args)
+    assert headless.start(g, args) == "native"
+    assert len(g.cabernet.links) == 3
+    start = {"delivered_uplink": 10, "delivered_uplink_bytes": 10000, "sent_to_ues": 5}
+    g.cabernet.dataplane_stats = lambda: {
+        "delivered_uplink": 110,
+        "delivered_uplink_bytes": 160000,
+        "sent_to_ues": 45,
+        "sent_to_ues_bytes": 60000,
+        "dropped_uplink": 3,
+        "dropped_downlink": 2,
+        "unassociated": 7,
+    }
+    s = headless.summary(g, restored, "native", 2.0, start)
+    assert (s["towers"], s["ues"], s["associated"], s["mode"]) == (2, 3, 3, "native")
+    assert s["uplink"] == {
+        "packets": 100,
+        "pps": 50.0,
+        "mbps": pytest.approx(0.6),
+        "dropped": 3,
+        "unassociated": 7,
+    }
+    assert s["downlink"] == {
+        "packets": 40,
+        "pps": 20.0,
+        "mbps": pytest.approx(0.24),
+        "dropped": 2,
+        "unassociated": 0,
+    }
+    assert s["native"]["sent_to_ues"] == 45
+    headless.print_summary(s)
+    out = capsys.readouterr().out
+    assert "2 towers, 3 UEs (3 associated)" in out
+    assert "native for 2.0 s" in out
+
+
+def test_python_summary_reads_the_delivery_timers(args):
+    args.native = False
+    g, restored = headless.build(args)
+    s = headless.summary(g, restored, "threaded", 1.0)
+    assert s["uplink"]["packets"] == s["downlink"]["packets"] == 0
+    assert "native" not in s
+    assert set(s["overload"]) == {"state", "shed_frames", "entered"}
+
+
+def test_python_summary_counts_only_forwarded_frames(args, monkeypatch):
+    args.native = False
+    g, restored = headless.build(args)
+    g.delaying_packets = False
+    g.dropping_packets = False
+    ue = g.get_ue(0)
+    # to another UE, to an address with no UE, and out to the internet
+    for dst in ("10.0.0.2", "10.0.0.9", "10.200.0.1"):
+        assert g.handle_uplink_frame(udp_frame(ue.ip, dst))
+    assert g._poll_towers()
+    assert g._send_frames()
+    s = headless.summary(g, restored, "threaded", 1.0)
+    assert (s["uplink"]["packets"], s["uplink"]["unassociated"]) == (2, 1)
+    assert s["uplink"]["mbps"] == pytest.approx(2 * 92 * 8 / 1e6)
+    assert (s["downlink"]["packets"], s["downlink"]["dropped"]) == (1, 0)
+
+    # every frame lost on the link: timed out of the queue but not forwarded
+    g.dropping_packets = True
+    monkeypatch.setattr(glu_module, "corruption_mask", lambda packets: [True] * len(packets))
+    assert g.handle_uplink_frame(udp_frame(ue.ip, "10.0.0.2"))
+    assert g._poll_towers()
+    s = headless.summary(g, restored, "threaded", 1.0)
+    assert (s["uplink"]["packets"], s["uplink"]["dropped"]) == (2, 1)
+    assert g.upload_timer.stats()["packets"] == 4
@@ -0,0 +1,116 @@
+import numpy as np
+import pytest
+
+from glu import Glu
+from glu.history import MetricHistory
+
+
+def record(history: MetricHistory, now_s: float, values: dict[int, float]) -> None:
+    ids = list(values)
+    history.record(now_s, ids, np.array([[values[i]] for i in ids], dtype=np.float64))
+
+
+def test_forgotten_rows_go_to_new_entities():
+    history = MetricHistory(("m",), ((1.0, 4),), max_entities=2)
+    record(history, 0.0, {0: 1.0, 1: 2.0, 2: 3.0})
+    assert history.untracked == 1
+    assert history.query(2) is None
+    history.forget(0)
+    assert history.query(0) is None
+    record(history, 1.0, {1: 2.0, 2: 3.0})
+    # the reused row starts empty
+    assert history.query(2)["m"] == [None, 3.0]
+    assert history.query(1)["m"] == [2.0, 2.0]
+    assert history.untracked == 1
+
+
+def test_removed_ue_leaves_the_history():
+    g = Glu(history_max_ues=2)
+    g.add_tower(50.0, 50.0)
+    a, b = g.add_ue(40.0, 50.0), g.add_ue(60.0, 50.0)
+    g.history.sample(0.0)
+    g.remove_ue(a.id)
+    c = g.add_ue(45.0, 50.0)
+    g.history.sample(1.0)
+    assert g.history.ues.query(a.id) is None
+    assert g.history.ues.query(c.id)["t"] == [0.0, 1.0]
+    assert g.history.ues.query(c.id)["queue"] == [None, 0.0]
+    assert g.history.ues.untracked == 0
+
+
+def test_ue_removed_during_a_sample_is_dropped_again():
+    g = Glu()
+    a = g.add_ue(40.0, 50.0)
+    g.add_ue(60.0, 50.0)
+    topology = g.topology
+    g.remove_ue(a.id)
+    # the sample still sees the topology from before the removal
+    live = g.topology
+    g.topology = topology
+    record = g.history.ues.record
+
+    def record_then_publish(*args):
+        record(*args)
+        g.topology = live
+
+    g.history.ues.record = record_then_publish
+    g.history.sample(0.0)
+    assert g.history.ues.query(a.id) is None
+
+
+def test_ring_keeps_the_newest_points_in_order():
+    history = MetricHistory(("m",), ((1.0, 5),))
+    for t in range(12):
+        record(history, float(t), {0: float(t)})
+    q = history.query(0)
+    assert q["t"] == [7.0, 8.0, 9.0, 10.0, 11.0]
+    assert q["m"] == [7.0, 8.0, 9.0, 10.0, 11.0]
+
+
+def test_points_are_averaged_into_10_s_and_1_min():
+    history = MetricHistory(("m",))  # 1 s x 60, 10 s x 60, 1 min x 60
+    for t in range(180):
+        # entity 1 is missing from every other sample; NaNs are skipped
+        values = {0: float(t)} if t % 2 else {0: float(t), 1: float(t)}
+        record(history, float(t), values)
+    tens = history.query(0, resolution_s=10.0)
+    assert tens["resolution_s"] == 10.0
+    assert tens["t"] == [float(t) for t in range(9, 180, 10)]
+    assert tens["m"] == pytest.approx([t - 4.5 for t in range(9, 180, 10)])
+    assert history.query(1, resolution_s=10.0)["m"] == pytest.approx(
+        [t - 5.0 for t in range(9, 180, 10)]
+    )
+    minutes = history.query(0, resolution_s=60.0)
+    # each minute point is the mean of six 10 s points, stamped with the last of them
+    assert minutes["t"] == [59.0, 119.0, 179.0]
+    assert minutes["m"] == pytest.approx([29.5, 89.5, 149.5])
+
+
+def test_range_queries_pick_the_finest_tier_that_reaches_back():
+    history = MetricHistory(("m",))
+    for t in range(300):
+        record(history, 1000.0 + t, {0: float(t)})
+    # the 1 s tier holds the last minute
+    fine = history.query(0, start_s=1250.0, end_s=1255.0)
+    assert fine["resolution_s"] == 1.0
+    assert fine["t"] == [1250.0, 1251.0, 1252.0, 1253.0, 1254.0, 1255.0]
+    coarse = history.query(0, start_s=1100.0)
+    assert coarse["resolution_s"] == 10.0
+    assert coarse["t"][0] == 1109.0 and coarse["t"][-1] == 1299.0
+    oldest = history.query(0, start_s=1000.0)
+    assert oldest["resolution_s"] == 10.0
+    # an explicit resolution is honoured, and the range is applied to it
+    minutes = history.query(0, start_s=1100.0, end_s=1200.0, resolution_s=60.0)
+    assert minutes["t"] == [1119.0, 1179.0]
+    assert minutes["m"] == pytest.approx([89.5, 149.5])
+    assert history.query(0, start_s=5000.0)["t"] == []
+
+
+def test_memory_stays_within_max_entities():
+    history = MetricHistory(("a", "b"), ((1.0, 10), (10.0, 10)), max_entities=100)
+    record(history, 0.0, {i: 1.0 for i in range(150)})
+    assert len(history.rows) == 100
+    assert history.untracked == 50
+    assert all(len(t.data) == 100 for t in history.tiers)
+    assert history.memory_bytes() == 2 * (100 * 10 * 2 * 4 + 10 * 8)
+    assert history.query(149) is None
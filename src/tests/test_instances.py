@@ -0,0 +1,84 @@
+import json
+import socket
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+from instances import MAX_INSTANCES, front, load_config
+
+
+def write(tmp_path, config) -> str:
+    path = tmp_path / "instances.json"
+    path.write_text(json.dumps(config))
+    return str(path)
+
+
+def test_instances_get_their_prefix_transit_and_env(tmp_path):
+    specs = load_config(
+        write(
+            tmp_path,
+            {
+                "exp1": {"subnet": "10.0.0.0/24"},
+                "exp2": {"subnet": "10.0.1.0/24", "prefix": "b", "env": {"GLU_GATEWAY_QUEUES": 2}},
+            },
+        )
+    )
+    assert list(specs) == ["exp1", "exp2"]
+    assert (specs["exp1"].netns_prefix, specs["exp1"].transit) == ("exp1", 0)
+    assert (specs["exp2"].netns_prefix, specs["exp2"].transit) == ("b", 1)
+    assert specs["exp2"].env == {"GLU_GATEWAY_QUEUES": "2"}
+
+
+@pytest.mark.parametrize(
+    "config, message",
+    [
+        (
+            {"a": {"subnet": "10.0.0.0/23"}, "b": {"subnet": "10.0.1.0/24"}},
+            "subnets of a and b overlap",
+        ),
+        (
+            {
+                "a": {"subnet": "10.0.0.0/24", "prefix": "x"},
+                "b": {"subnet": "10.0.1.0/24", "prefix": "x"},
+            },
+            "share the namespace prefix x",
+        ),
+        ({"experiment1": {"subnet": "10.0.0.0/24"}}, "namespace prefix 'experiment1'"),
+        ({"a": {"subnet": "10.0.0.0/24", "prefix": "a-b"}}, "namespace prefix 'a-b'"),
+        ({"a": {"subnet": "10.0.0.1/24"}}, "host bits set"),
+        ({"a": {"subnet": "10.200.3.0/24"}}, "overlaps the host links in 10.200.0.0/16"),
+        ({"a": {"subnet": "10.0.0.0/8"}}, "overlaps the host links in 10.200.0.0/16"),
+    ],
+)
+def test_invalid_configs_are_rejected(tmp_path, config, message):
+    with pytest.raises(ValueError, match=message):
+        load_config(write(tmp_path, config))
+
+
+def test_at_most_max_instances(tmp_path):
+    config = {
+        f"i{n}": {"subnet": f"10.{n // 256}.{n % 256}.0/24"} for n in range(MAX_INSTANCES + 1)
+    }
+    with pytest.raises(ValueError, match=f"at most {MAX_INSTANCES} instances"):
+        load_config(write(tmp_path, config))
+    del config[f"i{MAX_INSTANCES}"]
+    assert len(load_config(write(tmp_path, config))) == MAX_INSTANCES
+
+
+def test_unknown_instance_is_not_found():
+    with TestClient(front({})) as client:
+        response = client.get("/exp1/stats")
+    assert response.status_code == 404
+    assert response.json() == {"error": "no instance named exp1"}
+
+
+def test_unreachable_instance_is_a_bad_gateway():
+    # a port nothing listens on
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    with TestClient(front({"exp1": SimpleNamespace(port=port)})) as client:
+        response = client.get("/exp1/stats")
+    assert response.status_code == 502
+    assert response.json()["error"].startswith("instance exp1 unreachable")
@@ -0,0 +1,81 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+import layer1 as phy
+from layer1 import interference
+from glu import Glu
+
+
+@pytest.fixture
+def mixed():
+    """An LTE and an NR tower, each serving one transmitting UE."""
+    g = Glu()
+    lte = g.add_tower(20.0, 50.0)
+    nr = g.add_tower(120.0, 50.0)
+    nr.tower = phy.Tower(nr.tower.x, nr.tower.y, True, phy.NR_100)
+    g.publish()
+    a = g.add_ue(30.0, 50.0)
+    b = g.add_ue(110.0, 50.0)
+    for ue in (a, b):
+        ue.active_upload_packets = 1
+    assert (a.connected_to, b.connected_to) == (lte, nr)
+    return g, lte, nr, a, b
+
+
+@pytest.mark.parametrize("pruning", [True, False])
+def test_uplink_interferers_share_the_carrier(mixed, pruning):
+    g, lte, nr, a, b = mixed
+    g.configure_interference(20.0, None, pruning)
+    assert g.uplink_interferers(g.topology, lte) == [a.l1ue]
+    assert g.uplink_interferers(g.topology, nr) == [b.l1ue]
+
+
+@pytest.mark.parametrize("pruning", [True, False])
+def test_remote_uplink_interferers_share_the_carrier(mixed, pruning):
+    g, lte, nr, a, b = mixed
+    g.configure_interference(20.0, None, pruning)
+    remote = phy.UE(200.0, 50.0)
+    g.cluster = SimpleNamespace(remote_ues={phy.NR_100.carrier_freq: [remote]}, remote_towers=[])
+    assert remote not in g.uplink_interferers(g.topology, lte)
+    assert remote in g.uplink_interferers(g.topology, nr)
+
+
+def test_lookups_leave_the_rebuild_to_the_writers(mixed):
+    g, lte, nr, a, b = mixed
+    built = g._interference_built
+    g.publish()
+    g.uplink_interferers(g.topology, lte)
+    g.downlink_interferers(g.topology, lte, a)
+    assert g._interference_built == built
+    g.push_links()
+    assert g._interference_built[0] == g.topology.version
+
+
+@pytest.mark.parametrize("direction", [interference.DL, interference.UL])
+@pytest.mark.parametrize("cutoff_m", [None, 150.0])
+def test_pruned_power_stays_within_the_reported_bound(direction, cutoff_m):
+    rng = np.random.default_rng(3)
+    tech = phy.LTE_20
+    tx = rng.uniform(0.0, 3000.0, (400, 2))
+    index = interference.InterferenceIndex(threshold_db=10.0, cutoff_m=cutoff_m)
+    entries = [(i, x, y, tech) for i, (x, y) in enumerate(tx.tolist())]
+    if direction == interference.DL:
+        index.build(entries, [])
+    else:
+        index.build([], entries)
+    grid = index._grids[(direction, tech.carrier_freq)]
+    errors = []
+    # receivers inside the transmitters' area and around it
+    for x, y in rng.uniform(-1000.0, 4000.0, (200, 2)).tolist():
+        found, bound_mw = grid.near(x, y)
+        d = np.hypot(tx[:, 0] - x, tx[:, 1] - y)
+        assert set(found) == set(np.flatnonzero(d <= grid.radius_m).tolist())
+        pruned = np.ones(len(tx), dtype=bool)
+        pruned[found] = False
+        exact_mw = interference.mean_rx_mw(tech, direction, d[pruned]).sum()
+        assert exact_mw <= bound_mw * (1 + 1e-9) + 1e-30
+        errors.append(10.0 * np.log10(1.0 + exact_mw / tech.noise_mw))
+        index._near(direction, x, y, tech)
+    assert 0.0 < max(errors) <= index.stats()["max_error_db"] + 1e-9
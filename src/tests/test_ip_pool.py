@@ -0,0 +1,46 @@
+import ipaddress
+
+import pytest
+
+from glu.ip_pool import IpPool
+
+
+def ip(s: str) -> ipaddress.IPv4Address:
+    return ipaddress.IPv4Address(s)
+
+
+def test_released_addresses_are_reused_first():
+    pool = IpPool(ipaddress.ip_network("10.0.0.0/24"))
+    a, b, c = pool.allocate(), pool.allocate(), pool.allocate()
+    assert (a, b, c) == (ip("10.0.0.1"), ip("10.0.0.2"), ip("10.0.0.3"))
+    pool.release(b)
+    pool.release(a)
+    assert [pool.allocate(), pool.allocate(), pool.allocate()] == [b, a, ip("10.0.0.4")]
+    assert pool.allocated == 4
+
+
+def test_reserved_network_and_broadcast_are_never_handed_out():
+    pool = IpPool(ipaddress.ip_network("10.0.0.0/29"), reserved=[ip("10.0.0.2")])
+    assert pool.capacity == 5
+    got = [pool.allocate() for _ in range(pool.capacity)]
+    assert got == [ip(f"10.0.0.{i}") for i in (1, 3, 4, 5, 6)]
+    with pytest.raises(ValueError):
+        pool.allocate()
+    pool.release(ip("10.0.0.5"))
+    assert pool.allocate() == ip("10.0.0.5")
+
+
+def test_claimed_addresses_are_skipped_and_released_ones_reused():
+    pool = IpPool(ipaddress.ip_network("10.0.0.0/24"), start=ip("10.0.0.10"))
+    pool.claim(ip("10.0.0.10"))
+    with pytest.raises(ValueError):
+        pool.claim(ip("10.0.0.10"))
+    with pytest.raises(ValueError):
+        pool.claim(ip("10.0.0.255"))
+    assert pool.allocate() == ip("10.0.0.11")
+    pool.release(ip("10.0.0.10"))
+    # releasing twice does not hand the address out twice
+    pool.release(ip("10.0.0.10"))
+    assert pool.allocate() == ip("10.0.0.10")
+    assert pool.allocate() == ip("10.0.0.12")
+    assert pool.allocated == 3
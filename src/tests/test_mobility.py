@@ -0,0 +1,134 @@
+import numpy as np
+import pytest
+
+from glu import Glu
+
+
+def test_step_writes_back_every_moved_position():
+    g = Glu()
+    g.add_tower(100.0, 100.0)
+    ues = g.add_ues([(10.0 * i, 20.0) for i in range(5)])
+    still = ues[2]
+    g.mobility.set_model([ue.id for ue in ues if ue is not still], "linear", 1.0, 1.0, 0.0, 90.0)
+    before = still.l1ue
+    rows = g.mobility.step(1.0)
+    assert sorted(g.mobility.ues[row].id for row in rows) == [0, 1, 3, 4]
+    for ue in ues:
+        row = g.mobility.index[ue.id]
+        assert (ue.l1ue.x, ue.l1ue.y) == tuple(g.mobility.pos[row])
+    assert still.l1ue is before
+    assert np.isclose(ues[0].l1ue.y, 21.0)
+
+
+def test_step_writes_back_a_single_moved_position():
+    g = Glu()
+    ue = g.add_ue(10.0, 20.0)
+    g.mobility.set_model([ue.id], "linear", 2.0, 2.0, 0.0, 0.0)
+    g.mobility.step(1.0)
+    assert np.isclose(ue.l1ue.x, 12.0) and ue.l1ue.y == 20.0
+
+
+def nearest(g, ue):
+    def dist(bs):
+        return np.hypot(bs.tower.x - ue.l1ue.x, bs.tower.y - ue.l1ue.y)
+
+    return min(g.base_stations, key=dist)
+
+
+def test_handover_after_a_removal_reaches_the_right_ues():
+    g = Glu()
+    g.add_tower(10.0, 50.0)
+    g.add_tower(90.0, 50.0)
+    ues = g.add_ues([(40.0 + i, 50.0) for i in range(4)])
+    g.mobility.set_model([ue.id for ue in ues], "linear", 30.0, 30.0, 0.0, 0.0)
+    # the last row takes over the removed UE's row before the tick
+    g.remove_ue(ues[1].id)
+    g.mobility.last_tick_s = 0.0
+    g.mobility.tick_hz = 1.0
+    g.mobility.tick()
+    # the removed UE is no longer moved
+    assert ues[1].l1ue.x == 41.0
+    for ue in (ues[0], ues[2], ues[3]):
+        assert ue.l1ue.x > 50.0
+        assert ue.connected_to is nearest(g, ue)
+    assert g.mobility.handovers == 3
+
+
+def test_move_ue_hands_over_only_that_ue():
+    g = Glu()
+    g.add_tower(10.0, 50.0)
+    right = g.add_tower(90.0, 50.0)
+    a, b = g.add_ue(20.0, 50.0), g.add_ue(25.0, 50.0)
+    g.move_ue(a.id, 85.0, 50.0)
+    assert a.connected_to is right
+    assert b.connected_to is nearest(g, b)
+    assert g.mobility.reassociate_ue(b) == 0
+
+
+def test_random_waypoint_walks_to_its_target_and_pauses():
+    g = Glu()
+    ue = g.add_ue(50.0, 50.0)
+    m = g.mobility
+    m.set_model([ue.id], "random_waypoint", 10.0, 10.0, 5.0)
+    row = m.index[ue.id]
+    target = m.target[row].copy()
+    dist = np.hypot(*(target - m.pos[row]))
+    steps = int(dist // 10.0)
+    for _ in range(steps):
+        before = m.pos[row].copy()
+        m.step(1.0)
+        assert np.hypot(*(m.pos[row] - before)) == pytest.approx(10.0)
+    m.step(1.0)
+    # arrived: a new target inside the map, and a pause before heading to it
+    assert (ue.l1ue.x, ue.l1ue.y) == tuple(target)
+    assert 0.0 <= m.target[row][0] <= g.map_width_m
+    assert 0.0 <= m.target[row][1] <= g.map_height_m
+    for _ in range(4):
+        m.step(1.0)
+        assert (ue.l1ue.x, ue.l1ue.y) == tuple(target)
+    m.step(1.0)
+    m.step(1.0)
+    assert (ue.l1ue.x, ue.l1ue.y) != tuple(target)
+
+
+def write_trace(path, rows) -> str:
+    path.write_text("t,ue_id,x,y\n" + "".join(f"{t},{i},{x},{y}\n" for t, i, x, y in rows))
+    return str(path)
+
+
+def test_trace_is_interpolated_and_held_after_the_last_sample(tmp_path):
+    g = Glu()
+    a, b = g.add_ue(0.0, 0.0), g.add_ue(5.0, 5.0)
+    trace = write_trace(
+        tmp_path / "trace.csv", [(10, a.id, 100, 0), (0, a.id, 0, 0), (20, a.id, 100, 40)]
+    )
+    assert g.mobility.load_trace(trace) == [a.id]
+    g.mobility.set_model([a.id], "trace")
+    g.mobility.step(5.0)
+    assert (a.l1ue.x, a.l1ue.y) == (50.0, 0.0)
+    g.mobility.step(10.0)
+    assert (a.l1ue.x, a.l1ue.y) == (100.0, 20.0)
+    g.mobility.step(100.0)
+    assert (a.l1ue.x, a.l1ue.y) == (100.0, 40.0)
+    assert (b.l1ue.x, b.l1ue.y) == (5.0, 5.0)
+
+
+def test_reloaded_trace_stops_the_ues_it_leaves_out(tmp_path):
+    g = Glu()
+    a, b = g.add_ue(0.0, 0.0), g.add_ue(5.0, 5.0)
+    g.mobility.load_trace(write_trace(tmp_path / "a.csv", [(0, a.id, 0, 0), (10, a.id, 100, 0)]))
+    g.mobility.set_model([a.id], "trace")
+    g.mobility.step(5.0)
+    g.mobility.load_trace(write_trace(tmp_path / "b.csv", [(0, b.id, 5, 5), (10, b.id, 5, 95)]))
+    g.mobility.set_model([b.id], "trace")
+    g.mobility.step(5.0)
+    assert (a.l1ue.x, a.l1ue.y) == (50.0, 0.0)
+    assert (b.l1ue.x, b.l1ue.y) == (5.0, 50.0)
+    assert g.mobility.summary()["models"]["trace"] == 1
+
+
+def test_unknown_ue_in_a_trace_is_rejected(tmp_path):
+    g = Glu()
+    g.add_ue(0.0, 0.0)
+    with pytest.raises(ValueError):
+        g.mobility.load_trace(write_trace(tmp_path / "t.csv", [(0, 7, 0, 0)]))
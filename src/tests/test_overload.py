@@ -0,0 +1,97 @@
+from types import SimpleNamespace
+
+import pytest
+
+from glu import overload
+from glu.overload import NORMAL, SAMPLE_LOG, SHED, TICK_PHYSICS, OverloadMonitor
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(overload, "time", SimpleNamespace(monotonic=clock))
+    return clock
+
+
+def settle(monitor: OverloadMonitor, loop: str, lag_ms: float, n: int = 200) -> int:
+    # enough reports for the smoothed lag to reach lag_ms
+    for _ in range(n):
+        level = monitor.observe(loop, lag_ms, 0.0)
+    return level
+
+
+def test_crossing_a_threshold_raises_the_level_at_once(clock):
+    monitor = OverloadMonitor(cooldown_s=2.0)
+    assert monitor.observe("poll", 0.0, 0.0) == NORMAL
+    assert monitor.observe("send", 60.0, 0.0) == TICK_PHYSICS
+    assert monitor.observe("ue", 0.0, 150.0) == SHED
+    assert monitor.stats()["entered"] == {
+        "normal": 0,
+        "sample_log": 0,
+        "tick_physics": 1,
+        "shed": 1,
+    }
+
+
+def test_level_is_kept_until_below_the_scaled_thresholds(clock):
+    monitor = OverloadMonitor(cooldown_s=2.0)
+    assert monitor.observe("poll", 20.0, 0.0) == SAMPLE_LOG
+    # under the 10 ms threshold but above half of it
+    settle(monitor, "poll", 7.0)
+    clock.now += 3.0
+    assert monitor.observe("poll", 7.0, 0.0) == SAMPLE_LOG
+    assert settle(monitor, "poll", 4.0) == NORMAL
+
+
+def test_level_is_lowered_one_step_per_cooldown(clock):
+    monitor = OverloadMonitor(cooldown_s=2.0)
+    assert monitor.observe("poll", 500.0, 0.0) == SHED
+    settle(monitor, "poll", 0.0)
+    assert monitor.level == SHED
+    clock.now += 2.0
+    assert monitor.observe("poll", 0.0, 0.0) == TICK_PHYSICS
+    clock.now += 1.0
+    assert monitor.observe("poll", 0.0, 0.0) == TICK_PHYSICS
+    clock.now += 1.0
+    assert monitor.observe("poll", 0.0, 0.0) == SAMPLE_LOG
+    clock.now += 2.0
+    assert monitor.observe("poll", 0.0, 0.0) == NORMAL
+    assert monitor.stats()["entered"]["tick_physics"] == 1
+
+
+def test_loop_that_stopped_reporting_no_longer_counts(clock):
+    monitor = OverloadMonitor(cooldown_s=2.0)
+    assert monitor.observe("send", 60.0, 0.0) == TICK_PHYSICS
+    clock.now += 1.0
+    assert monitor.observe("poll", 0.0, 0.0) == TICK_PHYSICS
+    clock.now += 1.5
+    # send last reported 2.5 s ago
+    assert monitor.observe("poll", 0.0, 0.0) == SAMPLE_LOG
+
+
+def test_shed_refreshes_the_level_without_reports(clock):
+    monitor = OverloadMonitor(cooldown_s=2.0)
+    assert monitor.observe("poll", 500.0, 0.0) == SHED
+    assert monitor.shed()
+    # shedding emptied the queues: no loop reports any more
+    clock.now += 2.5
+    assert not monitor.shed()
+    assert monitor.level == TICK_PHYSICS
+    assert monitor.stats()["shed_frames"] == 1
+
+
+def test_only_every_nth_packet_is_logged_when_sampling(clock):
+    monitor = OverloadMonitor()
+    assert all(monitor.log_packet() for _ in range(5))
+    monitor.observe("poll", 20.0, 0.0)
+    logged = sum(monitor.log_packet() for _ in range(4 * overload.LOG_SAMPLE))
+    assert logged == 4
+    assert monitor.log_skipped == 4 * (overload.LOG_SAMPLE - 1)
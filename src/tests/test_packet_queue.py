@@ -0,0 +1,85 @@
+import time
+
+import layer1 as phy
+from glu.packet_queue import Packet, PacketQueue, corruption_mask
+
+LINK = (1.0, 0.01, 0.0)
+HOUR_MS = 3600 * 1000
+
+
+def now_ms() -> float:
+    return time.time() * 1000
+
+
+def packet(arrival: float, per: float = 0.0, rng: phy.RngStream | None = None) -> Packet:
+    return Packet(arrival, b"x" * 64, per, None, None, rng)
+
+
+def test_partial_burst_is_pushed_back_at_its_next_arrival():
+    queue = PacketQueue()
+    now = now_ms()
+    due, late = packet(now - 10), packet(now + HOUR_MS)
+    burst = queue.enqueue_burst("flow", due, None, LINK, now)
+    assert queue.append(burst, late)
+
+    assert queue.pop_arrived() == [due]
+    assert len(queue) == 1
+    assert queue.next_deadline() == late.arrival_time
+    assert burst.packets == [late]
+    assert queue.pop_arrived(slack_ms=2 * HOUR_MS) == [late]
+    assert len(queue) == 0
+
+
+def test_arrival_order_is_restored_across_bursts():
+    queue = PacketQueue()
+    now = now_ms()
+    a = [packet(now - 40), packet(now - 20)]
+    b = [packet(now - 30), packet(now - 10)]
+    single = packet(now - 25)
+    first = queue.enqueue_burst("a", a[0], None, LINK, now)
+    second = queue.enqueue_burst("b", b[0], None, LINK, now)
+    queue.append(first, a[1])
+    queue.append(second, b[1])
+    queue.enqueue(single)
+
+    assert queue.pop_arrived() == [a[0], b[0], single, a[1], b[1]]
+
+
+def test_nothing_is_appended_to_a_burst_after_it_closes():
+    queue = PacketQueue()
+    now = now_ms()
+    burst = queue.enqueue_burst("flow", packet(now - 10), None, LINK, now)
+    assert queue.open_burst("flow", now, 5.0, 8) is burst
+
+    queue.pop_arrived()
+    assert burst.closed
+    assert queue.open_burst("flow", now, 5.0, 8) is None
+    assert not queue.append(burst, packet(now))
+    assert len(queue) == 0
+
+
+def test_open_burst_respects_window_and_size():
+    queue = PacketQueue()
+    now = now_ms()
+    burst = queue.enqueue_burst("flow", packet(now + HOUR_MS), None, LINK, now)
+    assert queue.open_burst("flow", now + 6.0, 5.0, 8) is None
+    queue.append(burst, packet(now + HOUR_MS))
+    assert queue.open_burst("flow", now, 5.0, 2) is None
+    assert queue.open_burst("other", now, 5.0, 8) is None
+
+
+def test_packets_of_a_burst_are_dropped_one_by_one():
+    queue = PacketQueue()
+    now = now_ms()
+    rng = phy.RngStream(7, 3)
+    rates = [0.0, 1.0, 0.0, 1.0, 0.0]
+    packets = [packet(now - 10 + i, per, rng) for i, per in enumerate(rates)]
+    burst = queue.enqueue_burst("flow", packets[0], None, LINK, now)
+    for p in packets[1:]:
+        assert queue.append(burst, p)
+
+    ready = queue.pop_arrived()
+    assert ready == packets
+    mask = corruption_mask(ready)
+    assert list(mask) == [False, True, False, True, False]
+    assert list(mask) == [p.is_corrupted() for p in ready]
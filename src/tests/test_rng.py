@@ -0,0 +1,90 @@
+import math
+
+import numpy as np
+import pytest
+
+from layer1.rng import (
+    GAUSS_BLOCK,
+    PHY_UL,
+    RngStream,
+    link_stream_id,
+    philox4x32,
+    philox4x32_batch,
+    uniform,
+    uniform_batch,
+)
+
+# known-answer vectors of Philox4x32-10 from the Random123 distribution (kat_vectors)
+KAT = [
+    ((0, 0, 0, 0), (0, 0), (0x6627E8D5, 0xE169C58D, 0xBC57AC4C, 0x9B00DBD8)),
+    (
+        (0xFFFFFFFF, 0xFFFFFFFF, 0xFFFFFFFF, 0xFFFFFFFF),
+        (0xFFFFFFFF, 0xFFFFFFFF),
+        (0x408F276D, 0x41C83B0E, 0xA20BC7C6, 0x6D5451FD),
+    ),
+    (
+        (0x243F6A88, 0x85A308D3, 0x13198A2E, 0x03707344),
+        (0xA4093822, 0x299F31D0),
+        (0xD16CFE09, 0x94FDCCEB, 0x5001E420, 0x24126EA1),
+    ),
+]
+
+
+@pytest.mark.parametrize("ctr, key, expected", KAT)
+def test_philox_known_answers(ctr, key, expected):
+    assert philox4x32(ctr, key) == expected
+
+
+def test_batch_matches_the_known_answers():
+    ctr = np.array([c for c, _, _ in KAT], dtype=np.uint64)
+    key = np.array([k for _, k, _ in KAT], dtype=np.uint64)
+    expected = np.array([e for _, _, e in KAT], dtype=np.uint64)
+    assert (philox4x32_batch(ctr, key) == expected).all()
+
+
+def test_uniform_batch_matches_uniform():
+    streams = np.array([1, 2**40 + 3, 2**63 + 5], dtype=np.uint64)
+    counters = np.array([0, 7, 2**33], dtype=np.uint64)
+    batch = uniform_batch(42, streams, counters)
+    for s, c, u in zip(streams.tolist(), counters.tolist(), batch.tolist()):
+        assert u == uniform(42, s, c)
+        assert 0.0 <= u < 1.0
+
+
+def test_stream_draws_depend_only_on_the_counter():
+    a, b = RngStream(7, 99), RngStream(7, 99)
+    first = [a.random() for _ in range(5)]
+    assert first == [b.uniform_at(i) for i in range(5)]
+    assert RngStream(8, 99).random() != first[0]
+    assert list(RngStream(7, 99).random_batch(5)) == first
+
+
+def scalar_gauss(seed: int, stream_id: int, counter: int) -> float:
+    # the definition gauss() keeps: Box-Muller on one Philox block of the counter
+    c0, c1 = counter & 0xFFFFFFFF, counter >> 32
+    c2, c3 = stream_id & 0xFFFFFFFF, stream_id >> 32
+    w = philox4x32((c0, c1, c2, c3), (seed & 0xFFFFFFFF, seed >> 32))
+    u1 = 1.0 - ((w[0] >> 5) * 67108864 + (w[1] >> 6)) / 9007199254740992.0
+    u2 = ((w[2] >> 5) * 67108864 + (w[3] >> 6)) / 9007199254740992.0
+    return math.sqrt(-2.0 * math.log(u1)) * math.cos(2.0 * math.pi * u2)
+
+
+def test_gauss_blocks_match_the_scalar_draws():
+    stream = RngStream(2**40 + 9, link_stream_id(PHY_UL, 3, 7))
+    # across a block boundary, and interleaved with uniform draws
+    draws = {}
+    for counter in range(GAUSS_BLOCK + 10):
+        if counter % 3:
+            draws[counter] = stream.gauss(1.0, 8.0)
+        else:
+            stream.random()
+    for counter, value in draws.items():
+        expected = 1.0 + 8.0 * scalar_gauss(stream.seed, stream.stream_id, counter)
+        assert value == pytest.approx(expected, rel=1e-12, abs=1e-12)
+
+
+def test_gauss_is_standard_normal():
+    stream = RngStream(3, 11)
+    draws = np.array([stream.gauss() for _ in range(20 * GAUSS_BLOCK)])
+    assert abs(draws.mean()) < 0.05
+    assert abs(draws.std() - 1.0) < 0.05
@@ -0,0 +1,121 @@
+import pytest
+
+import layer1 as phy
+from glu.model import UE, BaseStation
+from glu.scheduler import DL, FULL_BAND, PROPORTIONAL_FAIR, ROUND_ROBIN, UL, CellScheduler
+
+FRAME = 1000
+MS_PER_BYTE = 1e-3  # a frame takes 1 ms, one LTE TTI, over the whole band
+
+
+def make_cell(n: int) -> tuple[BaseStation, list[UE]]:
+    bs = BaseStation(0, phy.Tower(0.0, 0.0))
+    return bs, [UE(i, phy.UE(10.0 * (i + 1), 0.0), f"10.0.0.{i + 1}") for i in range(n)]
+
+
+# every UE keeps at least two frames queued for duration_ms
+def saturate(scheduler: CellScheduler, bs, ues, start_ms: float, duration_ms: int) -> float:
+    now = start_ms
+    for _ in range(duration_ms):
+        for ue in ues:
+            while scheduler.backlog_ms(UL, bs, ue, now) < 2.0 * len(ues):
+                scheduler.reserve(UL, bs, ue, now, FRAME, MS_PER_BYTE)
+        now += 1.0
+    return now
+
+
+@pytest.mark.parametrize("n", [2, 4, 8])
+def test_round_robin_splits_the_band_equally(n):
+    scheduler = CellScheduler(ROUND_ROBIN)
+    bs, ues = make_cell(n)
+    now = saturate(scheduler, bs, ues, 1000.0, 200)
+    shares = [scheduler.expected_share(UL, bs, ue, now) for ue in ues]
+    assert shares == pytest.approx([1.0 / n] * n, rel=1e-3)
+    # a frame queued now takes n times its full-band time, after the backlog
+    start, sent = scheduler.reserve(UL, bs, ues[0], now, FRAME, MS_PER_BYTE)
+    assert sent - start == pytest.approx(n * FRAME * MS_PER_BYTE, rel=1e-3)
+
+
+def test_newcomer_joins_with_an_equal_split():
+    scheduler = CellScheduler(ROUND_ROBIN)
+    bs, ues = make_cell(4)
+    now = saturate(scheduler, bs, ues[:3], 1000.0, 200)
+    assert scheduler.expected_share(UL, bs, ues[3], now) == pytest.approx(0.25)
+    # asking does not add the UE to the cell
+    assert scheduler.stats()["uplink"][0]["ues"] == 3
+
+
+def test_full_band_ignores_the_other_ues():
+    scheduler = CellScheduler(FULL_BAND)
+    bs, ues = make_cell(4)
+    now = saturate(scheduler, bs, ues, 1000.0, 50)
+    assert all(scheduler.expected_share(UL, bs, ue, now) == 1.0 for ue in ues)
+
+
+def test_directions_are_separate_cells():
+    scheduler = CellScheduler(ROUND_ROBIN)
+    bs, ues = make_cell(4)
+    now = saturate(scheduler, bs, ues, 1000.0, 200)
+    assert scheduler.backlog_ms(DL, bs, ues[0], now) == 0.0
+    assert scheduler.expected_share(DL, bs, ues[0], now) == 1.0
+
+
+@pytest.mark.parametrize("mode", [PROPORTIONAL_FAIR, FULL_BAND])
+def test_switching_mode_keeps_the_queued_frames(mode):
+    scheduler = CellScheduler(ROUND_ROBIN)
+    bs, ues = make_cell(3)
+    now = saturate(scheduler, bs, ues, 1000.0, 100)
+    before = [scheduler.backlog_ms(UL, bs, ue, now) for ue in ues]
+    assert min(before) > 0.0
+    scheduler.configure(mode)
+    assert [scheduler.backlog_ms(UL, bs, ue, now) for ue in ues] == pytest.approx(before)
+    scheduler.configure(ROUND_ROBIN)
+    assert [scheduler.backlog_ms(UL, bs, ue, now) for ue in ues] == pytest.approx(before)
+    # a new frame still waits for the ones already queued
+    start, _ = scheduler.reserve(UL, bs, ues[0], now, FRAME, MS_PER_BYTE)
+    assert start == pytest.approx(now + before[0])
+
+
+def test_handover_carries_the_queue_to_the_new_cell():
+    scheduler = CellScheduler(ROUND_ROBIN)
+    bs, ues = make_cell(2)
+    other = BaseStation(1, phy.Tower(100.0, 0.0))
+    now = saturate(scheduler, bs, ues, 1000.0, 100)
+    backlog = scheduler.backlog_ms(UL, bs, ues[0], now)
+    start, _ = scheduler.reserve(UL, other, ues[0], now, FRAME, MS_PER_BYTE)
+    assert start == pytest.approx(now + backlog)
+    cells = {c["bs"]: c["ues"] for c in scheduler.stats()["uplink"]}
+    assert cells == {0: 1, 1: 1}
+
+
+def test_forgotten_ue_leaves_its_cell():
+    scheduler = CellScheduler(ROUND_ROBIN)
+    bs, ues = make_cell(4)
+    now = saturate(scheduler, bs, ues, 1000.0, 200)
+    scheduler.forget(ues[3])
+    assert scheduler.stats()["uplink"][0]["ues"] == 3
+    now = saturate(scheduler, bs, ues[:3], now, 200)
+    shares = [scheduler.expected_share(UL, bs, ue, now) for ue in ues[:3]]
+    assert shares == pytest.approx([1.0 / 3] * 3, rel=1e-3)
+
+
+def test_removed_ue_is_dropped_from_the_scheduler():
+    from glu import Glu
+
+    g = Glu()
+    bs = g.add_tower(50.0, 50.0)
+    ues = [g.add_ue(40.0 + i, 50.0) for i in range(3)]
+    now = 1000.0
+    for ue in ues:
+        g.scheduler.reserve(UL, bs, ue, now, FRAME, MS_PER_BYTE)
+    assert g.scheduler.stats()["uplink"][0]["ues"] == 3
+    removed = g.remove_ue(ues[1].id)
+    assert removed is ues[1]
+    assert g.scheduler.stats()["uplink"][0]["ues"] == 2
+    assert g.get_ue(ues[1].id) is None
+    assert ues[1].ip not in g.cabernet.ips
+    assert ues[1].id not in g.mobility.index
+    # the other UEs keep their mobility rows
+    assert g.mobility.ues[g.mobility.index[ues[2].id]] is ues[2]
+    # its address is handed out again
+    assert g.add_ue(60.0, 50.0).ip == ues[1].ip
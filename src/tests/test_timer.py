@@ -0,0 +1,54 @@
+import threading
+import time
+
+from glu import Glu
+from glu.glu import POLL_TIMEOUT_MS, now_in_ms
+from glu.packet_queue import Packet
+from glu.timer import DeliveryTimer
+
+
+class _Queue:
+    def __init__(self, deadline_ms):
+        self.deadline_ms = deadline_ms
+
+    def next_deadline(self):
+        return self.deadline_ms
+
+
+def test_wait_returns_at_the_deadline():
+    for spin_us in (200.0, 0.0):
+        timer = DeliveryTimer(spin_us=spin_us)
+        deadline_ms = time.time() * 1000 + 5
+        timer.wait(_Queue(deadline_ms), threading.Event())
+        assert time.time() * 1000 >= deadline_ms
+
+
+def test_wake_cuts_the_wait_short():
+    timer = DeliveryTimer()
+    wake = threading.Event()
+    wake.set()
+    started = time.monotonic()
+    timer.wait(_Queue(time.time() * 1000 + 10_000), wake)
+    assert time.monotonic() - started < 1
+
+
+def test_single_loop_blocks_until_the_earlier_deadline():
+    g = Glu()
+    g.idle_wait()
+    assert g.cabernet.poll_timeouts == [POLL_TIMEOUT_MS]
+
+    now = now_in_ms()
+    g.upload_queue.enqueue(Packet(now + 30, b"", 0.0, None, None))
+    g.download_queue.enqueue(Packet(now + 10, b"", 0.0, None, None))
+    g.idle_wait()
+    assert 8 <= g.cabernet.poll_timeouts[-1] <= 10
+
+    # within a millisecond of a deadline it only yields
+    g.download_queue.enqueue(Packet(now_in_ms() + 0.5, b"", 0.0, None, None))
+    g.idle_wait()
+    assert len(g.cabernet.poll_timeouts) == 2
+
+
+def test_single_loop_wakes_for_the_gateway_queues():
+    g = Glu(gateway_queues=2)
+    assert g.idle_timeout_ms() == 1
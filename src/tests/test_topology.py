@@ -0,0 +1,26 @@
+import layer1 as phy
+from glu import Glu
+from glu.model import UE
+from glu.topology import Topology
+
+
+def test_aliases_index_an_address_ahead_of_the_change():
+    ue = UE(0, phy.UE(0.0, 0.0), "10.0.0.1")
+    topology = Topology([ue]).replace(aliases={"10.0.0.9": ue})
+    assert topology.ues_by_ip["10.0.0.1"] is ue
+    assert topology.ues_by_ip["10.0.0.9"] is ue
+    # the next snapshot indexes the UE's address only
+    ue.ip = "10.0.0.9"
+    assert dict(topology.replace().ues_by_ip) == {"10.0.0.9": ue}
+
+
+def test_address_change_republishes_the_index():
+    g = Glu()
+    g.add_tower(50.0, 50.0)
+    ue = g.add_ue(40.0, 50.0)
+    old_ip, version = ue.ip, g.topology.version
+    g.update_ue_ip(ue.id)
+    assert ue.ip != old_ip
+    assert g.ues_by_ip == {ue.ip: ue}
+    assert g.topology.version == version + 2
+    assert old_ip not in g.cabernet.ips and ue.ip in g.cabernet.ips